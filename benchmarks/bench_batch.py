@@ -0,0 +1,93 @@
+"""
+Time to render a whole dashboard: one /api/plot request per chart vs a single
+POST /api/plot/batch.
+
+Runs the app (test client, LLM cache and fast path off) against the local
+stand-in in mock_deepseek.py, using the "champions" dashboard from
+src/dashboards.json plus one duplicated question.
+
+- sequential: one synchronous /api/plot call per chart, as a page would do
+  without the batch endpoint.
+- batch: all charts in one request; prints when the first and the last
+  chart arrived and how many requests reached DeepSeek (the duplicate is
+  only drawn once).
+- cached: the same batch again, served from the figure cache.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+os.environ['LLM_CACHE_DISABLED'] = '1'
+os.environ['FAST_PATH_DISABLED'] = '1'
+
+import app  # noqa: E402
+import deepseek_client  # noqa: E402
+from mock_deepseek import serve  # noqa: E402
+
+
+def sequential(client, items):
+    start = time.perf_counter()
+    for item in items:
+        response = client.post('/api/plot', json={**item, 'DEEPSEEK_API_KEY': 'test'})
+        if response.status_code != 200:
+            raise SystemExit(f"plot failed: {response.get_json()}")
+    return time.perf_counter() - start
+
+
+def batch(client, items):
+    start = time.perf_counter()
+    response = client.post('/api/plot/batch', json={'items': items, 'DEEPSEEK_API_KEY': 'test'})
+    arrivals, hits = [], 0
+    # Read lines as the server sends them rather than waiting for the whole body
+    buffer = b''
+    for chunk in response.response:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event['event'] != 'item':
+                continue
+            if event['status'] != 'done':
+                raise SystemExit(f"batch item failed: {event}")
+            arrivals.append(time.perf_counter() - start)
+            hits += event.get('figure_cache') == 'hit'
+    return arrivals, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--first-token', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    items = app.dashboards['champions']['items']
+    items = items + [items[0]]
+    client = app.app.test_client()
+    with serve(args.first_token, args.token_delay) as server:
+        deepseek_client._default = deepseek_client.DeepSeekClient(base_url=server.url)
+
+        elapsed = sequential(client, items)
+        print(f"sequential  {len(items)} charts in {elapsed:5.2f}s  ({server.stats['requests']} DeepSeek requests)")
+
+        app.figure_cache._entries.clear()
+        before = server.stats['requests']
+        arrivals, _ = batch(client, items)
+        print(f"batch       first chart {arrivals[0]:5.2f}s  all {len(items)} charts {arrivals[-1]:5.2f}s  "
+              f"({server.stats['requests'] - before} DeepSeek requests)")
+
+        before = server.stats['requests']
+        arrivals, hits = batch(client, items)
+        print(f"cached      all {len(items)} charts {arrivals[-1] * 1000:6.1f} ms  "
+              f"({hits} figure cache hits, {server.stats['requests'] - before} DeepSeek requests)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Load test of the DeepSeek client (src/deepseek_client.py) against the local
+stand-in in mock_deepseek.py.
+
+- pooling: sequential non-streamed calls with a fresh connection each time
+  (plain requests.post) vs the client's keep-alive session, and how many TCP
+  connections the server saw.
+- coalescing: --concurrency identical prompts at once and how many requests
+  reached the server.
+- retries: the first two requests fail with 503, the call still succeeds.
+- circuit breaker: every request fails; once the breaker opens, calls fail
+  without waiting for the server.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+from deepseek_client import DeepSeekClient, DeepSeekError, DeepSeekUnavailable  # noqa: E402
+from mock_deepseek import serve  # noqa: E402
+
+MESSAGES = [{'role': 'user', 'content': 'Hiển thị top 10 tướng có tỉ lệ thắng cao nhất'}]
+
+
+def pooling(calls):
+    with serve(first_token=0, token_delay=0) as server:
+        url = server.url + '/chat/completions'
+        payload = {'model': 'deepseek-chat', 'messages': MESSAGES}
+        fresh = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            requests.post(url, json=payload, headers={'Authorization': 'Bearer test'}, timeout=10).json()
+            fresh.append(time.perf_counter() - start)
+        fresh_connections = server.stats['connections']
+
+        client = DeepSeekClient(base_url=server.url, stream=False)
+        pooled = []
+        for i in range(calls):
+            start = time.perf_counter()
+            client.chat(MESSAGES, 'test', temperature=i)
+            pooled.append(time.perf_counter() - start)
+        pooled_connections = server.stats['connections'] - fresh_connections
+    print(f'pooling      fresh connection {statistics.median(fresh) * 1000:6.2f} ms ({fresh_connections} connections)'
+          f'  keep-alive {statistics.median(pooled) * 1000:6.2f} ms ({pooled_connections} connections)')
+
+
+def coalescing(concurrency):
+    with serve(first_token=0.3, token_delay=0.005) as server:
+        client = DeepSeekClient(base_url=server.url)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            replies = list(pool.map(lambda _: client.chat(MESSAGES, 'test'), range(concurrency)))
+        elapsed = time.perf_counter() - start
+    assert len(set(replies)) == 1
+    print(f"coalescing   {concurrency} identical calls in {elapsed:.2f}s, "
+          f"{server.stats['requests']} request(s) sent upstream")
+
+
+def retries():
+    with serve(first_token=0, token_delay=0, errors=[503, 503]) as server:
+        client = DeepSeekClient(base_url=server.url, stream=False, retries=2, backoff=0.05)
+        start = time.perf_counter()
+        client.chat(MESSAGES, 'test')
+        elapsed = time.perf_counter() - start
+    print(f"retries      2 x 503 then success in {elapsed * 1000:.0f} ms ({server.stats['requests']} requests)")
+
+
+def breaker(calls):
+    with serve(first_token=0.2, token_delay=0, errors=[503] * 1000) as server:
+        client = DeepSeekClient(base_url=server.url, stream=False, retries=0, breaker_failures=3, breaker_reset=60)
+        timings = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            try:
+                client.chat(MESSAGES, 'test')
+            except DeepSeekUnavailable:
+                timings.append(('open', time.perf_counter() - start))
+            except DeepSeekError:
+                timings.append(('error', time.perf_counter() - start))
+    failed = [t for kind, t in timings if kind == 'error']
+    rejected = [t for kind, t in timings if kind == 'open']
+    print(f"breaker      {len(failed)} upstream failures ({statistics.median(failed) * 1000:.0f} ms each), "
+          f"then {len(rejected)} calls rejected in {statistics.median(rejected) * 1000:.2f} ms "
+          f"({server.stats['requests']} requests sent)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    pooling(args.calls)
+    coalescing(args.concurrency)
+    retries()
+    breaker(10)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Crawl throughput against the local fixture server.
+
+Runs both crawlers sequentially (one worker, the old behaviour), with the
+concurrent engine, and as an incremental re-crawl on a warm HTTP cache. Every
+run must reproduce data/lol-data/*.csv row for row; the timings and the
+number of full downloads vs 304s are printed.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crawling-data'))
+
+import champions  # noqa: E402
+import crawler  # noqa: E402
+import player  # noqa: E402
+from fixture_server import DATA_DIR, serve  # noqa: E402
+from http_cache import HttpCache  # noqa: E402
+
+CRAWLERS = [
+    ('champions', champions, 'champion_stats.csv'),
+    ('player', player, 'player_stats.csv'),
+]
+YEARS = range(2018, 2025)
+
+
+def run_crawl(module, path, engine, incremental=False):
+    if not incremental:
+        with open(path, 'w', newline='', encoding='utf-8') as csvfile:
+            csv.writer(csvfile).writerow(module.HEADERS)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        module.crawl_player_stats(YEARS, path, engine=engine, incremental=incremental)
+    elapsed = time.perf_counter() - start
+    return elapsed, _read(path) == _read(os.path.join(DATA_DIR, os.path.basename(path)))
+
+
+def _read(path):
+    # csv.writer emits CRLF while the committed CSVs are LF, compare line by line
+    with open(path, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated seconds per request')
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    with serve(args.latency) as server, tempfile.TemporaryDirectory() as workdir:
+        crawler.BASE_URL = server.url
+        for name, module, filename in CRAWLERS:
+            path = os.path.join(workdir, filename)
+            cache = HttpCache(os.path.join(workdir, f'{name}-cache'))
+            runs = [('sequential', 1, None, False), ('concurrent', args.workers, cache, False),
+                    ('incremental', args.workers, cache, True)]
+            for label, workers, run_cache, incremental in runs:
+                server.reset()
+                with crawler.CrawlEngine(max_workers=workers, rate=0, retries=0, cache=run_cache) as engine:
+                    elapsed, same = run_crawl(module, path, engine, incremental)
+                print(
+                    f"{name:10s} {label:12s} {elapsed:6.2f}s  200={server.count(200):3d}  "
+                    f"304={server.count(304):3d}  identical={same}"
+                )
+
+
+if __name__ == '__main__':
+    main()
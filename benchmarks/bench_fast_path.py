@@ -0,0 +1,60 @@
+"""
+Coverage and latency of the local fast path on typical dashboard questions.
+
+The question list mixes the examples shown in the UI, the few-shot examples
+from the prompts and variants analysts type. Each question is either answered
+locally (intent and build time shown) or left to DeepSeek.
+"""
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import fast_path  # noqa: E402
+from plot_generator import COLUMN_DESCRIPTIONS  # noqa: E402
+from snapshot import DATA_DIR, DatasetLoader  # noqa: E402
+
+QUESTIONS = {
+    'champion': [
+        'Hiển thị top 10 tướng có tỉ lệ thắng cao nhất',
+        'So sánh tỉ lệ chọn và tỉ lệ cấm của các tướng',
+        'Phân tích KDA theo vị trí tướng',
+        'Phân tích tỉ lệ chiến thắng (WR) của 10 champion được chơi nhiều nhất',
+        '10 tướng có tỷ lệ cấm cao nhất mùa hè 2024',
+        'Xu hướng WR của Azir theo thời gian',
+        'top 5 champions by GP in 2023',
+        'Tướng nào phù hợp nhất để chơi ở đường giữa?',
+    ],
+    'player': [
+        'So sánh KDA của 10 người chơi hàng đầu',
+        'Phân tích tỉ lệ thắng theo vai trò',
+        'Hiển thị mối quan hệ giữa CS/M và G/M của các người chơi',
+        'KDA theo đội năm 2024',
+        'xu hướng G/M theo năm',
+        'top 15 players with lowest deaths',
+        '5 người chơi chơi nhiều nhất',
+        'Người chơi nào tiến bộ nhiều nhất giữa hai mùa giải?',
+    ],
+}
+
+
+def main():
+    loader = DatasetLoader({name: os.path.join(DATA_DIR, f'processed_{name}_stats.csv') for name in QUESTIONS})
+    answered = total = 0
+    for dataset, questions in QUESTIONS.items():
+        df = loader.get(dataset)
+        for question in questions:
+            start = time.perf_counter()
+            result = fast_path.build_fast_plot(question, df, dataset, COLUMN_DESCRIPTIONS[dataset])
+            elapsed = (time.perf_counter() - start) * 1000
+            kind = 'llm' if result is None else result[1]['kind']
+            answered += result is not None
+            total += 1
+            print(f'{dataset:8s} {kind:6s} {elapsed:6.1f} ms  {question}')
+    print(f'answered locally: {answered}/{total}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput and latency of the plot job queue under concurrent clients.
+
+DeepSeek is replaced by a stub that sleeps --llm-latency seconds and returns a
+small Plotly snippet, and the fast path and response cache are disabled, so
+every request takes the LLM path. --clients threads each submit --requests
+jobs through the Flask test client and long-poll them to completion. The run is
+repeated for each worker/LLM-concurrency setting; the first row (one worker)
+is the old behaviour of one plot at a time.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import threading
+import time
+
+os.environ['FAST_PATH_DISABLED'] = '1'
+os.environ['LLM_CACHE_DISABLED'] = '1'
+os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import app  # noqa: E402
+import plot_generator  # noqa: E402
+from jobs import JobManager  # noqa: E402
+
+CODE = 'import plotly.express as px\nfig = px.bar(df.head(10), x="Player", y="KDA")'
+
+
+def run(client, clients, requests):
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def worker(i):
+        for j in range(requests):
+            start = time.perf_counter()
+            r = client.post('/api/plot/jobs', json={'user_input': f'bench {i} {j}', 'dataset': 'player'})
+            if r.status_code != 202:
+                with lock:
+                    failures.append(r.status_code)
+                continue
+            job_id = r.get_json()['job_id']
+            while True:
+                job = client.get(f'/api/plot/jobs/{job_id}?wait=5').get_json()
+                if job['status'] not in ('queued', 'running'):
+                    break
+            with lock:
+                (latencies if job['status'] == 'done' else failures).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=4, help='requests per client')
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    args = parser.parse_args()
+
+    def fake_deepseek(prompt, api_key, **kwargs):
+        time.sleep(args.llm_latency)
+        return CODE
+
+    plot_generator.call_deepseek_api = fake_deepseek
+    logging.disable(logging.INFO)  # silence the per-request logging
+    client = app.app.test_client()
+    app.get_dataframe('player')
+
+    for workers, llm_concurrency in ((1, 1), (4, 4), (8, 4), (16, 8)):
+        app.plot_jobs = JobManager(max_workers=workers, llm_concurrency=llm_concurrency,
+                                   queue_size=args.clients * args.requests)
+        elapsed, latencies, failures = run(client, args.clients, args.requests)
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else float('nan')
+        print(f'workers {workers:2d} llm {llm_concurrency:2d}: {len(latencies) / elapsed:6.2f} plots/s  '
+              f'p50 {statistics.median(latencies):6.2f} s  p95 {p95:6.2f} s  failed {len(failures)}')
+
+
+if __name__ == '__main__':
+    main()
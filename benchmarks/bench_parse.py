@@ -0,0 +1,117 @@
+"""
+Parse and roster-join micro-benchmark on the HTML fixtures (pages generated
+by fixture_server.py, not saved from the wiki; see suite.py).
+
+Compares the old full-page parse with its per-row scan of the roster against
+the restricted (SoupStrainer) parse with the player -> role index, after
+checking that both produce the same rows.
+"""
+import argparse
+import os
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'crawling-data'))
+
+import champions  # noqa: E402
+import player  # noqa: E402
+
+FIXTURES = os.path.join(HERE, 'fixtures')
+TABLE_CLASS = champions.TABLE_CLASS
+
+
+def legacy_parse_player_stats(roster_html, stats_html, year, tournament):
+    """The player.py parse before the roster index, kept as the baseline."""
+    role_rows = BeautifulSoup(roster_html, 'html.parser').find_all('tr', class_='multirow-highlighter')
+    table = BeautifulSoup(stats_html, 'html.parser').find('table', class_=TABLE_CLASS)
+    data_rows = []
+    for row in table.find_all('tr')[5:]:
+        row_data = [year, tournament, row.find('td').find('a').get('title')]
+        td_cells = row.find_all('td')
+        if len(td_cells) < 3:
+            continue
+        row_data.extend(cell.get_text(strip=True) for cell in td_cells[1:-1])
+        row_data.append([span.get('title') for span in td_cells[-1].find_all('span')])
+        role = ''
+        for role_row in role_rows:
+            try:
+                if row_data[3] == role_row.find('td', class_='extended-rosters-id').get_text(strip=True):
+                    role = role_row.find('td', class_='extended-rosters-role').find('span').get('title')
+                    break
+            except:  # noqa: E722
+                pass
+        row_data.append(role)
+        data_rows.append(row_data)
+    return data_rows
+
+
+def legacy_join(role_rows, players):
+    roles = []
+    for name in players:
+        role = ''
+        for role_row in role_rows:
+            try:
+                if name == role_row.find('td', class_='extended-rosters-id').get_text(strip=True):
+                    role = role_row.find('td', class_='extended-rosters-role').find('span').get('title')
+                    break
+            except:  # noqa: E722
+                pass
+        roles.append(role)
+    return roles
+
+
+def legacy_parse_champion_stats(html, year, tournament):
+    """The champions.py parse before the restricted mode, kept as the baseline."""
+    table = BeautifulSoup(html, 'html.parser').find('table', class_=TABLE_CLASS)
+    data_rows = []
+    for row in table.find_all('tr')[5:]:
+        row_data = [year, tournament, row.find('td').find('span', class_='markup-object-name').get_text(strip=True)]
+        td_cells = row.find_all('td')
+        if len(td_cells) < 3:
+            continue
+        row_data.extend(cell.get_text(strip=True) for cell in td_cells[1:-1])
+        row_data.append([span.get('title') for span in td_cells[-1].find_all('span')])
+        data_rows.append(row_data)
+    return data_rows
+
+
+def load(page):
+    with open(os.path.join(FIXTURES, f'{page}.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def bench(label, old, new, number):
+    assert old() == new(), f'{label}: restricted parse changed the output'
+    old_t = min(timeit.repeat(old, number=number, repeat=3)) / number
+    new_t = min(timeit.repeat(new, number=number, repeat=3)) / number
+    print(f'{label:22s} old {old_t * 1000:7.2f} ms  new {new_t * 1000:7.2f} ms  speedup x{old_t / new_t:.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=10)
+    args = parser.parse_args()
+
+    roster, stats, champ = load('Team_Rosters'), load('Player_Statistics'), load('Champion_Statistics')
+    bench('player parse + join',
+          lambda: legacy_parse_player_stats(roster, stats, 2024, 'Summer_Season'),
+          lambda: player.parse_player_stats(roster, stats, 2024, 'Summer_Season'),
+          args.number)
+    # The join on its own over the same parsed rows: scan the roster per player vs index once and look up
+    role_rows = BeautifulSoup(roster, 'html.parser').find_all('tr', class_='multirow-highlighter')
+    players = [row[3] for row in player.parse_player_stats(roster, stats, 2024, 'Summer_Season')]
+    bench('roster join',
+          lambda: legacy_join(role_rows, players),
+          lambda: [index.get(name, '') for index in [player.index_roster_roles(role_rows)] for name in players],
+          args.number)
+    bench('champion parse',
+          lambda: legacy_parse_champion_stats(champ, 2024, 'Summer_Season'),
+          lambda: champions.parse_champion_stats(champ, 2024, 'Summer_Season'),
+          args.number)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Preprocessing pipeline vs the notebook logic.
+
+`legacy_preprocess` is the cell-by-cell code of LOL_Preprocessing.ipynb and
+LOL_Preprocessing_2.ipynb (the interactive Role prompt replaced by the
+overrides table), including the second notebook reading the player CSV the
+first one wrote. Both run on data/lol-data/*.csv and must produce the same
+CSV bytes as each other and as the files in data/preprocessed_data/.
+
+The incremental mode is timed on a refresh where only the latest
+tournament changed, and must give exactly the full-run output.
+"""
+import argparse
+import ast
+import io
+import itertools
+import os
+import sys
+import tempfile
+import timeit
+import warnings
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'preprocessing-data'))
+
+import incremental  # noqa: E402
+import pipeline  # noqa: E402
+
+
+def legacy_preprocess(player_df, champion_df, end_dates, role_overrides):
+    player_df = player_df.replace(['-', 'N/A', 'null', '[]'], np.nan)
+    champion_df = champion_df.replace(['-', 'N/A', 'null', '[]'], np.nan)
+    for col in ['WR', 'KPAR', 'KS', 'GS', 'DMG']:
+        player_df[col] = player_df[col].str.replace('%', '', regex=False).str.replace('k', '', regex=False).replace('-', None).astype(float)
+    for col in ['G.1', 'G/M', 'DMG', 'DMG/M']:
+        player_df[col] = pd.to_numeric(player_df[col], errors='coerce')
+    for col in ['PB', 'WR', 'KPAR', 'KS', 'GS', 'DMG']:
+        champion_df[col] = champion_df[col].str.replace('%', '', regex=False).str.replace('k', '', regex=False).replace('-', None).astype(float)
+    for col in ['K', 'B', 'By', 'D', 'A', 'KDA', 'CS', 'CS/M', 'G.1', 'G/M', 'DMG', 'DMG/M']:
+        champion_df[col] = pd.to_numeric(champion_df[col], errors='coerce')
+
+    player_df = player_df.loc[:, player_df.isnull().mean() <= 0.4]
+    champion_df = champion_df.loc[:, champion_df.isnull().mean() <= 0.4]
+    null_counts = champion_df.isna().sum(axis=1)
+    rows_to_drop = null_counts[null_counts >= 5].index.union(champion_df[champion_df['As'].isna()].index)
+    champion_df = champion_df.drop(rows_to_drop)
+
+    for col in player_df.select_dtypes(include='number').columns:
+        player_df[col] = player_df.groupby(['Year', 'Tournamment'])[col].transform(lambda x: x.fillna(x.mean()))
+    for col in champion_df.select_dtypes(include='number').columns:
+        champion_df[col] = champion_df.groupby(['Year', 'Tournamment'])[col].transform(lambda x: x.fillna(x.mean()))
+    for col in player_df.select_dtypes(include='number').columns:
+        player_df[col] = player_df[col].fillna(player_df[col].mean())
+    for col in champion_df.select_dtypes(include='number').columns:
+        champion_df[col] = champion_df[col].fillna(champion_df[col].mean())
+
+    champion_df['B'] = champion_df['B'].astype(int)
+    champion_df['By'] = champion_df['By'].astype(int)
+    champion_df['As'] = champion_df['As'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+
+    def get_season(tournament):
+        for season in ('Spring', 'Summer', 'Winter'):
+            if season in tournament:
+                return season
+        return ''
+
+    def get_event_type(tournament):
+        for event in ('Season', 'Promotion', 'Playoffs'):
+            if event in tournament:
+                return event
+        return ''
+
+    def add_dates(df):
+        df['Year_Tournamment'] = df['Year'].astype(str) + " " + df['Tournamment']
+        df['Date'] = df['Year_Tournamment'].map(end_dates)
+        df['Season'] = df['Tournamment'].apply(get_season)
+        df['Event_Type'] = df['Tournamment'].apply(get_event_type)
+        df.drop(columns=['Year_Tournamment'], inplace=True)
+        df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d', errors='coerce')
+
+    add_dates(champion_df)
+    for role in ['Mid Laner', 'Top Laner', 'Bot Laner', 'Jungler', 'Support']:
+        champion_df[role] = champion_df['As'].apply(
+            lambda roles: 1 if (isinstance(roles, list) and role in roles) or (isinstance(roles, str) and roles == role) else 0)
+    champion_df = champion_df.drop(columns=['As'])
+
+    team_wins = player_df.groupby(['Year', 'Tournamment', 'Team']).agg({'W': 'sum'}).reset_index()
+    team_wins['team_wins'] = team_wins['W'] / 5
+    season_games = team_wins.groupby(['Year', 'Tournamment']).agg({'team_wins': 'sum'}).reset_index()
+    season_games.rename(columns={'team_wins': 'total_games'}, inplace=True)
+    champion_df = champion_df.merge(season_games[['Year', 'Tournamment', 'total_games']], on=['Year', 'Tournamment'], how='left')
+    champion_df['total_games'] = champion_df['total_games'].astype(int)
+    player_df = player_df.merge(season_games[['Year', 'Tournamment', 'total_games']], on=['Year', 'Tournamment'], how='left')
+    player_df['total_games'] = player_df['total_games'].astype(int)
+    champion_df['%B'] = ((champion_df['B'] / champion_df['total_games']) * 100).round(2)
+    champion_df['%P'] = ((champion_df['GP'] / champion_df['total_games']) * 100).round(2)
+
+    season_max = player_df.groupby(['Year', 'Tournamment']).agg({'G/M': 'max', 'CS/M': 'max', 'KDA': 'max', 'KPAR': 'max'}).reset_index()
+    season_max = season_max.rename(columns={'G/M': 'max_G/M', 'CS/M': 'max_CS/M', 'KDA': 'max_KDA', 'KPAR': 'max_KPAR'}).fillna(0)
+    player_df = player_df.merge(season_max, on=['Year', 'Tournamment'], how='left')
+    player_df['Champs'] = player_df['Champs'].apply(lambda x: ', '.join(ast.literal_eval(x)))
+
+    def normalize_team_name(team):
+        if not isinstance(team, str):
+            return team
+        if ' (' in team:
+            team = team.split(' (')[0]
+        return team.replace('.Vietnam', '').strip()
+
+    player_df['Team'] = player_df['Team'].apply(normalize_team_name)
+    for index in player_df[player_df['Role'].isna()].index:
+        key = (player_df.loc[index, 'Year'], player_df.loc[index, 'Tournamment'], player_df.loc[index, 'Player'])
+        if key in role_overrides:
+            player_df.loc[index, 'Role'] = role_overrides[key]
+
+    float_columns = champion_df.select_dtypes(include=['float']).columns
+    champion_df[float_columns] = champion_df[float_columns].round(2)
+
+    # LOL_Preprocessing_2.ipynb, starting from the CSV the first notebook wrote
+    player_df = pd.read_csv(io.StringIO(player_df.to_csv(index=False)))
+    add_dates(player_df)
+    player_df[['Champion_1', 'Champion_2', 'Champion_3']] = player_df['Champs'].str.split(', ', expand=True)
+    player_df.drop(columns=['Champs'], inplace=True)
+    player_df[['Champion_1', 'Champion_2', 'Champion_3']] = player_df[['Champion_1', 'Champion_2', 'Champion_3']].fillna("IsNone")
+    return player_df, champion_df
+
+
+def check_same(legacy, new):
+    (old_player, old_champion), (new_player, new_champion) = legacy, new
+    assert old_champion.to_csv(index=False) == new_champion.to_csv(index=False), 'champion output differs'
+    assert old_player.to_csv(index=False) == new_player.to_csv(index=False), 'player output differs'
+    for name, df in (('processed_champion_stats.csv', new_champion), ('processed_player_stats.csv', new_player)):
+        with open(os.path.join(pipeline.OUT_DIR, name), encoding='utf-8', newline='') as f:
+            assert f.read() == df.to_csv(index=False), f'{name} differs from the committed file'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--number', type=int, default=5)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    player_raw, champion_raw = pipeline.load_raw('csv')
+    dates = pipeline.load_dates()
+    end_dates = {f'{y} {t}': d.strftime('%Y-%m-%d') for y, t, d in dates.itertuples(index=False)}
+    overrides = pipeline.load_role_overrides()
+    role_overrides = {(y, t, p): r for y, t, p, r in overrides.itertuples(index=False)}
+
+    old = lambda: legacy_preprocess(player_raw.copy(), champion_raw.copy(), end_dates, role_overrides)  # noqa: E731
+    new = lambda: pipeline.preprocess(player_raw, champion_raw, dates, overrides)  # noqa: E731
+    check_same(old(), new())
+
+    old_t = min(timeit.repeat(old, number=args.number, repeat=3)) / args.number
+    new_t = min(timeit.repeat(new, number=args.number, repeat=3)) / args.number
+    print(f'notebook logic {old_t * 1000:8.1f} ms  pipeline {new_t * 1000:8.1f} ms  speedup x{old_t / new_t:.1f}')
+
+    # Refresh after a new split: only the last tournament's rows change between runs
+    state_dir = tempfile.mkdtemp()
+    incremental.run_incremental(player_raw, champion_raw, dates, overrides, state_dir)
+    last = player_raw.index[-1]
+    edits = []
+    for wins in range(1, 4):
+        edited = player_raw.copy()
+        edited.loc[last, 'W'] += wins
+        edits.append(edited)
+    cycle = itertools.cycle(edits[:2])
+    refresh = lambda: incremental.run_incremental(next(cycle), champion_raw, dates, overrides, state_dir)  # noqa: E731
+    inc_t = min(timeit.repeat(refresh, number=args.number, repeat=3)) / args.number
+
+    player_df, champion_df, recomputed = incremental.run_incremental(edits[2], champion_raw, dates, overrides, state_dir)
+    expected_player, expected_champion = pipeline.preprocess(edits[2], champion_raw, dates, overrides)
+    assert len(recomputed) == 1, recomputed
+    assert player_df.to_csv(index=False) == expected_player.to_csv(index=False), 'incremental player output differs'
+    assert champion_df.to_csv(index=False) == expected_champion.to_csv(index=False), 'incremental champion output differs'
+    print(f'full pipeline  {new_t * 1000:8.1f} ms  incremental, 1 tournament changed {inc_t * 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
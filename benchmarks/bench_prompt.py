@@ -0,0 +1,50 @@
+"""
+Estimated prompt tokens per question: compiled prompt vs sending every column.
+
+The question list is the one from bench_fast_path.py plus a few cross-dataset
+questions. For each question the compiled prompt is split into its stable
+prefix (same bytes for every question on a dataset, so DeepSeek's context
+cache can serve it) and the per-question suffix. The last column is the same
+prompt with every column description, which is what the compiler falls back to
+when it cannot tell which columns a question needs. The old single-message
+prompts repeated the question three times and the column list twice, about
+1,860-2,050 tokens each by the same estimate.
+"""
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+from bench_fast_path import QUESTIONS  # noqa: E402
+from plot_generator import COLUMN_DESCRIPTIONS  # noqa: E402
+from prompt_compiler import compile_prompt, estimate_tokens  # noqa: E402
+
+COMBINED_QUESTIONS = [
+    'Tỉ lệ thắng của các tướng mà đường giữa của Team Flash chơi nhiều nhất',
+    'So sánh KDA của người chơi với KDA trung bình của tướng họ chơi',
+    'Những tướng được nhiều người chơi đi rừng chọn nhất năm 2022',
+]
+
+
+def main():
+    totals = []
+    for dataset, questions in {**QUESTIONS, 'combined': COMBINED_QUESTIONS}.items():
+        descriptions = COLUMN_DESCRIPTIONS[dataset]
+        for question in questions:
+            prompt = compile_prompt(question, dataset, descriptions)
+            report = prompt.report()
+            every = compile_prompt('', dataset, descriptions)
+            full = report['prefix'] + estimate_tokens(every.user) + estimate_tokens(question)
+            totals.append((report['total'], report['suffix'], full))
+            print(f"{dataset:8s} columns {report['columns']:2d}/{report['total_columns']:2d}  "
+                  f"prefix {report['prefix']:4d}  suffix {report['suffix']:4d}  total {report['total']:4d}  "
+                  f"all columns {full:4d}  {question}")
+    count = len(totals)
+    print(f'mean total {sum(t[0] for t in totals) / count:.0f} tokens, '
+          f'mean suffix {sum(t[1] for t in totals) / count:.0f}, '
+          f'mean with all columns {sum(t[2] for t in totals) / count:.0f}')
+
+
+if __name__ == '__main__':
+    main()
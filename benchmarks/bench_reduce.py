@@ -0,0 +1,70 @@
+"""
+Payload size and server time of large figures, with and without figure_reduce.
+
+The player dataset is replicated --scales times (with jitter, as if more
+seasons had been crawled) and plotted the way generated code usually does: an
+all-rows scatter with hover data, a line over time and a histogram by role.
+Each figure is encoded as-is and after reduction to PLOT_POINT_BUDGET points;
+the point count is what the browser has to render.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import plotly.express as px  # noqa: E402
+
+from figure_reduce import POINT_BUDGET, prepare_figure  # noqa: E402
+from serialization import EncodedFigure, encode_figure  # noqa: E402
+from snapshot import DATA_DIR, DatasetLoader  # noqa: E402
+
+
+def grown(df, scale, rng):
+    frames = []
+    for i in range(scale):
+        copy = df.copy()
+        for column in ('KDA', 'CS/M', 'G/M'):
+            copy[column] = copy[column] * rng.normal(1, 0.05, len(copy))
+        copy['Year'] = copy['Year'] + i * 7
+        frames.append(copy)
+    return pd.concat(frames, ignore_index=True)
+
+
+def figures(df):
+    yield 'scatter', px.scatter(df, x='CS/M', y='G/M', color='Role', hover_data=['Player', 'Team', 'KDA'])
+    yield 'line', px.line(df.sort_values('Year'), x=np.arange(len(df)), y='KDA')
+    yield 'histogram', px.histogram(df, x='KDA', color='Role')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    df = DatasetLoader({'player': os.path.join(DATA_DIR, 'processed_player_stats.csv')}).get('player')
+    rng = np.random.default_rng(0)
+    print(f'point budget {POINT_BUDGET}')
+    for scale in args.scales:
+        data = grown(df, scale, rng)
+        for name, fig in figures(data):
+            start = time.perf_counter()
+            raw = encode_figure(fig)
+            raw_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            reduced = prepare_figure(fig)
+            reduced_ms = (time.perf_counter() - start) * 1000
+            assert isinstance(reduced, EncodedFigure)
+            points = reduced.reduction['points'] if reduced.reduction else len(data)
+            shown = reduced.reduction['shown'] if reduced.reduction else points
+            print(f'{len(data):6d} rows {name:9s}  as-is {len(raw) / 1024:7.1f} KB {raw_ms:6.1f} ms  '
+                  f'reduced {len(reduced.json) / 1024:6.1f} KB {reduced_ms:6.1f} ms  points {points} -> {shown}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Overhead of running generated plot code in the sandbox worker pool.
+
+Runs the same small Plotly snippet --runs times in-process (exec, as before)
+and through sandbox.Sandbox, and reports the per-job latency, the time until
+the pool is warm and the memory of each worker. PSS splits shared pages (the
+memory-mapped snapshot, shared libraries) between the processes mapping them.
+
+Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import pandas as pd  # noqa: E402
+import plotly.express as px  # noqa: E402
+
+from bench_startup import memory  # noqa: E402
+from sandbox import Sandbox  # noqa: E402
+from snapshot import DATA_DIR, DatasetLoader  # noqa: E402
+
+CODE = '''
+import plotly.express as px
+top = df.groupby("Player", observed=True)["KDA"].mean().nlargest(10).reset_index()
+fig = px.bar(top, x="Player", y="KDA", title="Top 10 KDA")
+'''
+
+
+def timed(fn, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+
+    sources = {name: os.path.join(DATA_DIR, f'processed_{name}_stats.csv') for name in ('champion', 'player')}
+    df = DatasetLoader(sources).get('player')
+
+    def in_process():
+        local_vars = {}
+        exec(CODE, {'px': px, 'pd': pd, 'df': df}, local_vars)
+        local_vars['fig'].to_json()
+
+    start = time.perf_counter()
+    sandbox = Sandbox(sources, workers=args.workers)
+    sandbox.run(CODE, 'player', 60)
+    warm = time.perf_counter() - start
+    try:
+        p50, worst = timed(in_process, args.runs)
+        print(f'in-process  p50 {p50:6.1f} ms  max {worst:6.1f} ms')
+        p50, worst = timed(lambda: sandbox.run(CODE, 'player', 60), args.runs)
+        print(f'sandbox     p50 {p50:6.1f} ms  max {worst:6.1f} ms  (first job after start {warm:.2f} s)')
+        for worker in sandbox._all:
+            mem = memory(worker.process.pid)
+            print(f"worker {worker.process.pid}: RSS {mem['Rss']:6.1f} MB  PSS {mem['Pss']:6.1f} MB")
+    finally:
+        sandbox.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Cost and size of the /api/plot response body: old three-pass path vs serialization.py.
+
+The old path was json.dumps(fig, cls=PlotlyJSONEncoder), json.loads, then
+jsonify re-encoding the parsed dict. The new path encodes the figure once
+(typed arrays, orjson) and splices it into the response. Sizes
+are shown raw and gzip-compressed, for a few figures typical of the dashboard.
+"""
+import gzip
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import plotly  # noqa: E402
+import plotly.express as px  # noqa: E402
+
+from serialization import RawJSON, compress, encode_figure, encode_response  # noqa: E402
+from snapshot import DATA_DIR, DatasetLoader  # noqa: E402
+
+INFO = {'source': 'llm', 'intent': None, 'cache': 'miss', 'cache_tier': None}
+
+
+def figures():
+    loader = DatasetLoader({name: os.path.join(DATA_DIR, f'processed_{name}_stats.csv')
+                            for name in ('champion', 'player')})
+    champion, player = loader.get('champion'), loader.get('player')
+    top = champion.groupby('Champion', observed=True)['WR'].mean().nlargest(20)
+    yield 'bar top 20', px.bar(x=list(top.index), y=[round(v, 2) for v in top.values])
+    yield f'scatter {len(champion)} champion rows', px.scatter(
+        champion, x='PB', y='WR', size='GP', color='KDA', hover_data=['Champion', 'K', 'D', 'A'])
+    yield f'scatter {len(player)} player rows', px.scatter(
+        player, x='CS/M', y='G/M', color='Role', hover_data=['Player', 'Team', 'KDA'])
+
+
+def old_body(fig):
+    parsed = json.loads(json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder))
+    return json.dumps({'plot': parsed, **INFO}).encode('utf-8')
+
+
+def new_body(fig):
+    return encode_response({'plot': RawJSON(encode_figure(fig)), **INFO})
+
+
+def timed(fn, fig, runs=20):
+    best = float('inf')
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn(fig)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, body
+
+
+def main():
+    for name, fig in figures():
+        print(name)
+        for label, fn in (('old', old_body), ('new', new_body)):
+            ms, body = timed(fn, fig)
+            gz = len(gzip.compress(body, 5))
+            compressed = compress(body, 'gzip')[0]
+            assert len(compressed) == gz or len(body) < 1024
+            print(f'  {label}  {ms:7.2f} ms  {len(body) / 1024:8.1f} KB  gzip {gz / 1024:7.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Cold start and memory of the Flask app's data loading: read_csv vs the snapshot.
+
+Starts --workers processes at once, like gunicorn workers. Each one loads both
+processed datasets the old way (pd.read_csv) or through snapshot.DatasetLoader.
+It reports the load time, RSS and PSS (proportional set size: shared pages are
+split between the processes mapping them) while every worker is still alive.
+The snapshot is built once beforehand, as the first app start would do.
+
+Linux only (reads /proc/<pid>/smaps_rollup).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+
+WORKER = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import pandas as pd
+sys.path.insert(0, {src!r})
+import snapshot
+t1 = time.perf_counter()
+paths = {{'champion': snapshot.os.path.join(snapshot.DATA_DIR, 'processed_champion_stats.csv'),
+         'player': snapshot.os.path.join(snapshot.DATA_DIR, 'processed_player_stats.csv')}}
+if {mode!r} == 'csv':
+    frames = {{name: pd.read_csv(path) for name, path in paths.items()}}
+else:
+    loader = snapshot.DatasetLoader(paths, {snapshot_dir!r})
+    frames = {{name: loader.get(name) for name in paths}}
+rows = sum(len(df) for df in frames.values())
+t2 = time.perf_counter()
+print(json.dumps({{'import_ms': (t1 - t0) * 1000, 'load_ms': (t2 - t1) * 1000, 'rows': rows}}), flush=True)
+sys.stdin.read()
+'''
+
+
+def memory(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values
+
+
+def run(mode, workers, snapshot_dir):
+    code = WORKER.format(src=SRC, mode=mode, snapshot_dir=snapshot_dir)
+    procs = [subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        timings = [json.loads(p.stdout.readline()) for p in procs]
+        mem = [memory(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    avg = lambda key, items: sum(i[key] for i in items) / len(items)  # noqa: E731
+    print(f"{mode:9s} load {avg('load_ms', timings):7.1f} ms  (imports {avg('import_ms', timings):6.1f} ms)  "
+          f"RSS {avg('Rss', mem):6.1f} MB  PSS {avg('Pss', mem):6.1f} MB  "
+          f"private {avg('Private_Dirty', mem) + avg('Private_Clean', mem):6.1f} MB  per worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    sys.path.insert(0, SRC)
+    import snapshot
+
+    snapshot_dir = tempfile.mkdtemp()
+    for name in ('processed_champion_stats', 'processed_player_stats'):
+        snapshot.Snapshot(os.path.join(snapshot.DATA_DIR, f'{name}.csv'), snapshot_dir).build()
+    for mode in ('csv', 'snapshot'):
+        run(mode, args.workers, snapshot_dir)
+
+
+if __name__ == '__main__':
+    main()
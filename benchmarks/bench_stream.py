@@ -0,0 +1,67 @@
+"""
+Time to a plot with and without streaming the DeepSeek completion.
+
+Runs the app (test client, LLM cache and fast path off) against the local
+stand-in in mock_deepseek.py and reads the job's server-sent event stream,
+printing when each event arrived. Without streaming the code can only run
+after the whole reply, explanation included, has been generated. With it the
+code runs as soon as its block closes, and the rest of the reply is never
+generated.
+"""
+import argparse
+import logging
+import json
+import os
+import statistics
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+os.environ['LLM_CACHE_DISABLED'] = '1'
+os.environ['FAST_PATH_DISABLED'] = '1'
+
+import app  # noqa: E402
+import deepseek_client  # noqa: E402
+from mock_deepseek import serve  # noqa: E402
+
+EVENTS = ['prompt_sent', 'first_token', 'code_ready', 'exec', 'done']
+
+
+def run_once(client):
+    submitted = client.post('/api/plot/jobs', json={
+        'user_input': 'Hiển thị top 10 tướng có tỉ lệ thắng cao nhất', 'dataset': 'champion',
+        'DEEPSEEK_API_KEY': 'test'}).get_json()
+    response = client.get(f"/api/plot/jobs/{submitted['job_id']}/events")
+    seen = {}
+    for line in response.get_data(as_text=True).splitlines():
+        if line.startswith('data:'):
+            event = json.loads(line[len('data:'):])
+            seen[event['event']] = event['elapsed']
+    if 'done' not in seen:
+        raise SystemExit(f'job did not finish: {seen}')
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--first-token', type=float, default=0.5)
+    parser.add_argument('--token-delay', type=float, default=0.02)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    client = app.app.test_client()
+    with serve(args.first_token, args.token_delay) as server:
+        deepseek_client._default = deepseek_client.DeepSeekClient(base_url=server.url)
+        for stream in (False, True):
+            deepseek_client._default.stream = stream
+            server.stats['streamed_tokens'] = 0
+            runs = [run_once(client) for _ in range(args.runs)]
+            medians = {name: statistics.median(r[name] for r in runs) for name in EVENTS if name in runs[0]}
+            timeline = '  '.join(f'{name} {value:5.2f}s' for name, value in medians.items())
+            tokens = f"  tokens generated {server.stats['streamed_tokens'] // args.runs}" if stream else ''
+            print(f"{'stream' if stream else 'no stream':9s}  {timeline}{tokens}")
+
+
+if __name__ == '__main__':
+    main()
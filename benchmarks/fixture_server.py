@@ -0,0 +1,207 @@
+"""
+Local stand-in for lol.fandom.com.
+
+The pages are rebuilt from data/lol-data/*.csv with the same table markup the
+crawlers parse, so a crawl against this server must reproduce those CSVs.
+Each page is wrapped in navigation, sidebar and footer markup roughly the
+size of a real wiki page, so parse benchmarks pay for the surrounding page too.
+"""
+import ast
+import csv
+import hashlib
+import html
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'data', 'lol-data')
+
+TABLE_CLASS = "wikitable sortable spstats plainlinks hoverable-rows"
+HEADER_ROWS = 5
+
+
+def _read_rows(filename):
+    with open(os.path.join(DATA_DIR, filename), newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader)
+        rows = {}
+        for row in reader:
+            rows.setdefault((row[0], row[1]), []).append(row)
+        return rows
+
+
+def _chrome():
+    nav = ''.join(
+        f"<li class='wds-dropdown'><a href='/wiki/Nav_{i}' title='Nav {i}'><span>Nav {i}</span></a>"
+        f"<ul>{''.join(f'<li><a href=/wiki/Nav_{i}_{j}>Item {j}</a></li>' for j in range(12))}</ul></li>"
+        for i in range(60)
+    )
+    standings = ''.join(
+        f"<tr><td><a href='/wiki/Team_{i}' title='Team {i}'>Team {i}</a></td><td>{i}</td><td>{20 - i}</td></tr>"
+        for i in range(20)
+    )
+    sidebar = ''.join(f"<div class='sidebar-item'><a href='/wiki/Page_{i}'>Related page {i}</a></div>" for i in range(300))
+    return (
+        f"<header><nav><ul>{nav}</ul></nav></header>",
+        f"<table class='wikitable standings'>{standings}</table><aside>{sidebar}</aside>"
+        f"<footer>{'<p>Community content is available under CC-BY-SA unless otherwise noted.</p>' * 50}</footer>",
+    )
+
+
+HEADER_HTML, FOOTER_HTML = _chrome()
+
+
+def _page(title, table):
+    return (
+        f"<!DOCTYPE html><html><head><title>{html.escape(title)}</title></head><body>{HEADER_HTML}"
+        f"<div id='content'><h1>{html.escape(title)}</h1>{table}</div>{FOOTER_HTML}</body></html>"
+    )
+
+
+def _stats_table(body_rows):
+    header = ''.join(f"<tr><th colspan='30'>header {i}</th></tr>" for i in range(HEADER_ROWS))
+    return f"<table class='{TABLE_CLASS}'>{header}{''.join(body_rows)}</table>"
+
+
+def _cells(values):
+    return ''.join(f"<td>{html.escape(v)}</td>" for v in values)
+
+
+def _spans(titles):
+    return ''.join(f"<span title=\"{html.escape(t)}\"></span>" for t in titles)
+
+
+def champion_page(rows):
+    body = []
+    for row in rows:
+        champion, values, roles = row[2], row[3:-1], ast.literal_eval(row[-1])
+        first = f"<td><span class='markup-object-name'>{html.escape(champion)}</span></td>"
+        body.append(f"<tr>{first}{_cells(values)}<td>{_spans(roles)}</td></tr>")
+    return _page('Champion Statistics', _stats_table(body))
+
+
+def player_page(rows):
+    body = []
+    for row in rows:
+        team, values, champs = row[2], row[3:-2], ast.literal_eval(row[-2])
+        first = f"<td><a href='#' title=\"{html.escape(team)}\">{html.escape(team)}</a></td>"
+        body.append(f"<tr>{first}{_cells(values)}<td>{_spans(champs)}</td></tr>")
+    return _page('Player Statistics', _stats_table(body))
+
+
+def roster_page(rows):
+    body = []
+    for row in rows:
+        player, role = row[3], row[-1]
+        if not role:
+            continue
+        body.append(
+            "<tr class='multirow-highlighter'>"
+            f"<td class='extended-rosters-team'>{html.escape(row[2])}</td>"
+            f"<td class='extended-rosters-id'>{html.escape(player)}</td>"
+            f"<td class='extended-rosters-role'><span title=\"{html.escape(role)}\"></span></td>"
+            "</tr>"
+        )
+    return _page('Team Rosters', f"<table class='wikitable'>{''.join(body)}</table>")
+
+
+def build_site():
+    """Map every wiki path the crawlers request to its HTML body."""
+    site = {}
+    for (year, tournament), rows in _read_rows('champion_stats.csv').items():
+        site[f'/wiki/VCS/{year}_Season/{tournament}/Champion_Statistics'] = champion_page(rows)
+    for (year, tournament), rows in _read_rows('player_stats.csv').items():
+        site[f'/wiki/VCS/{year}_Season/{tournament}/Player_Statistics'] = player_page(rows)
+        site[f'/wiki/VCS/{year}_Season/{tournament}/Team_Rosters'] = roster_page(rows)
+    return {path: body.encode('utf-8') for path, body in site.items()}
+
+
+def make_handler(site, latency, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            body = site.get(self.path)
+            # Hashed per request so tests can edit `site` while the server runs
+            etag = '"%s"' % hashlib.sha1(body).hexdigest() if body is not None else None
+            if body is None:
+                status, body = 404, b'Not found'
+            elif self.headers.get('If-None-Match') == etag:
+                status, body = 304, b''
+            else:
+                status = 200
+            with stats['lock']:
+                stats[status] = stats.get(status, 0) + 1
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class FixtureServer:
+    def __init__(self, url, stats):
+        self.url = url
+        self.stats = stats
+
+    def count(self, status):
+        return self.stats.get(status, 0)
+
+    def reset(self):
+        with self.stats['lock']:
+            for key in [k for k in self.stats if k != 'lock']:
+                del self.stats[key]
+
+
+def save_fixtures(directory, year=2024, tournament='Summer_Season'):
+    """Write one tournament's pages to `directory` as `<Page>.html` files."""
+    os.makedirs(directory, exist_ok=True)
+    site = build_site()
+    for page in ('Champion_Statistics', 'Player_Statistics', 'Team_Rosters'):
+        with open(os.path.join(directory, f'{page}.html'), 'wb') as f:
+            f.write(site[f'/wiki/VCS/{year}_Season/{tournament}/{page}'])
+
+
+@contextmanager
+def serve(latency=0.0, site=None):
+    """Run the fixture server on a free port and yield it (`.url`, per-status `.count()`)."""
+    stats = {'lock': threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(site or build_site(), latency, stats))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield FixtureServer(f'http://127.0.0.1:{server.server_address[1]}', stats)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds of delay per request')
+    parser.add_argument('--save', metavar='DIR', help='write one tournament\'s pages to DIR and exit')
+    args = parser.parse_args()
+    if args.save:
+        save_fixtures(args.save)
+        raise SystemExit
+    with serve(args.latency) as server:
+        print(f'Serving fixture pages at {server.url} (Ctrl+C to stop)')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,167 @@
+"""
+Local stand-in for the DeepSeek chat completions API (OpenAI-compatible).
+
+POST /v1/chat/completions answers with a fixed reply: a sentence of preamble,
+a fenced Plotly code block, then a long explanation, which is what the model
+tends to produce despite the prompt. With "stream": true the reply is sent as
+server-sent events (`data: {"choices": [{"delta": {"content": ...}}]}` chunks,
+a usage chunk when stream_options.include_usage is set, then `data: [DONE]`),
+one token every --token-delay seconds after --first-token seconds. Without it
+the whole reply is returned after the same total time. --errors makes the
+first requests fail with the given statuses (e.g. 503,503,429) to exercise
+retries and the circuit breaker.
+
+Point the app at it with DEEPSEEK_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CODE = """import plotly.express as px
+
+top = df.groupby('Champion', observed=True)['WR'].mean().nlargest(10).round(2).reset_index()
+fig = px.bar(top, x='Champion', y='WR', title='Top 10 tướng có tỉ lệ thắng cao nhất',
+             color_discrete_sequence=['#C89B3C'])
+fig.update_layout(xaxis_title='Tướng', yaxis_title='Tỉ lệ thắng (%)')"""
+
+EXPLANATION = (
+    "Giải thích: đoạn code trên nhóm dữ liệu theo tướng, tính tỉ lệ thắng trung bình, chọn 10 tướng cao nhất "
+    "và vẽ biểu đồ cột với màu vàng chủ đạo. Nhãn trục và tiêu đề được đặt rõ ràng, giá trị được làm tròn "
+    "đến hai chữ số thập phân. "
+) * 6
+
+REPLY = f"Dưới đây là code Plotly theo yêu cầu:\n\n```python\n{CODE}\n```\n\n{EXPLANATION}"
+
+
+def tokens(text):
+    """Split text into chunks roughly the size of model tokens (words with their trailing space)."""
+    return re.findall(r'\S+\s*|\s+', text)
+
+
+def make_handler(reply, first_token, token_delay, stats, errors):
+    errors = list(errors)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes: without this, keep-alive replies stall on delayed ACKs
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with stats['lock']:
+                stats['connections'] = stats.get('connections', 0) + 1
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            with stats['lock']:
+                stats['requests'] = stats.get('requests', 0) + 1
+                stats['last_request'] = body
+                status = errors.pop(0) if errors else None
+            if status:
+                self._error(status)
+                return
+            content = reply(body) if callable(reply) else reply
+            pieces = tokens(content)
+            usage = {'prompt_tokens': sum(len(m.get('content', '')) // 4 for m in body.get('messages', [])),
+                     'completion_tokens': len(pieces)}
+            time.sleep(first_token)
+            if body.get('stream'):
+                self._stream(body, pieces, usage)
+            else:
+                time.sleep(token_delay * len(pieces))
+                self._json({'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                         'finish_reason': 'stop'}], 'usage': usage})
+
+        def _json(self, data):
+            payload = json.dumps(data).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _error(self, status):
+            payload = json.dumps({'error': {'message': f'mock error {status}'}}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            if status == 429:
+                self.send_header('Retry-After', '0')
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, body, pieces, usage):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            sent = 0
+            try:
+                for piece in pieces:
+                    chunk = {'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]}
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                    self.wfile.flush()
+                    sent += 1
+                    time.sleep(token_delay)
+                if (body.get('stream_options') or {}).get('include_usage'):
+                    self.wfile.write(f"data: {json.dumps({'choices': [], 'usage': usage})}\n\n".encode('utf-8'))
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                # Client stopped reading once it had the code block
+                pass
+            with stats['lock']:
+                stats['streamed_tokens'] = stats.get('streamed_tokens', 0) + sent
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class MockServer:
+    def __init__(self, url, stats):
+        self.url = url
+        self.stats = stats
+
+
+@contextmanager
+def serve(first_token=0.3, token_delay=0.02, reply=REPLY, port=0, errors=()):
+    """
+    Run the stand-in server (on a free port by default) and yield it (`.url` is the API base URL).
+    `reply` is the canned reply, or a function of the request body returning one.
+    `errors` are HTTP statuses returned, in order, to the first requests instead of a reply.
+    """
+    stats = {'lock': threading.Lock()}
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(reply, first_token, token_delay, stats, errors))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield MockServer(f'http://127.0.0.1:{server.server_address[1]}/v1', stats)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--first-token', type=float, default=0.8, help='seconds before the first token')
+    parser.add_argument('--token-delay', type=float, default=0.03, help='seconds between tokens')
+    parser.add_argument('--errors', default='', help='comma-separated statuses for the first requests, e.g. 503,429')
+    args = parser.parse_args()
+    errors = [int(status) for status in args.errors.split(',') if status]
+    with serve(args.first_token, args.token_delay, port=args.port, errors=errors) as server:
+        print(f'DEEPSEEK_BASE_URL={server.url} (Ctrl+C to stop)')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,387 @@
+"""
+Offline benchmark suite for the crawl -> preprocess -> serve pipeline.
+
+Scenarios (each runs in its own process so peak RSS is its own):
+    parse_champions   champions.parse_champion_stats on the fixture page
+    parse_player      player.parse_player_stats on the fixture roster + stats pages
+    preprocess_1x     pipeline.preprocess on data/lol-data/*.csv
+    preprocess_10x    ... on a synthetic copy 10 times larger
+    preprocess_100x   ... and 100 times larger
+    api_plot          POST /api/plot over HTTP from --concurrency clients, with
+                      DeepSeek replaced by mock_deepseek.py serving canned snippets
+
+Each scenario reports ops, throughput (ops/s), p50/p95/p99 latency (ms) and
+peak RSS (MB, of the scenario process; sandbox workers are not included).
+Results are written as JSON to --output. With --baseline they are compared to a
+stored run, and a metric that got worse by more than --threshold (relative)
+and by more than a small absolute margin is flagged; the exit status is 1 if
+anything regressed. --save-baseline stores this run as the new baseline.
+
+    python suite.py                         # run everything, compare to baseline.json
+    python suite.py parse_player api_plot   # a subset
+    python suite.py --save-baseline         # after an intended change in performance
+
+The pages in fixtures/ are not saved from lol.fandom.com: they are generated
+by fixture_server.py (`python fixture_server.py --save fixtures`) from the 2024
+Summer_Season rows of data/lol-data/*.csv. They use the table markup the
+crawlers parse, wrapped in made-up navigation, sidebar and footer filler of
+roughly a real page's size, so parse timings are indicative, not a measurement
+of the live wiki.
+
+Synthetic scale: every copy of the raw data gets its teams, players and
+champions renamed (`<name> #<copy>`), so groups grow with the scale factor the
+way a longer league history would, and results are deterministic.
+"""
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import warnings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+DEFAULT_BASELINE = os.path.join(HERE, 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(HERE, 'results', 'latest.json')
+
+# Scenario -> minimum number of timed runs and minimum timed seconds (whichever comes last)
+BUDGETS = {
+    'parse_champions': (50, 2.0),
+    'parse_player': (50, 2.0),
+    'preprocess_1x': (20, 2.0),
+    'preprocess_10x': (5, 2.0),
+    'preprocess_100x': (2, 0.0),
+    'api_plot': (0, 0.0),
+}
+SCENARIOS = list(BUDGETS)
+
+# Metric -> (higher is better, absolute change below which nothing is flagged)
+METRICS = {
+    'throughput': (True, 0.0),
+    'p50_ms': (False, 2.0),
+    'p95_ms': (False, 2.0),
+    'p99_ms': (False, 2.0),
+    'peak_rss_mb': (False, 16.0),
+}
+
+# Questions for api_plot: the first ones are answered by the fast path, the rest go to the stub
+QUESTIONS = [
+    ('champion', 'Hiển thị top 10 tướng có tỉ lệ thắng cao nhất'),
+    ('player', 'Top 5 tuyển thủ có KDA cao nhất'),
+    ('champion', 'Xu hướng tỉ lệ cấm chọn trung bình qua các năm'),
+    ('champion', 'So sánh sức mạnh của các tướng đường giữa và đường trên'),
+    ('champion', 'Vẽ biểu đồ phân tán giữa KDA và tỉ lệ thắng của các tướng'),
+    ('champion', 'Những tướng nào được chơi nhiều nhưng ít khi thắng'),
+]
+
+BAR_CODE = """import plotly.express as px
+
+top = df.groupby('Champion', observed=True)['WR'].mean().nlargest(10).round(2).reset_index()
+fig = px.bar(top, x='Champion', y='WR', title='Top 10 tướng', color_discrete_sequence=['#C89B3C'])"""
+
+SCATTER_CODE = """import plotly.express as px
+
+stats = df.groupby('Champion', observed=True)[['KDA', 'WR', 'GP']].mean().reset_index()
+fig = px.scatter(stats, x='KDA', y='WR', size='GP', hover_name='Champion', title='KDA và tỉ lệ thắng')"""
+
+
+def canned_reply(body):
+    """Snippet for the question in the request: a scatter plot when asked for one, otherwise a bar chart."""
+    question = body['messages'][-1]['content']
+    code = SCATTER_CODE if 'phân tán' in question else BAR_CODE
+    return f"Đây là code:\n\n```python\n{code}\n```\n\nGiải thích ngắn gọn về biểu đồ."
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(latencies, elapsed, **extra):
+    return {
+        'ops': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        **extra,
+    }
+
+
+def time_calls(fn, min_runs, min_seconds, warmup=1):
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < min_runs or time.perf_counter() - start < min_seconds:
+        t = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - start
+
+
+# ---------------------------------------------------------------- scenarios
+
+def _fixture(page):
+    with open(os.path.join(HERE, 'fixtures', f'{page}.html'), encoding='utf-8') as f:
+        return f.read()
+
+
+def bench_parse_champions(args):
+    sys.path.insert(0, os.path.join(ROOT, 'crawling-data'))
+    import champions
+    html = _fixture('Champion_Statistics')
+    rows = champions.parse_champion_stats(html, 2024, 'Summer_Season')
+    latencies, elapsed = time_calls(lambda: champions.parse_champion_stats(html, 2024, 'Summer_Season'),
+                                    *BUDGETS['parse_champions'])
+    return summarize(latencies, elapsed, rows=len(rows))
+
+
+def bench_parse_player(args):
+    sys.path.insert(0, os.path.join(ROOT, 'crawling-data'))
+    import player
+    roster, stats = _fixture('Team_Rosters'), _fixture('Player_Statistics')
+    rows = player.parse_player_stats(roster, stats, 2024, 'Summer_Season')
+    latencies, elapsed = time_calls(lambda: player.parse_player_stats(roster, stats, 2024, 'Summer_Season'),
+                                    *BUDGETS['parse_player'])
+    return summarize(latencies, elapsed, rows=len(rows))
+
+
+def scale_raw(player_raw, champion_raw, factor):
+    """Raw data `factor` times larger: copy i renames teams, players and champions with ` #i`."""
+    import pandas as pd
+    if factor == 1:
+        return player_raw, champion_raw
+    players, champions = [], []
+    for i in range(factor):
+        suffix = f' #{i}' if i else ''
+        players.append(player_raw.assign(Team=player_raw['Team'] + suffix, Player=player_raw['Player'] + suffix))
+        champions.append(champion_raw.assign(Champion=champion_raw['Champion'] + suffix))
+    return pd.concat(players, ignore_index=True), pd.concat(champions, ignore_index=True)
+
+
+def bench_preprocess(factor):
+    def run(args):
+        sys.path.insert(0, os.path.join(ROOT, 'preprocessing-data'))
+        import pipeline
+        warnings.simplefilter('ignore')
+        player_raw, champion_raw = scale_raw(*pipeline.load_raw('csv'), factor)
+        dates, overrides = pipeline.load_dates(), pipeline.load_role_overrides()
+        latencies, elapsed = time_calls(lambda: pipeline.preprocess(player_raw, champion_raw, dates, overrides),
+                                        *BUDGETS[f'preprocess_{factor}x'])
+        return summarize(latencies, elapsed, rows=len(player_raw) + len(champion_raw))
+    return run
+
+
+def bench_api_plot(args):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    import requests
+    from mock_deepseek import serve
+
+    os.environ['LLM_CACHE_DISABLED'] = '1'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    os.environ.setdefault('DEEPSEEK_API_KEY', 'benchmark')
+    with serve(first_token=args.llm_first_token, token_delay=args.llm_token_delay, reply=canned_reply) as llm:
+        os.environ['DEEPSEEK_BASE_URL'] = llm.url
+        sys.path.insert(0, os.path.join(ROOT, 'src'))
+        from werkzeug.serving import make_server
+        import app
+
+        server = make_server('127.0.0.1', 0, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_port}/api/plot'
+        local = threading.local()
+        sources, failures = {}, []
+        lock = threading.Lock()
+
+        def request(i):
+            session = getattr(local, 'session', None) or requests.Session()
+            local.session = session
+            dataset, question = QUESTIONS[i % len(QUESTIONS)]
+            start = time.perf_counter()
+            response = session.post(url, json={'user_input': question, 'dataset': dataset},
+                                    headers={'Accept-Encoding': 'gzip'}, timeout=120)
+            latency = time.perf_counter() - start
+            with lock:
+                if response.status_code == 200:
+                    source = response.json().get('source')
+                    sources[source] = sources.get(source, 0) + 1
+                else:
+                    failures.append(response.status_code)
+            return latency
+
+        try:
+            # Warm up: load datasets, start the sandbox workers, open connections
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                list(pool.map(request, range(len(QUESTIONS))))
+            sources.clear()
+            failures.clear()
+            total = args.concurrency * args.requests
+            start = time.perf_counter()
+            with ThreadPoolExecutor(args.concurrency) as pool:
+                latencies = list(pool.map(request, range(total)))
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            if app.plot_sandbox:
+                app.plot_sandbox.close()
+    return summarize(latencies, elapsed, concurrency=args.concurrency, sources=sources, failures=len(failures))
+
+
+RUNNERS = {
+    'parse_champions': bench_parse_champions,
+    'parse_player': bench_parse_player,
+    'preprocess_1x': bench_preprocess(1),
+    'preprocess_10x': bench_preprocess(10),
+    'preprocess_100x': bench_preprocess(100),
+    'api_plot': bench_api_plot,
+}
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+# ---------------------------------------------------------------- runner
+
+def run_scenario(name, args):
+    """Run one scenario in a fresh interpreter and return its result dict."""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', name,
+               '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+               '--llm-first-token', str(args.llm_first_token), '--llm-token-delay', str(args.llm_token_delay)]
+    completed = subprocess.run(command, cwd=HERE, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise SystemExit(f'{name} failed:\n{completed.stderr[-4000:]}')
+    return json.loads(lines[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, threshold):
+    """Rows (scenario, metric, baseline, current, relative change, regressed) for metrics in both runs."""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric, (higher_is_better, margin) in METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None or not old:
+                continue
+            if metric == 'p99_ms' and current['ops'] < 100:
+                # p99 of fewer than 100 samples is the slowest run: reported, but too noisy to flag
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            regressed = worse > threshold and abs(new - old) > margin
+            rows.append((name, metric, old, new, change, regressed))
+        if current.get('failures', 0) > previous.get('failures', 0):
+            rows.append((name, 'failures', previous.get('failures', 0), current['failures'], float('inf'), True))
+    return rows
+
+
+def print_results(results):
+    print(f"{'scenario':16s} {'ops':>6s} {'ops/s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'peak MB':>8s}")
+    for name, r in results.items():
+        rss = f"{r['peak_rss_mb']:8.0f}" if r.get('peak_rss_mb') is not None else f"{'-':>8s}"
+        print(f"{name:16s} {r['ops']:6d} {r['throughput']:9.2f} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} "
+              f"{r['p99_ms']:9.2f} {rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help=f"any of {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='where to write the results JSON')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='results JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative change flagged as a regression')
+    parser.add_argument('--concurrency', type=int, default=8, help='api_plot: concurrent clients')
+    parser.add_argument('--requests', type=int, default=10, help='api_plot: requests per client')
+    parser.add_argument('--llm-first-token', type=float, default=0.3, help='api_plot: stub latency to first token')
+    parser.add_argument('--llm-token-delay', type=float, default=0.005, help='api_plot: stub seconds per token')
+    parser.add_argument('--worker', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario {', '.join(unknown)}; choose from {', '.join(SCENARIOS)}")
+
+    if args.worker:
+        result = RUNNERS[args.worker](args)
+        result['peak_rss_mb'] = peak_rss_mb()
+        print(json.dumps(result))
+        return
+
+    results = {}
+    for name in args.scenarios or SCENARIOS:
+        print(f'running {name}...', file=sys.stderr)
+        results[name] = run_scenario(name, args)
+    print_results(results)
+
+    run = {
+        'meta': {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'settings': {key: getattr(args, key) for key in
+                         ('concurrency', 'requests', 'llm_first_token', 'llm_token_delay')},
+        },
+        'scenarios': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(run, f, indent=2, ensure_ascii=False)
+    print(f'results written to {args.output}')
+
+    status = 0
+    if args.save_baseline:
+        baseline = {'meta': run['meta'], 'scenarios': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline['scenarios'] = json.load(f)['scenarios']
+        baseline['scenarios'].update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f'baseline updated: {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline['scenarios'], args.threshold)
+        if baseline['meta'].get('settings') != run['meta']['settings'] or baseline['meta'].get('cpus') != os.cpu_count():
+            print('\nnote: the baseline was recorded with other settings or on another machine')
+        print(f"\ncompared with baseline from {baseline['meta'].get('timestamp')} "
+              f"(commit {baseline['meta'].get('commit')}), threshold {args.threshold:.0%}")
+        for name, metric, old, new, change, regressed in rows:
+            flag = 'REGRESSION' if regressed else ''
+            print(f'{name:16s} {metric:12s} {old:10.2f} -> {new:10.2f}  {change:+7.1%}  {flag}')
+        regressions = [row for row in rows if row[-1]]
+        if regressions:
+            print(f'\n{len(regressions)} regression(s)')
+            status = 1
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import csv
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Point this at a local fixture server to crawl offline
+BASE_URL = os.environ.get('LOL_FANDOM_BASE_URL', 'https://lol.fandom.com').rstrip('/')
+
+SEASONS = ['Spring', 'Summer', 'Winter']
+TOURS = ['Promotion', 'Season', 'Playoffs',]
+
+# Status codes worth retrying, everything else is raised immediately
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# `changed` is False when the server answered 304 or sent back the body we already had
+Page = namedtuple('Page', ['text', 'changed'])
+
+# Returned by a crawl task in incremental mode when none of its pages changed
+UNCHANGED = object()
+
+# How long a 404 is remembered: a week for past seasons, a few hours for the current one
+MISSING_TTL = 7 * 24 * 3600
+CURRENT_MISSING_TTL = 6 * 3600
+SEASON_YEAR = re.compile(r'/(\d{4})_Season/')
+
+# Histogram buckets (seconds) for the fetch and parse stages
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+log = logging.getLogger('crawler')
+
+
+def tournaments(years):
+    """Return (year, tournament) pairs in the order the CSVs have always been written."""
+    if isinstance(years, int):
+        years = [years]
+    return [(year, f'{season}_{tour}') for year in years for season in SEASONS for tour in TOURS]
+
+
+def tournament_url(year, tournament, page):
+    return f'{BASE_URL}/wiki/VCS/{year}_Season/{tournament}/{page}'
+
+
+class RateLimiter:
+    """Spaces out requests to the same host so we never exceed `rate` requests per second."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, host):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CrawlMetrics:
+    """
+    Stage timings and request counters for one crawl run.
+
+    `write_textfile` exports them in the Prometheus text format, e.g. into the
+    node_exporter textfile collector directory, since a crawl is a batch job
+    with no endpoint to scrape.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, stage, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.timings.setdefault(stage, []).append(seconds)
+            log.debug('span stage=%s seconds=%.4f %s', stage, seconds,
+                      ' '.join(f'{key}={value}' for key, value in fields.items()))
+
+    def count(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def summary(self):
+        """One line per stage: count, median and p95 in milliseconds."""
+        lines = []
+        for stage, values in sorted(self.timings.items()):
+            ordered = sorted(values)
+            p50 = ordered[len(ordered) // 2] * 1000
+            p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000
+            lines.append(f'{stage}: {len(ordered)} x, p50 {p50:.0f} ms, p95 {p95:.0f} ms')
+        return lines
+
+    def render(self, job):
+        lines = ['# HELP lol_crawl_stage_seconds Time spent fetching and parsing pages',
+                 '# TYPE lol_crawl_stage_seconds histogram']
+        for stage, values in sorted(self.timings.items()):
+            for bound in STAGE_BUCKETS:
+                count = sum(1 for v in values if v <= bound)
+                lines.append(f'lol_crawl_stage_seconds_bucket{{job="{job}",stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'lol_crawl_stage_seconds_bucket{{job="{job}",stage="{stage}",le="+Inf"}} {len(values)}')
+            lines.append(f'lol_crawl_stage_seconds_sum{{job="{job}",stage="{stage}"}} {sum(values)}')
+            lines.append(f'lol_crawl_stage_seconds_count{{job="{job}",stage="{stage}"}} {len(values)}')
+        names = sorted({name for name, _ in self.counters})
+        for name in names:
+            lines.append(f'# TYPE lol_crawl_{name}_total counter')
+            for (counter, labels), value in sorted(self.counters.items()):
+                if counter == name:
+                    pairs = ','.join([f'job="{job}"'] + [f'{key}="{value}"' for key, value in labels])
+                    lines.append(f'lol_crawl_{name}_total{{{pairs}}} {value}')
+        lines.append('# TYPE lol_crawl_last_run_timestamp_seconds gauge')
+        lines.append(f'lol_crawl_last_run_timestamp_seconds{{job="{job}"}} {time.time():.0f}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path, job):
+        """Write the metrics atomically so a collector never reads a half-written file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(self.render(job))
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class CrawlEngine:
+    """
+    Shared fetcher for the crawl scripts.
+
+    A bounded thread pool runs the tasks, all threads share one keep-alive session,
+    every request goes through the per-host rate limiter and transient failures
+    (connection errors, 429, 5xx) are retried with exponential backoff.
+
+    With an `HttpCache` attached, pages seen before are revalidated with a
+    conditional GET and a 304 is served from the cache. Pages fetched with
+    `defer=True` only reach the cache once `commit` is called, i.e. after
+    their rows have been written: if parsing or writing fails, the next run
+    sees the page as changed again instead of getting a 304. A 404 is
+    remembered and not requested again for `missing_ttl` seconds, or only
+    `current_missing_ttl` seconds for a page of the current (or a later) year,
+    whose wiki page may be created any day.
+
+    Fetch timings, response statuses, retries and bytes are recorded in
+    `metrics`; the crawl scripts time their parsing with `metrics.span('parse')`.
+    """
+
+    def __init__(self, max_workers=8, rate=5.0, retries=3, backoff=0.5, timeout=(5, 30), cache=None,
+                 missing_ttl=MISSING_TTL, current_missing_ttl=CURRENT_MISSING_TTL):
+        self.max_workers = max_workers
+        self.cache = cache
+        self.missing_ttl = missing_ttl
+        self.current_missing_ttl = current_missing_ttl
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate)
+        self.metrics = CrawlMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def missing_ttl_for(self, url):
+        """Seconds a 404 for `url` is trusted; pages without a season year count as current."""
+        match = SEASON_YEAR.search(urlsplit(url).path)
+        if match and int(match.group(1)) < time.localtime().tm_year:
+            return self.missing_ttl
+        return self.current_missing_ttl
+
+    def fetch(self, url):
+        """GET `url` and return the response body, retrying transient failures."""
+        return self.fetch_page(url).text
+
+    def fetch_page(self, url, defer=False):
+        """
+        Like `fetch`, but also reports whether the page changed since it was cached.
+
+        With `defer=True` a new or changed page is held back from the cache until `commit(url)`.
+        """
+        if self.cache:
+            missing_since = self.cache.missing_since(url)
+            if missing_since is not None and time.time() - missing_since < self.missing_ttl_for(url):
+                self.metrics.count('requests', status='404_cached')
+                raise _not_found(url)
+        entry = self.cache.get(url) if self.cache else None
+        headers = entry.conditional_headers() if entry else {}
+        try:
+            # Includes the time spent waiting on the rate limiter and between retries
+            with self.metrics.span('fetch', url=url):
+                response = self._get(url, headers)
+        except requests.HTTPError as e:
+            self.metrics.count('requests', status=e.response.status_code)
+            if self.cache and e.response.status_code == 404:
+                self.cache.store_missing(url)
+            raise
+        self.metrics.count('requests', status=response.status_code)
+        self.metrics.count('response_bytes', len(response.content))
+        if response.status_code == 304 and entry:
+            return Page(entry.text, False)
+        if self.cache:
+            if defer:
+                with self._pending_lock:
+                    self._pending[url] = response
+            else:
+                self.cache.store(url, response)
+        return Page(response.text, entry is None or entry.text != response.text)
+
+    def commit(self, urls):
+        """Save pages fetched with `defer=True` to the cache, once their rows are safely written."""
+        for url in urls:
+            with self._pending_lock:
+                response = self._pending.pop(url, None)
+            if response is not None and self.cache:
+                self.cache.store(url, response)
+
+    def _get(self, url, headers):
+        host = urlsplit(url).netloc
+        attempt = 0
+        while True:
+            self.rate_limiter.wait(host)
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    response.raise_for_status()  # Check for HTTP errors
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            self.metrics.count('retries')
+            # Exponential backoff with a little jitter so workers don't retry in lockstep
+            time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random() / 2))
+
+    def map(self, fn, items):
+        """
+        Run `fn(item)` for every item on the worker pool.
+
+        Results come back in the same order as `items`; a task that raised
+        yields its exception instead of a value so one bad page doesn't abort the run.
+        """
+        def run(item):
+            try:
+                return fn(item)
+            except Exception as e:
+                self.metrics.count('task_errors')
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run, items))
+
+
+def _not_found(url):
+    # Same shape as a live 404 so callers (and DatasetStore) can't tell the difference
+    response = requests.Response()
+    response.status_code = 404
+    response.url = url
+    return requests.HTTPError(f'404 Client Error: Not Found (cached) for url: {url}', response=response)
+
+
+def read_tournaments(csv_filename):
+    """Load an existing crawl CSV as (headers, {(year, tournament): rows}) keeping file order."""
+    if not os.path.exists(csv_filename):
+        return None, {}
+    with open(csv_filename, newline='', encoding='utf-8') as csvfile:
+        reader = csv.reader(csvfile)
+        headers = next(reader, None)
+        partitions = {}
+        for row in reader:
+            partitions.setdefault((int(row[0]), row[1]), []).append(row)
+    return headers, partitions
+
+
+def splice_tournaments(csv_filename, headers, tasks, results):
+    """
+    Rewrite `csv_filename` with freshly parsed tournaments spliced in.
+
+    Tournaments whose result is `UNCHANGED` or an exception keep the rows already
+    in the file. The file is replaced atomically so a failed run never truncates it.
+    """
+    _, existing = read_tournaments(csv_filename)
+    merged = {}
+    for task, result in zip(tasks, results):
+        if result is UNCHANGED or isinstance(result, Exception):
+            if task in existing:
+                merged[task] = existing[task]
+        else:
+            merged[task] = result
+    # Tournaments outside this run (e.g. other years) are kept as they were
+    for key, rows in existing.items():
+        merged.setdefault(key, rows)
+
+    directory = os.path.dirname(os.path.abspath(csv_filename))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(headers)
+            for rows in merged.values():
+                writer.writerows(rows)
+        os.replace(tmp, csv_filename)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,309 @@
+"""
+Partitioned columnar store for the crawled datasets.
+
+Every (Year, Tournamment) lives in its own Parquet file:
+
+    <root>/Year=2018/Tournamment=Spring_Season/part.parquet
+
+Writing a partition replaces that one file atomically, so re-crawling a
+tournament is an idempotent upsert and a crashed run never leaves half a
+tournament behind. `_manifest.json` records the outcome of every crawl
+attempt, so a tournament that failed shows up as a gap instead of silently
+missing rows. Readers can prune by partition and by column.
+
+Stat columns are stored as numbers: int64 when every value of the partition
+is a whole number, float64 otherwise. '92.5%' is stored as 92.5 and '12.3k'
+as 12300 (the suffix is kept per column in the schema metadata), and '-' as
+null. A value that would not print back to the crawled text (say '5.0', or a
+suffix the rest of the column lacks) also keeps its text in a `<column>:text`
+column, which only exists in partitions that need it; the CSV export uses it
+to reproduce the crawled file exactly.
+"""
+import argparse
+import ast
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
+
+from crawler import SEASONS, TOURS, UNCHANGED
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE_DIR = os.path.join(ROOT, 'data', 'lol-data', 'store')
+
+# Columns holding a list of names, stored as list<string> instead of a Python repr
+LIST_COLUMNS = {'As', 'Champs'}
+# Columns kept as text; every other column is a stat and stored as a number
+TEXT_COLUMNS = {'Tournamment', 'Champion', 'Team', 'Player', 'Role'}
+# How the wiki prints a missing stat
+MISSING_TEXT = '-'
+TEXT_SUFFIX = ':text'
+
+NUMBER_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?)([%k]?)')
+SCALE = {'': 1, '%': 1, 'k': 1000}
+
+STATUS_OK = 'ok'
+STATUS_FAILED = 'failed'
+STATUS_MISSING = 'missing'  # the wiki has no page for this tournament
+
+
+def unique_columns(headers):
+    """Rename repeated headers the way pandas.read_csv does ('G', 'G' -> 'G', 'G.1')."""
+    seen = {}
+    columns = []
+    for header in headers:
+        if header in seen:
+            seen[header] += 1
+            columns.append(f'{header}.{seen[header]}')
+        else:
+            seen[header] = 0
+            columns.append(header)
+    return columns
+
+
+def _sort_key(year, tournament):
+    season, tour = tournament.split('_', 1)
+    return (year, SEASONS.index(season) if season in SEASONS else len(SEASONS),
+            TOURS.index(tour) if tour in TOURS else len(TOURS), tournament)
+
+
+def _parse_stat(text):
+    """(number, suffix) for a crawled stat such as '12', '92.5%' or '12.3k'; None if it is not a number."""
+    match = NUMBER_PATTERN.fullmatch(text)
+    if match is None:
+        return None
+    value, suffix = match.groups()
+    return (int(value) if '.' not in value and suffix != 'k' else round(float(value) * SCALE[suffix], 6)), suffix
+
+
+def _format_stat(number, suffix):
+    """Inverse of `_parse_stat`: the text the wiki would print for `number`."""
+    if number is None:
+        return MISSING_TEXT
+    number = round(number / SCALE[suffix], 6) if suffix == 'k' else number
+    if isinstance(number, float) and number.is_integer():
+        number = int(number)
+    return f'{number!r}{suffix}'
+
+
+def _stat_column(values):
+    """Arrow array of the parsed values, the column's suffix and the text of values that don't print back."""
+    numbers, texts, suffix = [], [], None
+    for value in values:
+        parsed = None if value is None or value == MISSING_TEXT else _parse_stat(str(value))
+        if parsed is not None and suffix is None:
+            suffix = parsed[1]
+        number = parsed[0] if parsed is not None and parsed[1] == suffix else None
+        numbers.append(number)
+        text = '' if value is None else str(value)
+        texts.append(None if _format_stat(number, suffix or '') == text else text)
+    kind = pa.int64() if all(n is None or isinstance(n, int) for n in numbers) else pa.float64()
+    text_array = None if all(t is None for t in texts) else pa.array(texts, pa.string())
+    return pa.array(numbers, kind), suffix or '', text_array
+
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _csv_value(record, column, suffixes):
+    if column not in suffixes:
+        return '' if record[column] is None else record[column]
+    text = record.get(column + TEXT_SUFFIX)
+    return text if text is not None else _format_stat(record[column], suffixes[column])
+
+
+class DatasetStore:
+    """One entity (e.g. champion_stats) partitioned by Year/Tournamment."""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    @classmethod
+    def named(cls, name, base=DEFAULT_STORE_DIR):
+        return cls(os.path.join(base, name))
+
+    # ------------------------------------------------------------------ layout
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.root, '_manifest.json')
+
+    def partition_path(self, year, tournament):
+        return os.path.join(self.root, f'Year={year}', f'Tournamment={tournament}', 'part.parquet')
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _update_manifest(self, year, tournament, **entry):
+        with self._lock:
+            manifest = self.manifest()
+            key = f'{year}/{tournament}'
+            manifest[key] = {**manifest.get(key, {}), **entry, 'updated_at': time.time()}
+
+            def write(tmp):
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(manifest, f, indent=1, sort_keys=True)
+
+            _write_atomic(self.manifest_path, write)
+
+    # ------------------------------------------------------------------ writes
+
+    def write_partition(self, year, tournament, headers, rows):
+        """Replace the (year, tournament) partition with `rows` laid out as `headers`."""
+        columns = unique_columns(headers)
+        data, suffixes = {}, {}
+        for i, column in enumerate(columns):
+            values = [row[i] for row in rows]
+            if column == 'Year':
+                data[column] = pa.array([int(v) for v in values], pa.int32())
+            elif column in LIST_COLUMNS:
+                values = [ast.literal_eval(v) if isinstance(v, str) else v for v in values]
+                data[column] = pa.array(values, pa.list_(pa.string()))
+            elif column in TEXT_COLUMNS:
+                data[column] = pa.array([None if v is None else str(v) for v in values], pa.string())
+            else:
+                data[column], suffixes[column], text = _stat_column(values)
+                if text is not None:
+                    data[column + TEXT_SUFFIX] = text
+        table = pa.table(data)
+        table = table.replace_schema_metadata({'headers': json.dumps(headers), 'suffixes': json.dumps(suffixes)})
+
+        _write_atomic(self.partition_path(year, tournament), lambda tmp: pq.write_table(table, tmp))
+        self._update_manifest(year, tournament, status=STATUS_OK, rows=len(rows), error=None)
+
+    def mark_failed(self, year, tournament, error, missing=False):
+        """Record a failed crawl; rows from an earlier successful crawl are kept."""
+        self._update_manifest(year, tournament, status=STATUS_MISSING if missing else STATUS_FAILED,
+                              error=str(error))
+
+    def record_crawl(self, year, tournament, headers, result, existing_rows=None):
+        """Store one crawl task's outcome: parsed rows, UNCHANGED or the exception it raised."""
+        if isinstance(result, Exception):
+            response = getattr(result, 'response', None)
+            missing = isinstance(result, requests.HTTPError) and response is not None and response.status_code == 404
+            self.mark_failed(year, tournament, result, missing=missing)
+        elif result is UNCHANGED:
+            # First run with a store on top of an existing CSV: seed the partition from it
+            if existing_rows and not os.path.exists(self.partition_path(year, tournament)):
+                self.write_partition(year, tournament, headers, existing_rows)
+        else:
+            self.write_partition(year, tournament, headers, result)
+
+    def failed_partitions(self):
+        return sorted(key for key, entry in self.manifest().items() if entry['status'] == STATUS_FAILED)
+
+    # ------------------------------------------------------------------ reads
+
+    def partitions(self, years=None, tournaments=None):
+        """(year, tournament) pairs that hold data, in crawl order, optionally pruned."""
+        found = []
+        if not os.path.isdir(self.root):
+            return found
+        for year_dir in os.listdir(self.root):
+            if not year_dir.startswith('Year='):
+                continue
+            year = int(year_dir[len('Year='):])
+            if years is not None and year not in years:
+                continue
+            for tournament_dir in os.listdir(os.path.join(self.root, year_dir)):
+                tournament = tournament_dir[len('Tournamment='):]
+                if tournaments is not None and tournament not in tournaments:
+                    continue
+                if os.path.exists(self.partition_path(year, tournament)):
+                    found.append((year, tournament))
+        return sorted(found, key=lambda p: _sort_key(*p))
+
+    def read_table(self, columns=None, years=None, tournaments=None):
+        """Read the selected partitions as one Arrow table, loading only `columns`."""
+        tables = [pq.read_table(self.partition_path(year, tournament), columns=columns)
+                  for year, tournament in self.partitions(years, tournaments)]
+        if not tables:
+            return None
+        # A stat column is int64 in some partitions and float64 in others
+        return pa.concat_tables(tables, promote_options='permissive')
+
+    def read(self, columns=None, years=None, tournaments=None):
+        """Same as `read_table` but as a pandas DataFrame."""
+        table = self.read_table(columns, years, tournaments)
+        return None if table is None else table.to_pandas()
+
+    def headers(self):
+        """Original CSV headers (with their duplicate names) as recorded at write time."""
+        for year, tournament in self.partitions():
+            metadata = pq.read_schema(self.partition_path(year, tournament)).metadata or {}
+            return json.loads(metadata[b'headers'])
+        return None
+
+    # ------------------------------------------------------------------ CSV bridge
+
+    def export_csv(self, csv_filename):
+        """Write the whole store in the legacy crawler CSV layout."""
+        headers = self.headers()
+        columns = unique_columns(headers)
+
+        def write(tmp):
+            with open(tmp, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(headers)
+                for year, tournament in self.partitions():
+                    table = pq.read_table(self.partition_path(year, tournament))
+                    suffixes = json.loads(table.schema.metadata.get(b'suffixes', b'{}'))
+                    for record in table.to_pylist():
+                        writer.writerow([_csv_value(record, column, suffixes) for column in columns])
+
+        _write_atomic(os.path.abspath(csv_filename), write)
+
+    def import_csv(self, csv_filename):
+        """Load a legacy crawler CSV, one partition per tournament."""
+        with open(csv_filename, newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            headers = next(reader)
+            partitions = {}
+            for row in reader:
+                partitions.setdefault((int(row[0]), row[1]), []).append(row)
+        for (year, tournament), rows in partitions.items():
+            self.write_partition(year, tournament, headers, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('action', choices=['import', 'export', 'status'])
+    parser.add_argument('name', help='dataset name, e.g. champion_stats')
+    parser.add_argument('csv', nargs='?', help='CSV file to import from / export to')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='store base directory')
+    args = parser.parse_args()
+
+    store = DatasetStore.named(args.name, args.store)
+    if args.action == 'import':
+        store.import_csv(args.csv)
+    elif args.action == 'export':
+        store.export_csv(args.csv)
+    else:
+        for key, entry in sorted(store.manifest().items()):
+            print(f"{key:24s} {entry['status']:8s} {entry.get('rows', '')!s:>5s} {entry.get('error') or ''}")
+
+
+if __name__ == '__main__':
+    main()
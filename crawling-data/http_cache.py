@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_DIR = os.environ.get('LOL_HTTP_CACHE_DIR', os.path.join(ROOT, 'cache', 'http'))
+
+
+class CacheEntry:
+    def __init__(self, url, text, etag=None, last_modified=None, fetched_at=None):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def conditional_headers(self):
+        """Validators to send so an unchanged page comes back as a bodiless 304."""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Persistent response cache keyed by URL.
+
+    Each URL maps to `<sha256>.json` (validators) and `<sha256>.html` (body)
+    inside `directory`. Files are replaced atomically, so concurrent workers
+    and interrupted runs never leave a half-written entry behind.
+
+    A URL that answered 404 gets a `<sha256>.missing` marker instead, so
+    tournaments that never took place are not requested on every run.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, ext):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{key}.{ext}')
+
+    def get(self, url):
+        try:
+            with open(self._path(url, 'json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(self._path(url, 'html'), encoding='utf-8') as f:
+                text = f.read()
+        except (OSError, ValueError):
+            return None
+        return CacheEntry(url, text, meta.get('etag'), meta.get('last_modified'), meta.get('fetched_at'))
+
+    def store(self, url, response):
+        # The body goes first so a crash between the two writes never pairs new validators with an old body
+        self._write(self._path(url, 'html'), response.text)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+        self._write(self._path(url, 'json'), json.dumps(meta))
+        try:
+            os.unlink(self._path(url, 'missing'))
+        except FileNotFoundError:
+            pass
+
+    def store_missing(self, url):
+        self._write(self._path(url, 'missing'), json.dumps({'url': url, 'fetched_at': time.time()}))
+
+    def missing_since(self, url):
+        """When `url` last answered 404, or None if it isn't known to be missing."""
+        try:
+            with open(self._path(url, 'missing'), encoding='utf-8') as f:
+                return json.load(f)['fetched_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, path, text):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
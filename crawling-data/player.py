@@ -1,113 +1,180 @@
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+import argparse
 import csv
+import logging
+import os
 
+from crawler import (CURRENT_MISSING_TTL, MISSING_TTL, UNCHANGED, CrawlEngine, read_tournaments,
+                     splice_tournaments, tournaments, tournament_url)
+from dataset_store import DEFAULT_STORE_DIR, DatasetStore
+from http_cache import HttpCache
+
+TABLE_CLASS = "wikitable sortable spstats plainlinks hoverable-rows"
+TABLE_STRAINER = SoupStrainer('table', class_=TABLE_CLASS)
+ROSTER_STRAINER = SoupStrainer('tr', class_='multirow-highlighter')
+HEADERS = ['Year', 'Tournamment', 'Team', 'Player','G','W','L','WR','K','D','A','KDA','CS','CS/M','G','G/M','DMG','DMG/M','KPAR','KS','GS','CP','Champs', 'Role']
+
+def parse_roster_roles(html):
+    # Only build the roster rows instead of the whole wiki page
+    soup = BeautifulSoup(html, 'html.parser', parse_only=ROSTER_STRAINER)
+    return index_roster_roles(soup.find_all('tr', class_='multirow-highlighter'))
+
+def index_roster_roles(role_rows):
+    # Index the roster once as player -> role, the first roster row for a player wins
+    roles = {}
+    for role_row in role_rows:
+        player_td = role_row.find('td', class_='extended-rosters-id')
+        role_td = role_row.find('td', class_='extended-rosters-role')
+        role_span = role_td.find('span') if role_td else None
+        if player_td is None or role_span is None:
+            continue
+        roles.setdefault(player_td.get_text(strip=True), role_span.get('title'))
+
+    return roles
+
+def parse_player_stats(roster_html, stats_html, year, tournament):
+    roles = parse_roster_roles(roster_html)
+
+    # Only build the stats table instead of the whole wiki page
+    soup = BeautifulSoup(stats_html, 'html.parser', parse_only=TABLE_STRAINER)
+
+    # Find the table with the specified class
+    table = soup.find('table', class_=TABLE_CLASS)
+    if not table:
+        raise ValueError("No table found with the specified class.")
+
+    rows = table.find_all('tr')[5:]
+
+    #print(len(rows))
+
+    # Extract data rows
+    data_rows = []
+
+    for row in rows:
+
+        row_data = [year, tournament]
+
+        # For the 'Team' and 'Player' values, you might be referring to the first cell's link attributes.
+        # Extract the first cell (assuming it's a td) and get the link title.
+        first_td = row.find('td')
+
+        team = first_td.find('a').get('title')
+
+        row_data.append(team)
+
+        # Now extract data from cells 2 to the second-last cell.
+        # Adjust the slicing based on your table's structure.
+        td_cells = row.find_all('td')
+
+        if len(td_cells) >= 3:  # Ensure there are enough cells
+            for cell in td_cells[1:-1]:
+                row_data.append(cell.get_text(strip=True))
+            # Extract the last cell's spans for 'champs'
+            last_cell = td_cells[-1]
+
+            champs = [span.get('title') for span in last_cell.find_all('span')]
+            row_data.append(champs)
+        else:
+            # If the structure is not as expected, skip this row or handle accordingly.
+            continue
+
+        row_data.append(roles.get(row_data[3], ''))
+
+        data_rows.append(row_data)
+
+    return data_rows
+
+def tournament_urls(year, tournament):
+    return [tournament_url(year, tournament, page) for page in ['Team_Rosters', 'Player_Statistics']]
+
+def crawl_player_stats(years, csv_filename, engine=None, incremental=False, store=None):
+    # Every tournament is fetched concurrently, rows are still written in crawl order.
+    # In incremental mode only tournaments whose pages changed are re-parsed and
+    # spliced into the existing CSV, the others keep their rows.
+    # With a DatasetStore every tournament is also upserted into its own partition.
+    # Fetched pages only reach the HTTP cache once their tournament's rows are written,
+    # so a tournament that failed is fetched and parsed again on the next run.
+    tasks = tournaments(years)
+    own_engine = engine is None
+    engine = engine or CrawlEngine(cache=HttpCache())
+    existing = read_tournaments(csv_filename)[1] if incremental else {}
+
+    def crawl(task):
+        year, tournament = task
+        roster = engine.fetch_page(tournament_url(year, tournament, 'Team_Rosters'), defer=True)
+        stats = engine.fetch_page(tournament_url(year, tournament, 'Player_Statistics'), defer=True)
+        if incremental and not (roster.changed or stats.changed) and task in existing:
+            return UNCHANGED
+        with engine.metrics.span('parse', year=year, tournament=tournament):
+            return parse_player_stats(roster.text, stats.text, year, tournament)
+
+    try:
+        results = engine.map(crawl, tasks)
+    finally:
+        if own_engine:
+            engine.close()
+
+    if incremental:
+        splice_tournaments(csv_filename, HEADERS, tasks, results)
+
+    for (year, tournament), data_rows in zip(tasks, results):
+        if store is not None:
+            store.record_crawl(year, tournament, HEADERS, data_rows, existing.get((year, tournament)))
+        if isinstance(data_rows, Exception):
+            print(f"An error occurred: {data_rows}")
+            continue
+        if data_rows is UNCHANGED:
+            engine.commit(tournament_urls(year, tournament))
+            print(f"{year} {tournament.replace('_', ' ')} unchanged, kept existing rows in {csv_filename}")
+            continue
 
+        if not incremental:
+            # Write the data to a CSV file
+            with open(csv_filename, 'a', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile)
 
-def crawl_player_stats(year, csv_filename):
-    seasons = ['Spring', 'Summer', 'Winter']
-    tours = ['Promotion', 'Season', 'Playoffs',]
-
-    for season in seasons:
-        for tour in tours:
-
-            url = f'https://lol.fandom.com/wiki/VCS/{year}_Season/{season}_{tour}/Player_Statistics'
-            table_class = "wikitable sortable spstats plainlinks hoverable-rows"
-
-            lanes = f'https://lol.fandom.com/wiki/VCS/{year}_Season/{season}_{tour}/Team_Rosters'
-
-            try:
-                response = requests.get(lanes)
-                response.raise_for_status()  # Check for HTTP errors
-
-                # Parse the HTML content with BeautifulSoup
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                role_rows = soup.find_all('tr', class_='multirow-highlighter')
-                #print(len(role_rows))
-
-                # Send a GET request to the URL
-                response = requests.get(url)
-                response.raise_for_status()  # Check for HTTP errors
-
-                # Parse the HTML content with BeautifulSoup
-                soup = BeautifulSoup(response.text, 'html.parser')
-
-                # Find the table with the specified class
-                table = soup.find('table', class_=table_class)
-                if not table:
-                    raise ValueError("No table found with the specified class.")
-
-                rows = table.find_all('tr')[5:]
-
-                #print(len(rows))
-
-                # Extract data rows
-                data_rows = []
-
-                for row in rows:
-
-                    row_data = [year, f'{season}_{tour}']
-
-                    # For the 'Team' and 'Player' values, you might be referring to the first cell's link attributes.
-                    # Extract the first cell (assuming it's a td) and get the link title.
-                    first_td = row.find('td')
-
-                    team = first_td.find('a').get('title')
-
-                    row_data.append(team)
-
-                    # Now extract data from cells 2 to the second-last cell.
-                    # Adjust the slicing based on your table's structure.
-                    td_cells = row.find_all('td')
-
-                    if len(td_cells) >= 3:  # Ensure there are enough cells
-                        for cell in td_cells[1:-1]:
-                            row_data.append(cell.get_text(strip=True))
-                        # Extract the last cell's spans for 'champs'
-                        last_cell = td_cells[-1]
-
-                        champs = [span.get('title') for span in last_cell.find_all('span')]
-                        row_data.append(champs)
-                    else:
-                        # If the structure is not as expected, skip this row or handle accordingly.
-                        continue
-
-                    role = ''
-                    for role_row in role_rows:
-                        try:
-                            #print(row_data[3],role_row.find('td', class_='extended-rosters-id').get_text(strip=True))
-                            if row_data[3] == role_row.find('td', class_='extended-rosters-id').get_text(strip=True):
-                                role = role_row.find('td', class_='extended-rosters-role').find('span').get('title')
-                                break
-                        except:
-                            pass
-                    
-                    row_data.append(role)
-
-                    data_rows.append(row_data)
-
-                # Write the data to a CSV file
-
-                with open(csv_filename, 'a', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.writer(csvfile)
-
-                    # Write each row of data
-                    writer.writerows(data_rows)
-
-                print(f"{year} {season} {tour} successfully saved to {csv_filename}")
-
-            except Exception as e:
-                print(f"An error occurred: {e}")
+                # Write each row of data
+                writer.writerows(data_rows)
+
+        engine.commit(tournament_urls(year, tournament))
+        print(f"{year} {tournament.replace('_', ' ')} successfully saved to {csv_filename}")
 
 def main():
-    with open('player_stats.csv', 'w', newline='', encoding='utf-8') as csvfile:
-        writer = csv.writer(csvfile)
-        headers = ['Year', 'Tournamment', 'Team', 'Player','G','W','L','WR','K','D','A','KDA','CS','CS/M','G','G/M','DMG','DMG/M','KPAR','KS','GS','CP','Champs', 'Role']
-        writer.writerow(headers)
-    
-    for year in range(2018,2025):
-        crawl_player_stats(year, 'player_stats.csv')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='player_stats.csv', help='CSV file to write')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only re-parse tournaments whose pages changed and splice them into --output')
+    parser.add_argument('--no-cache', action='store_true', help='skip the on-disk HTTP cache')
+    parser.add_argument('--missing-ttl', type=float, default=MISSING_TTL / 3600,
+                        help='hours a 404 for a past season is cached before it is requested again')
+    parser.add_argument('--current-missing-ttl', type=float, default=CURRENT_MISSING_TTL / 3600,
+                        help='hours a 404 for the current season is cached (its page may appear any day)')
+    parser.add_argument('--store', default=DEFAULT_STORE_DIR, help='partitioned dataset store directory')
+    parser.add_argument('--no-store', action='store_true', help='only write the CSV')
+    parser.add_argument('--metrics-file', help='write fetch/parse timings here in the Prometheus text format')
+    parser.add_argument('--log-level', default=os.environ.get('LOG_LEVEL', 'WARNING'),
+                        help='DEBUG logs a timing line for every fetch and parse')
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    store = None if args.no_store else DatasetStore.named('player_stats', args.store)
+
+    incremental = args.incremental and os.path.exists(args.output)
+    if not incremental:
+        with open(args.output, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(HEADERS)
+
+    with CrawlEngine(cache=None if args.no_cache else HttpCache(), missing_ttl=args.missing_ttl * 3600,
+                     current_missing_ttl=args.current_missing_ttl * 3600) as engine:
+        crawl_player_stats(range(2018,2025), args.output, engine=engine, incremental=incremental, store=store)
+
+    for line in engine.metrics.summary():
+        print(line)
+    if args.metrics_file:
+        engine.metrics.write_textfile(args.metrics_file, 'player_stats')
+
+    if store is not None and store.failed_partitions():
+        print(f"Tournaments that failed and have gaps in {store.root}: {', '.join(store.failed_partitions())}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,259 @@
+"""
+Chế độ incremental cho pipeline tiền xử lý.
+
+Mỗi giải (Year, Tournamment) là một phân vùng. Hash nội dung dữ liệu thô của
+từng phân vùng (cả player lẫn champion) được lưu trong state.json; lần chạy sau
+chỉ đưa các phân vùng có hash thay đổi qua pipeline (một lượt vector hóa cho cả
+nhóm) rồi thay đúng các dòng đó trong kết quả đã lưu.
+
+Hai bước phụ thuộc toàn bộ dữ liệu được xử lý riêng:
+- ngưỡng bỏ cột thiếu > 40%: tính lại từ số ô thiếu đã lưu của từng phân vùng,
+  nếu tập cột giữ lại đổi thì chạy lại toàn bộ;
+- trung bình toàn cột dùng để điền phần còn sót: tính lại trên các cột số đã
+  điền theo giải của mọi phân vùng (lưu trong filled_<bộ dữ liệu>.parquet, theo
+  đúng thứ tự dòng của lần chạy toàn bộ để cùng thứ tự cộng); phân vùng nào đã
+  dùng trung bình đó mà giá trị đổi thì được xử lý lại.
+
+Kết quả giống hệt chạy toàn bộ, với các dòng xếp theo thứ tự giải xuất hiện trong dữ liệu thô.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from pipeline import KEYS
+
+STATE_DIR = os.path.join(pipeline.OUT_DIR, '.incremental')
+# Tăng khi logic pipeline đổi để buộc chạy lại toàn bộ
+STATE_VERSION = 2
+DATASETS = ('player', 'champion')
+
+
+def _key(partition):
+    return f'{partition[0]}/{partition[1]}'
+
+
+def _partition(key):
+    year, tournament = key.split('/', 1)
+    return int(year), tournament
+
+
+def _partition_hashes(raw):
+    """{(year, tournament): hash} từ hash từng dòng, tính một lần cho cả bảng."""
+    row_hashes = pd.util.hash_pandas_object(raw, index=False).to_numpy()
+    positions = raw.groupby(KEYS).indices
+    # .indices không giữ thứ tự xuất hiện nên duyệt theo drop_duplicates
+    return {(int(year), tournament): hashlib.sha256(row_hashes[positions[(year, tournament)]].tobytes()).hexdigest()
+            for year, tournament in raw[KEYS].drop_duplicates().itertuples(index=False)}
+
+
+def _fingerprint(*parts):
+    return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+
+def _rows_of(df, partitions):
+    return df[pd.MultiIndex.from_frame(df[KEYS]).isin(list(partitions))]
+
+
+def _by_partition(values, df):
+    return values.groupby([df[k] for k in KEYS], sort=False)
+
+
+class IncrementalState:
+    """Thư mục trạng thái: state.json và kết quả đã xử lý của từng bộ dữ liệu."""
+
+    def __init__(self, directory=STATE_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, 'state.json')
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, state):
+        self._write(self.path, lambda tmp: _dump_json(state, tmp))
+
+    def output_path(self, dataset):
+        return os.path.join(self.directory, f'{dataset}.parquet')
+
+    def read_output(self, dataset):
+        path = self.output_path(dataset)
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def write_output(self, dataset, df):
+        self._write(self.output_path(dataset), lambda tmp: df.to_parquet(tmp, index=False))
+
+    def filled_path(self, dataset):
+        return os.path.join(self.directory, f'filled_{dataset}.parquet')
+
+    def read_filled(self, dataset):
+        path = self.filled_path(dataset)
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def write_filled(self, dataset, df):
+        self._write(self.filled_path(dataset), lambda tmp: df.to_parquet(tmp, index=False))
+
+    def reset(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _write(self, path, write):
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+def _dump_json(state, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def _convert(raws, partitions):
+    """Đổi kiểu các dòng của `partitions`, trả về các bảng kèm số dòng/số ô thiếu theo giải."""
+    converted = {d: pipeline.convert(_rows_of(raws[d], partitions), d) for d in DATASETS}
+    stats = {_key(p): {'rows': {}, 'nulls': {}} for p in partitions}
+    for d in DATASETS:
+        df = converted[d]
+        for (year, tournament), nulls in _by_partition(df.isna(), df).sum().iterrows():
+            entry = stats[_key((year, tournament))]
+            entry['nulls'][d] = nulls.astype(int).to_dict()
+        for (year, tournament), rows in _by_partition(df, df).size().items():
+            stats[_key((year, tournament))]['rows'][d] = int(rows)
+    return converted, stats
+
+
+def _group_fill(converted, columns):
+    """Bỏ cột/dòng thiếu nhiều và điền theo trung bình của chính giải; kèm các cột còn phải điền tiếp."""
+    filled = {d: pipeline.fill_group_means(pipeline.drop_sparse(converted[d], d, columns[d])) for d in DATASETS}
+    stats = {}
+    for d in DATASETS:
+        df = filled[d]
+        numeric = pipeline.numeric_columns(df)
+        for (year, tournament), part in _by_partition(df, df):
+            entry = stats.setdefault(_key((year, tournament)), {'fallback': {}})
+            entry['fallback'][d] = [c for c in numeric if part[c].isna().any()]
+    return filled, stats
+
+
+def _in_order(df, order):
+    """Các dòng xếp theo thứ tự giải trong dữ liệu thô, giữ thứ tự trong từng giải."""
+    rank = np.array([order[p] for p in zip(df['Year'].astype(int), df['Tournamment'])])
+    return df.iloc[np.argsort(rank, kind='stable')].reset_index(drop=True)
+
+
+def run_incremental(player_raw, champion_raw, dates=None, role_overrides=None, state_dir=STATE_DIR, full=False):
+    """
+    Xử lý lại những giải có dữ liệu thô thay đổi và ghép với kết quả đã lưu.
+
+    Trả về (player_df, champion_df, recomputed) với `recomputed` là danh sách các giải đã xử lý lại.
+    """
+    dates = pipeline.load_dates() if dates is None else dates
+    role_overrides = pipeline.load_role_overrides() if role_overrides is None else role_overrides
+    raws = {'player': player_raw, 'champion': champion_raw}
+    store = IncrementalState(state_dir)
+
+    # Đổi bảng ngày, bảng vai trò hay lược đồ dữ liệu thô thì mọi giải đều phải tính lại
+    inputs = _fingerprint(
+        STATE_VERSION,
+        pd.util.hash_pandas_object(dates, index=False).sum(),
+        pd.util.hash_pandas_object(role_overrides, index=False).sum(),
+        {d: {str(c): str(t) for c, t in raws[d].dtypes.items()} for d in DATASETS},
+    )
+    state = None if full else store.load()
+    if state is None or state.get('inputs') != inputs or not all(
+            os.path.exists(store.output_path(d)) and os.path.exists(store.filled_path(d)) for d in DATASETS):
+        store.reset()
+        state = None
+    entries = {} if state is None else state['partitions']
+
+    hashes = {}
+    for d in DATASETS:
+        for p, digest in _partition_hashes(raws[d]).items():
+            hashes.setdefault(p, {})[d] = digest
+    partitions = list(hashes)
+    keys = {_key(p) for p in partitions}
+    removed = [key for key in entries if key not in keys]
+    for key in removed:
+        del entries[key]
+    changed = [p for p in partitions if entries.get(_key(p), {}).get('hash') != hashes[p]]
+
+    # Bước 1: đổi kiểu các giải thay đổi, ghép số ô thiếu đã lưu để tính lại tập cột giữ lại
+    converted, stats = _convert(raws, changed)
+    for p in changed:
+        entries[_key(p)] = {'hash': hashes[p], **stats[_key(p)]}
+
+    columns = {}
+    for d in DATASETS:
+        nulls = pd.DataFrame([entries[_key(p)]['nulls'].get(d, {}) for p in partitions]).sum()
+        rows = sum(entries[_key(p)]['rows'].get(d, 0) for p in partitions)
+        columns[d] = pipeline.kept_columns(nulls.astype(int), rows)
+    if state is not None and state['columns'] != columns:
+        return run_incremental(player_raw, champion_raw, dates, role_overrides, state_dir, full=True)
+
+    # Bước 2: điền theo trung bình của chính giải, ghép với các giải đã lưu để tính trung bình toàn cột
+    order = {p: i for i, p in enumerate(partitions)}
+    filled, stats = _group_fill(converted, columns)
+    for p in changed:
+        entries[_key(p)].update(stats.get(_key(p), {'fallback': {}}))
+    means, all_filled = {}, {}
+    for d in DATASETS:
+        fresh = filled[d][KEYS + pipeline.numeric_columns(filled[d])]
+        previous = None if state is None else store.read_filled(d)
+        if previous is not None:
+            previous = previous[~pd.MultiIndex.from_frame(previous[KEYS]).isin(changed + [_partition(key) for key in removed])]
+            # Không giải nào đổi: bảng rỗng không mang đúng kiểu số của các cột
+            fresh = pd.concat([previous, fresh]) if len(fresh) else previous
+        all_filled[d] = _in_order(fresh, order)
+        means[d] = pipeline.global_means(all_filled[d], [c for c in all_filled[d].columns if c not in KEYS])
+
+    # Giải không đổi nhưng đã điền bằng trung bình toàn cột mà trung bình đó vừa đổi
+    stale = []
+    if state is not None:
+        stale = [p for p in partitions if p not in changed and any(
+            means[d].get(c) != state['means'][d].get(c)
+            for d in DATASETS for c in entries[_key(p)]['fallback'].get(d, []))]
+    if stale:
+        extra, _ = _group_fill(_convert(raws, stale)[0], columns)
+        filled = {d: pd.concat([filled[d], extra[d]]) for d in DATASETS}
+    recomputed = changed + stale
+
+    # Bước 3: hoàn tất các giải tính lại và thay chúng vào kết quả đã lưu
+    games = pipeline.season_games(_rows_of(player_raw, recomputed))
+    fresh = {
+        'player': pipeline.finish_players(pipeline.fill_global_means(filled['player'], means['player']),
+                                          games, dates, role_overrides),
+        'champion': pipeline.finish_champions(pipeline.fill_global_means(filled['champion'], means['champion']),
+                                              games, dates),
+    }
+    outputs = {}
+    for d in DATASETS:
+        previous = None if state is None else store.read_output(d)
+        if previous is None:
+            df = fresh[d]
+        elif not recomputed and not removed:
+            outputs[d] = previous
+            continue
+        else:
+            previous = previous[~pd.MultiIndex.from_frame(previous[KEYS]).isin(recomputed + [_partition(key) for key in removed])]
+            df = pd.concat([previous, fresh[d]])
+        df = _in_order(df, order)
+        store.write_output(d, df)
+        outputs[d] = df
+    for d in DATASETS:
+        store.write_filled(d, all_filled[d])
+
+    store.save({'inputs': inputs, 'columns': columns, 'means': means, 'partitions': entries})
+    return outputs['player'], outputs['champion'], recomputed
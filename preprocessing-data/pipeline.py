@@ -0,0 +1,331 @@
+"""
+Pipeline tiền xử lý dữ liệu crawl (thay cho LOL_Preprocessing.ipynb và LOL_Preprocessing_2.ipynb).
+
+Chạy từ thư mục gốc của repo:
+
+    python preprocessing-data/pipeline.py
+    python preprocessing-data/pipeline.py --source store
+    python preprocessing-data/pipeline.py --incremental
+
+Kết quả giống notebook từng byte: processed_champion_stats.csv, bản -pivot_role
+và processed_player_stats.csv trong data/preprocessed_data/. Các bước là phép
+toán vector hóa, trừ trung bình theo giải: nó được tính đúng như Series.mean
+của notebook để cùng từng bit. Mỗi file được ghi đúng một lần.
+"""
+import argparse
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+RAW_DIR = os.path.join(ROOT, 'data', 'lol-data')
+OUT_DIR = os.path.join(ROOT, 'data', 'preprocessed_data')
+
+# Bảng ngày kết thúc của từng giải và vai trò điền tay cho các người chơi thiếu Role
+DATES_PATH = os.path.join(HERE, 'tournament_dates.csv')
+ROLE_OVERRIDES_PATH = os.path.join(HERE, 'role_overrides.csv')
+
+KEYS = ['Year', 'Tournamment']
+MISSING_MARKERS = ['-', 'N/A', 'null', '[]']
+MISSING_THRESHOLD = 0.4
+ROLES = ['Mid Laner', 'Top Laner', 'Bot Laner', 'Jungler', 'Support']
+SEASONS = ['Spring', 'Summer', 'Winter']
+EVENT_TYPES = ['Season', 'Promotion', 'Playoffs']
+
+# Các cột phần trăm (bỏ '%' và 'k' trước khi đổi sang số) và các cột số bị sai kiểu
+PERCENT_COLUMNS = {
+    'player': ['WR', 'KPAR', 'KS', 'GS', 'DMG'],
+    'champion': ['PB', 'WR', 'KPAR', 'KS', 'GS', 'DMG'],
+}
+NUMERIC_COLUMNS = {
+    'player': ['G.1', 'G/M', 'DMG', 'DMG/M'],
+    'champion': ['K', 'B', 'By', 'D', 'A', 'KDA', 'CS', 'CS/M', 'G.1', 'G/M', 'DMG', 'DMG/M'],
+}
+LIST_COLUMNS = {'player': 'Champs', 'champion': 'As'}
+
+# Tên trong list repr của Python: 'Azir' hoặc "Kog'Maw"
+LIST_ITEM_PATTERN = r"""'(?P<single>[^']*)'|"(?P<double>[^"]*)\""""
+
+
+# ----------------------------------------------------------------------------- load
+
+def load_raw(source='csv', raw_dir=RAW_DIR, store_dir=None):
+    """
+    Đọc dữ liệu crawl thô, trả về (player_df, champion_df).
+
+    source='csv' đọc data/lol-data/*.csv, source='store' đọc kho Parquet phân vùng
+    (chỉ các cột pipeline cần), source='auto' dùng kho nếu đã có dữ liệu.
+    """
+    if source in ('store', 'auto'):
+        sys.path.insert(0, os.path.join(ROOT, 'crawling-data'))
+        from dataset_store import DEFAULT_STORE_DIR, DatasetStore
+
+        stores = {name: DatasetStore.named(name, store_dir or DEFAULT_STORE_DIR)
+                  for name in ('player_stats', 'champion_stats')}
+        if source == 'store' or all(store.partitions() for store in stores.values()):
+            return (_from_store(stores['player_stats'], 'player'),
+                    _from_store(stores['champion_stats'], 'champion'))
+
+    return (pd.read_csv(os.path.join(raw_dir, 'player_stats.csv')),
+            pd.read_csv(os.path.join(raw_dir, 'champion_stats.csv')))
+
+
+def _from_store(store, dataset):
+    from dataset_store import unique_columns
+
+    # DMG/DMG/M không đọc vì luôn bị loại ở bước ngưỡng thiếu dữ liệu
+    columns = [c for c in unique_columns(store.headers()) if c not in ('DMG', 'DMG/M')]
+    df = store.read(columns=columns)
+    list_column = LIST_COLUMNS[dataset]
+    # Kho lưu list thật; chuyển list rỗng về NaN như '[]' trong CSV
+    df[list_column] = df[list_column].map(lambda v: list(v) if len(v) else np.nan)
+    # Cột chỉ số trong kho đã là số ('-' là null); ô chữ rỗng trong CSV được pandas đọc thành NaN
+    text_columns = df.select_dtypes(exclude='number').columns.drop(list_column)
+    df[text_columns] = df[text_columns].replace('', np.nan)
+    return df
+
+
+def load_dates(path=DATES_PATH):
+    dates = pd.read_csv(path)
+    dates['Date'] = pd.to_datetime(dates['Date'], format='%Y-%m-%d', errors='coerce')
+    return dates
+
+
+def load_role_overrides(path=ROLE_OVERRIDES_PATH):
+    return pd.read_csv(path)
+
+
+# ----------------------------------------------------------------------------- steps
+
+def list_items(series):
+    """
+    Tách một cột list (chuỗi "['A', 'B']" hoặc list thật) thành dạng dài.
+
+    Trả về Series có MultiIndex (chỉ số dòng, thứ tự phần tử), không cần ast.literal_eval từng dòng.
+    """
+    values = series.dropna()
+    if values.map(lambda v: isinstance(v, list)).all():
+        items = values.explode()
+        return items.set_axis(pd.MultiIndex.from_arrays([items.index, items.groupby(level=0).cumcount()],
+                                                        names=[None, 'match']))
+    matches = values.astype(str).str.extractall(LIST_ITEM_PATTERN)
+    return matches['single'].fillna(matches['double'])
+
+
+def convert(df, dataset):
+    """Chuẩn hóa giá trị thiếu và đổi các cột phần trăm/số sang kiểu số."""
+    df = df.replace(MISSING_MARKERS, np.nan)
+
+    for column in PERCENT_COLUMNS[dataset]:
+        if column in df.columns and not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = (df[column].str.replace('%', '', regex=False)
+                          .str.replace('k', '', regex=False).astype(float))
+    numeric = [c for c in NUMERIC_COLUMNS[dataset] if c in df.columns]
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce')
+    return df
+
+
+def kept_columns(null_counts, rows):
+    """Các cột có tỉ lệ thiếu <= 40% (null_counts: Series số ô thiếu theo cột)."""
+    return null_counts.index[null_counts / rows <= MISSING_THRESHOLD].tolist()
+
+
+def drop_sparse(df, dataset, columns):
+    df = df[columns]
+    if dataset == 'champion':
+        # Bỏ dòng thiếu từ 5 giá trị trở lên hoặc không có vai trò (As)
+        df = df[(df.isna().sum(axis=1) < 5) & df['As'].notna()]
+    return df
+
+
+def numeric_columns(df):
+    return [c for c in df.select_dtypes(include='number').columns if c not in KEYS]
+
+
+def series_mean(values):
+    """
+    Trung bình như Series.mean trong notebook: cùng thứ tự cộng (giá trị thiếu tính
+    là 0 tại đúng vị trí của nó), nên kết quả giống notebook đến từng bit.
+    """
+    return pd.Series(values, dtype=float).mean()
+
+
+def fill_group_means(df):
+    """Điền giá trị thiếu bằng trung bình theo (Year, Tournamment) của từng cột số."""
+    numeric = [c for c in numeric_columns(df) if df[c].isna().any()]
+    if not numeric:
+        return df
+    positions = df.groupby(KEYS, sort=False).indices
+    for column in numeric:
+        values = df[column].to_numpy(dtype=float, copy=True)
+        for rows in positions.values():
+            part = values[rows]
+            missing = np.isnan(part)
+            if missing.any() and not missing.all():
+                part[missing] = series_mean(part)
+                values[rows] = part
+        df[column] = values
+    return df
+
+
+def global_means(df, columns=None):
+    """Trung bình toàn cột (sau khi đã điền theo giải) của các cột số còn giá trị."""
+    columns = numeric_columns(df) if columns is None else columns
+    return {column: float(series_mean(df[column].to_numpy())) for column in columns if df[column].notna().any()}
+
+
+def fill_global_means(df, means):
+    """Phần còn sót (cả giải đều thiếu) điền bằng trung bình toàn cột."""
+    missing = [c for c in numeric_columns(df) if df[c].isna().any() and c in means]
+    if missing:
+        df[missing] = df[missing].fillna(pd.Series({c: means[c] for c in missing}))
+    return df
+
+
+def clean(df, dataset):
+    """Đổi kiểu, bỏ cột/dòng thiếu nhiều và điền giá trị thiếu trên toàn bộ dữ liệu."""
+    df = convert(df, dataset)
+    df = drop_sparse(df, dataset, kept_columns(df.isna().sum(), len(df)))
+    df = fill_group_means(df)
+    missing = [c for c in numeric_columns(df) if df[c].isna().any()]
+    return fill_global_means(df, global_means(df, missing))
+
+
+def add_dates(df, dates):
+    """Thêm Date (nối với bảng ngày), Season và Event_Type suy ra từ Tournamment."""
+    df = df.merge(dates, on=KEYS, how='left')
+    tournament = df['Tournamment']
+    df['Season'] = np.select([tournament.str.contains(s, regex=False) for s in SEASONS], SEASONS, '')
+    df['Event_Type'] = np.select([tournament.str.contains(e, regex=False) for e in EVENT_TYPES], EVENT_TYPES, '')
+    return df
+
+
+def season_games(player_df):
+    """Tổng số trận của mỗi giải = tổng số trận thắng của các đội (tổng W của 5 thành viên / 5)."""
+    team_wins = player_df.groupby(KEYS + ['Team'])['W'].sum() / 5
+    return team_wins.groupby(level=KEYS).sum().rename('total_games').reset_index()
+
+
+def normalize_team(team):
+    """Bỏ phần ' (...)' và '.Vietnam' khỏi tên đội."""
+    return team.str.split(' (', n=1, regex=False).str[0].str.replace('.Vietnam', '', regex=False).str.strip()
+
+
+def process_champions(champion_df, games, dates):
+    return finish_champions(clean(champion_df, 'champion'), games, dates)
+
+
+def finish_champions(df, games, dates):
+    """Các bước sau khi làm sạch, chỉ phụ thuộc vào dữ liệu của cùng giải."""
+    df['B'] = df['B'].astype(int)
+    df['By'] = df['By'].astype(int)
+    df = add_dates(df, dates)
+
+    # Cột nhị phân cho từng vai trò trong As
+    roles = list_items(df['As'])
+    flags = pd.crosstab(roles.index.get_level_values(0), roles.values).reindex(index=df.index, columns=ROLES)
+    df[ROLES] = flags.fillna(0).gt(0).astype(int)
+    df = df.drop(columns=['As'])
+
+    df = df.merge(games, on=KEYS, how='left')
+    df['total_games'] = df['total_games'].astype(int)
+    df['%B'] = (df['B'] / df['total_games'] * 100).round(2)
+    df['%P'] = (df['GP'] / df['total_games'] * 100).round(2)
+
+    float_columns = df.select_dtypes(include=['float']).columns
+    df[float_columns] = df[float_columns].round(2)
+    return df
+
+
+def process_players(player_df, games, dates, role_overrides):
+    return finish_players(clean(player_df, 'player'), games, dates, role_overrides)
+
+
+def finish_players(df, games, dates, role_overrides):
+    """Các bước sau khi làm sạch, chỉ phụ thuộc vào dữ liệu của cùng giải."""
+    df = df.merge(games, on=KEYS, how='left')
+    df['total_games'] = df['total_games'].astype(int)
+
+    season_max = df.groupby(KEYS)[['G/M', 'CS/M', 'KDA', 'KPAR']].max().fillna(0)
+    season_max.columns = ['max_G/M', 'max_CS/M', 'max_KDA', 'max_KPAR']
+    df = df.merge(season_max.reset_index(), on=KEYS, how='left')
+
+    df['Team'] = normalize_team(df['Team'])
+
+    # Vai trò thiếu trên trang roster được điền từ bảng role_overrides
+    overrides = df[KEYS + ['Player']].merge(role_overrides, on=KEYS + ['Player'], how='left')['Role']
+    df['Role'] = df['Role'].fillna(pd.Series(overrides.values, index=df.index))
+
+    df = add_dates(df, dates)
+
+    # Ba tướng chơi nhiều nhất thành Champion_1..3
+    champs = list_items(df['Champs']).unstack()
+    champ_columns = ['Champion_1', 'Champion_2', 'Champion_3']
+    champs = champs.reindex(index=df.index, columns=range(len(champ_columns)))
+    df[champ_columns] = champs.to_numpy()
+    df[champ_columns] = df[champ_columns].fillna('IsNone')
+    return csv_round_trip(df.drop(columns=['Champs']))
+
+
+def csv_round_trip(df):
+    """
+    Notebook 2 đọc lại file CSV do notebook 1 ghi bằng pd.read_csv, với bộ đọc số
+    thực mặc định của pandas (có thể lệch 1 ulp so với giá trị đã ghi). Các cột
+    số thực đi qua đúng bước đó để file kết quả giống hệt từng byte.
+    """
+    float_columns = list(df.select_dtypes(include='float').columns)
+    if float_columns:
+        text = df[float_columns].to_csv(index=False)
+        df[float_columns] = pd.read_csv(io.StringIO(text), dtype=dict.fromkeys(float_columns, float)).to_numpy()
+    return df
+
+
+def preprocess(player_raw, champion_raw, dates=None, role_overrides=None):
+    """Chạy toàn bộ pipeline trên dữ liệu thô, trả về (player_df, champion_df) đã xử lý."""
+    dates = load_dates() if dates is None else dates
+    role_overrides = load_role_overrides() if role_overrides is None else role_overrides
+    # total_games tính trên tên đội gốc, trước khi chuẩn hóa
+    games = season_games(player_raw)
+    champion_df = process_champions(champion_raw, games, dates)
+    player_df = process_players(player_raw, games, dates, role_overrides)
+    return player_df, champion_df
+
+
+def write_outputs(player_df, champion_df, out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    champion_csv = champion_df.to_csv(index=False)
+    for name in ('processed_champion_stats.csv', 'processed_champion_stats-pivot_role.csv'):
+        with open(os.path.join(out_dir, name), 'w', encoding='utf-8', newline='') as f:
+            f.write(champion_csv)
+    player_df.to_csv(os.path.join(out_dir, 'processed_player_stats.csv'), index=False, encoding='utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', choices=['auto', 'csv', 'store'], default='auto')
+    parser.add_argument('--raw-dir', default=RAW_DIR)
+    parser.add_argument('--store-dir', default=None)
+    parser.add_argument('--out-dir', default=OUT_DIR)
+    parser.add_argument('--incremental', action='store_true',
+                        help='chỉ xử lý lại các giải có dữ liệu thô thay đổi so với lần chạy trước')
+    parser.add_argument('--state-dir', default=None, help='thư mục trạng thái của chế độ incremental')
+    args = parser.parse_args()
+
+    player_raw, champion_raw = load_raw(args.source, args.raw_dir, args.store_dir)
+    if args.incremental:
+        import incremental
+        state_dir = args.state_dir or os.path.join(args.out_dir, '.incremental')
+        player_df, champion_df, recomputed = incremental.run_incremental(player_raw, champion_raw, state_dir=state_dir)
+        print(f"Recomputed {len(recomputed)} tournament(s)")
+    else:
+        player_df, champion_df = preprocess(player_raw, champion_raw)
+    write_outputs(player_df, champion_df, args.out_dir)
+    print(f"Processed {len(champion_df)} champion rows and {len(player_df)} player rows into {args.out_dir}")
+
+
+if __name__ == '__main__':
+    main()
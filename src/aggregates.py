@@ -0,0 +1,102 @@
+"""
+Bảng tổng hợp dựng sẵn cho code sinh ra: `agg` nằm cạnh `df` khi chạy code.
+
+Hầu hết code do DeepSeek viết đều groupby lại trên toàn bộ `df` (trung bình WR,
+KDA, GP theo tướng, theo năm, theo vai trò...). Các bảng nhỏ ở đây được tính
+một lần cho mỗi phiên bản dữ liệu (AggregateStore dựng lại khi CSV nguồn đổi):
+    champion: by_champion (Champion), by_champion_year (Champion, Year), by_role_year (Role, Year)
+    player:   by_player_year (Player, Year), by_team_year (Team, Year), by_role_year (Role, Year)
+Mỗi bảng gồm các cột khóa, `rows` (số dòng gốc của nhóm), các cột số cùng tên
+với `df` là trung bình trong nhóm, và `<cột>_total` là tổng của các cột đếm
+(G, GP, W, L, B). Với dữ liệu champion, Role lấy từ các cột Mid Laner...Support:
+một tướng được tính ở mọi vị trí nó được chơi.
+"""
+import threading
+
+import pandas as pd
+
+from fast_path import ROLES, SUM_COLUMNS
+
+# Tên bảng -> cột khóa, theo từng bộ dữ liệu
+CUBES = {
+    'champion': {
+        'by_champion': ['Champion'],
+        'by_champion_year': ['Champion', 'Year'],
+        'by_role_year': ['Role', 'Year'],
+    },
+    'player': {
+        'by_player_year': ['Player', 'Year'],
+        'by_team_year': ['Team', 'Year'],
+        'by_role_year': ['Role', 'Year'],
+    },
+}
+# Cột số không lấy trung bình: khóa, cờ vai trò, hằng số của mùa giải
+EXCLUDED_COLUMNS = {'Year', 'total_games', *ROLES}
+
+
+def _with_roles(df):
+    """Dữ liệu champion dạng dài: mỗi dòng lặp lại cho từng vị trí có cờ 1, thêm cột Role."""
+    parts = [df[df[role] == 1].assign(Role=role) for role in ROLES if role in df.columns]
+    long = pd.concat(parts, ignore_index=True)
+    long['Role'] = pd.Categorical(long['Role'], categories=ROLES)
+    return long
+
+
+def _summarize(df, keys):
+    numeric = [c for c in df.select_dtypes('number').columns if c not in EXCLUDED_COLUMNS and c not in keys]
+    totals = [c for c in numeric if c in SUM_COLUMNS]
+    grouped = df.groupby(keys, observed=True)
+    summary = grouped[numeric].mean()
+    summary.insert(0, 'rows', grouped.size())
+    summary = summary.join(grouped[totals].sum().add_suffix('_total'))
+    return summary.reset_index()
+
+
+def build_aggregates(df, dataset_type):
+    """Dict tên bảng -> DataFrame tổng hợp của `df`; bỏ qua bảng thiếu cột khóa."""
+    cubes = {}
+    for name, keys in CUBES.get(dataset_type, {}).items():
+        data = df
+        if 'Role' in keys and 'Role' not in df.columns:
+            if not any(role in df.columns for role in ROLES):
+                continue
+            data = _with_roles(df)
+        if all(key in data.columns for key in keys):
+            cubes[name] = _summarize(data, keys)
+    return cubes
+
+
+def describe_aggregates(dataset_type):
+    """Đoạn mô tả `agg` cho prompt (không phụ thuộc dữ liệu cụ thể, để prompt và khóa cache ổn định)."""
+    cubes = CUBES.get(dataset_type)
+    if not cubes:
+        return ''
+    lines = [f"- agg['{name}']: một dòng cho mỗi ({', '.join(keys)})" for name, keys in cubes.items()]
+    return (
+        "Ngoài `df` còn có dict `agg` gồm các DataFrame tổng hợp sẵn (rất nhỏ, nhanh hơn groupby trên `df`):\n"
+        + "\n".join(lines) + "\n"
+        "Mỗi bảng có các cột khóa, cột `rows` (số dòng của `df` trong nhóm), các cột số cùng tên với `df` "
+        "là giá trị TRUNG BÌNH trong nhóm, và các cột G_total, GP_total, W_total, L_total, B_total (nếu có) là TỔNG. "
+        "Khi cần giá trị trung bình theo các nhóm trên, hãy dùng `agg` thay vì groupby trên `df`."
+    )
+
+
+class AggregateStore:
+    """Bảng tổng hợp theo tên dataset của một DatasetLoader, dựng lại khi dữ liệu đổi phiên bản."""
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._cubes = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Dict bảng tổng hợp; mỗi bảng là bản sao nông nên code sinh ra có sửa cũng không ảnh hưởng bản dùng chung."""
+        version = self.loader.version(name)
+        cached = self._cubes.get(name)
+        if cached is None or cached[0] != version:
+            with self._lock:
+                cached = self._cubes.get(name)
+                if cached is None or cached[0] != version:
+                    cached = (version, build_aggregates(self.loader.get(name), name))
+                    self._cubes[name] = cached
+        return {table: frame.copy(deep=False) for table, frame in cached[1].items()}
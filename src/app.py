@@ -1,39 +1,72 @@
-from flask import Flask, render_template, request, jsonify
-import os
-import pandas as pd
-import plotly
+from flask import Flask, Response, render_template, request, jsonify
 import json
+import logging
+import os
+import threading
 from dotenv import load_dotenv
 from plot_generator import create_plot
+from snapshot import DATA_DIR, DatasetLoader
+from combined import derived_datasets
+from jobs import DONE, JobManager, QueueFull
+from sandbox import Sandbox
+from aggregates import AggregateStore
+from serialization import RawJSON, StreamCompressor, compress, encode_response, figure_etag
+from figure_reduce import prepare_figure
+from deepseek_client import default_client
+from batch import BatchError, FigureCache, load_dashboards, plan_batch, run_batch
+import metrics
+from metrics import FIGURE_BYTES, RESPONSE_BYTES, kv, span
 
 app = Flask(__name__)
 
 load_dotenv()
+# Mức log đặt bằng LOG_LEVEL (DEBUG để xem prompt và code sinh ra), xem metrics.py
+metrics.configure_logging()
+log = logging.getLogger(__name__)
+
+# Đường dẫn tuyệt đối đến các file CSV, không phụ thuộc thư mục chạy app
+CHAMPION_DATA_PATH = os.path.join(DATA_DIR, "processed_champion_stats.csv")
+PLAYER_DATA_PATH = os.path.join(DATA_DIR, "processed_player_stats.csv")
+
+# DataFrame được nạp từ snapshot nhị phân khi dùng lần đầu (xem snapshot.py);
+# 'combined' là bảng nối người chơi - tướng dựng từ hai bộ kia (xem combined.py)
+DATA_SOURCES = {'champion': CHAMPION_DATA_PATH, 'player': PLAYER_DATA_PATH}
+datasets = DatasetLoader(DATA_SOURCES, derived=derived_datasets(DATA_SOURCES))
+
+# Bảng tổng hợp dựng sẵn cho code sinh ra (biến `agg`, xem aggregates.py), dựng lại khi dữ liệu đổi
+aggregates = AggregateStore(datasets)
+
+# Pool xử lý các yêu cầu vẽ biểu đồ ngoài luồng request (xem jobs.py)
+plot_jobs = JobManager()
+# Khoảng gửi comment giữ kết nối của luồng sự kiện, giây
+SSE_KEEPALIVE = 15
+
+# Biểu đồ đã vẽ của batch/dashboard và các dashboard lưu sẵn (xem batch.py)
+figure_cache = FigureCache.from_env()
+dashboards = load_dashboards()
+# Dashboard đang được vẽ trước (mỗi dashboard chỉ một lượt cùng lúc)
+_precomputing = set()
+_precomputing_lock = threading.Lock()
+
+# Code do DeepSeek sinh ra chạy trong các tiến trình worker riêng (xem sandbox.py); None nếu tắt
+plot_sandbox = Sandbox.from_env(DATA_SOURCES)
 
-# Đường dẫn đến các file CSV
-CHAMPION_DATA_PATH = "../data/preprocessed_data/processed_champion_stats.csv"
-PLAYER_DATA_PATH = "../data/preprocessed_data/processed_player_stats.csv"
-
-# Đọc DataFrame
-try:
-    champion_df = pd.read_csv(CHAMPION_DATA_PATH)
-    print(f"Loaded champion data with {len(champion_df)} rows and {len(champion_df.columns)} columns")
-except FileNotFoundError:
-    champion_df = None
-    print(f"Error: File {CHAMPION_DATA_PATH} not found.")
-except Exception as e:
-    champion_df = None
-    print(f"Error loading champion data: {str(e)}")
-
-try:
-    player_df = pd.read_csv(PLAYER_DATA_PATH)
-    print(f"Loaded player data with {len(player_df)} rows and {len(player_df.columns)} columns")
-except FileNotFoundError:
-    player_df = None
-    print(f"Error: File {PLAYER_DATA_PATH} not found.")
-except Exception as e:
-    player_df = None
-    print(f"Error loading player data: {str(e)}")
+# Số đo đọc lúc scrape /metrics
+metrics.gauge('lol_plot_jobs', 'Job vẽ biểu đồ đang giữ theo trạng thái',
+              lambda: {(status,): count for status, count in plot_jobs.stats().items()}, ['status'])
+metrics.gauge('lol_llm_breaker_open', '1 nếu circuit breaker của DeepSeek đang ngắt (kể cả nửa mở)',
+              lambda: int(default_client().breaker.state != 'closed'))
+
+
+def get_dataframe(dataset):
+    """Trả về DataFrame của dataset, hoặc None nếu không đọc được dữ liệu."""
+    try:
+        return datasets.get(dataset)
+    except FileNotFoundError as e:
+        log.error('dataset_missing %s', kv(dataset=dataset, file=e.filename))
+    except Exception:
+        log.exception('dataset_load_failed %s', kv(dataset=dataset))
+    return None
 
 # Route để render trang Power BI
 @app.route('/')
@@ -45,64 +78,263 @@ def powerbi():
 def plot():
     return render_template('render-tableau.html')
 
-# Route để tạo biểu đồ từ yêu cầu người dùng
+def parse_plot_request(data):
+    """Kiểm tra body JSON của yêu cầu vẽ; trả về (tham số cho run_plot, None) hoặc (None, response lỗi)."""
+    data = data or {}
+    user_input = data.get('user_input')
+    deepseek_api_key = data.get('DEEPSEEK_API_KEY', None)
+    dataset = data.get('dataset', 'champion')
+
+    if not user_input:
+        return None, (jsonify({'error': 'Missing user_input parameter'}), 400)
+
+    # Chọn DataFrame dựa trên tham số dataset
+    dataset = dataset.lower()
+    if dataset not in datasets.names():
+        return None, (jsonify({'error': 'Invalid dataset parameter. Use "champion", "player" or "combined".'}), 400)
+    df = get_dataframe(dataset)
+    if df is None:
+        return None, (jsonify({'error': f'{dataset.capitalize()} DataFrame not loaded.'}), 500)
+    return (user_input, df, dataset, deepseek_api_key), None
+
+
+def run_plot(user_input, df, dataset, deepseek_api_key, job=None):
+    """Tạo biểu đồ và chuyển sang dạng JSON; chạy trong pool của plot_jobs."""
+    log.debug('plot_request %s', kv(dataset=dataset, rows=df.shape[0], columns=df.shape[1]))
+
+    # Gọi hàm create_plot để tạo biểu đồ, chuyển tham số dataset (info cho biết có trúng cache không)
+    # Trong sandbox, worker tự có bảng tổng hợp của nó
+    agg = None if plot_sandbox else aggregates.get(dataset)
+    fig, info = create_plot(user_input, df, dataset, deepseek_api_key, job=job, sandbox=plot_sandbox, aggregates=agg)
+
+    # Giảm điểm nếu biểu đồ quá lớn (figure_reduce.py) rồi chuyển sang JSON một lần duy nhất,
+    # được ghép thẳng vào phản hồi (xem serialization.py)
+    if job:
+        job.stage('serialize')
+    try:
+        with span('serialize'):
+            encoded = prepare_figure(fig)
+    except Exception as json_error:
+        log.exception('serialize_failed %s', kv(dataset=dataset))
+        raise Exception(f'Failed to convert plot to JSON: {str(json_error)}')
+    FIGURE_BYTES.observe(len(encoded.json))
+    log.info('plot_ready %s', kv(dataset=dataset, source=info['source'], cache=info['cache'],
+                                 bytes=len(encoded.json)))
+    if encoded.reduction:
+        log.info('figure_reduced %s', kv(points=encoded.reduction['points'], shown=encoded.reduction['shown']))
+    return {'plot': RawJSON(encoded.json), 'reduced': encoded.reduction, **info}
+
+
+def plot_response(data, status=200):
+    """
+    Phản hồi JSON có chứa biểu đồ: body được nén nếu client hỗ trợ; trả 304 nếu
+    header If-None-Match của client khớp ETag của biểu đồ (client đã có đúng biểu đồ này).
+    """
+    plot = data.get('plot')
+    etag = figure_etag(plot.text) if isinstance(plot, RawJSON) else None
+    if etag and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        with span('encode'):
+            body, encoding = compress(encode_response(data), request.headers.get('Accept-Encoding'))
+        if plot is not None:
+            RESPONSE_BYTES.observe(len(body), encoding=encoding or 'identity')
+        response = Response(body, status=status, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def submit_plot_job(data):
+    """Đưa yêu cầu vào pool; trả về (job, None) hoặc (None, response lỗi)."""
+    args, error = parse_plot_request(data)
+    if error:
+        return None, error
+    try:
+        return plot_jobs.submit(run_plot, *args), None
+    except QueueFull as e:
+        return None, (jsonify({'error': str(e)}), 503, {'Retry-After': '5'})
+
+
+# Route tạo biểu đồ đồng bộ (giữ cho client cũ): vẫn chạy qua pool, request chờ tới khi job xong
 @app.route('/api/plot', methods=['POST'])
 def generate_plot():
-    # Kiểm tra xem DataFrame có được tải thành công không
-    if champion_df is None and player_df is None:
-        return jsonify({'error': 'No DataFrames loaded. Please provide valid data files.'}), 500
-
     try:
-        data = request.get_json()
-        user_input = data.get('user_input')
-        deepseek_api_key = data.get('DEEPSEEK_API_KEY', None)
-        dataset = data.get('dataset', 'champion')  
-
-        if not user_input:
-            return jsonify({'error': 'Missing user_input parameter'}), 400
-
-        # Chọn DataFrame dựa trên tham số dataset
-        if dataset.lower() == 'champion':
-            if champion_df is None:
-                return jsonify({'error': 'Champion DataFrame not loaded.'}), 500
-            df = champion_df
-        elif dataset.lower() == 'player':
-            if player_df is None:
-                return jsonify({'error': 'Player DataFrame not loaded.'}), 500
-            df = player_df
-        else:
-            return jsonify({'error': 'Invalid dataset parameter. Use "champion" or "player".'}), 400
-
-        # Debug: Kiểm tra dataframe
-        print(f"Using {dataset} dataframe with shape: {df.shape}")
-        
-        # Gọi hàm create_plot để tạo biểu đồ, chuyển tham số dataset
-        fig = create_plot(user_input, df, dataset, deepseek_api_key)
-        
-        # Debug: Kiểm tra figure
-        print(f"Generated figure type: {type(fig)}")
-        
-        # Chuyển đổi biểu đồ thành JSON để hiển thị trên frontend
-        try:
-            fig_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-            print(f"JSON conversion successful, length: {len(fig_json)}")
-            
-            # Kiểm tra định dạng JSON
-            parsed = json.loads(fig_json)
-            if 'data' not in parsed or 'layout' not in parsed:
-                print("WARNING: Missing 'data' or 'layout' in figure JSON")
-                
-            return jsonify({'plot': parsed})
-            
-        except Exception as json_error:
-            print(f"JSON conversion error: {str(json_error)}")
-            return jsonify({'error': f'Failed to convert plot to JSON: {str(json_error)}'}), 500
+        job, error = submit_plot_job(request.get_json())
+        if error:
+            return error
+        job.wait(plot_jobs.job_timeout + 1)
+        if job.status == DONE:
+            return plot_response(job.result)
+        log.warning('plot_failed %s', kv(job=job.id, status=job.status, error=job.error))
+        return jsonify({'error': job.error or 'Job chưa hoàn thành'}), 500
 
     except Exception as e:
-        import traceback
-        traceback_str = traceback.format_exc()
-        print(f"Error in generate_plot: {str(e)}\n{traceback_str}")
+        log.exception('generate_plot_failed')
         return jsonify({'error': str(e)}), 500
 
+
+# Tạo job vẽ biểu đồ: trả về job_id ngay, kết quả lấy qua GET /api/plot/jobs/<job_id>
+@app.route('/api/plot/jobs', methods=['POST'])
+def create_plot_job():
+    job, error = submit_plot_job(request.get_json())
+    if error:
+        return error
+    return plot_response({**job.to_dict(), 'url': f'/api/plot/jobs/{job.id}'}, status=202)
+
+
+# Trạng thái/kết quả của job; ?wait=<giây> giữ request tới khi job xong (long polling, tối đa 30 giây)
+@app.route('/api/plot/jobs/<job_id>', methods=['GET'])
+def get_plot_job(job_id):
+    job = plot_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    wait = min(request.args.get('wait', 0, type=float), 30)
+    if wait > 0:
+        job.wait(wait)
+    return plot_response(job.to_dict())
+
+
+# Tiến độ của job dạng server-sent events: mỗi sự kiện (giai đoạn, first_token, code_ready...) được đẩy
+# ngay khi xảy ra, luồng đóng sau sự kiện kết thúc (done/failed/cancelled); kết quả lấy qua GET ở trên.
+# Trình duyệt kết nối lại với Last-Event-ID thì chỉ nhận các sự kiện sau đó.
+@app.route('/api/plot/jobs/<job_id>/events', methods=['GET'])
+def plot_job_events(job_id):
+    job = plot_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    start = last_id + 1 if last_id is not None else 0
+
+    def stream():
+        index = start
+        while True:
+            events, finished = job.events_after(index, timeout=SSE_KEEPALIVE)
+            if not events and not finished:
+                # Giữ kết nối qua proxy khi một giai đoạn kéo dài
+                yield ': keepalive\n\n'
+                continue
+            for event in events:
+                yield f"id: {event['id']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            index += len(events)
+            if finished:
+                return
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Hủy job (ví dụ khi người dùng gửi câu hỏi mới trước khi câu cũ xong)
+@app.route('/api/plot/jobs/<job_id>', methods=['DELETE'])
+def cancel_plot_job(job_id):
+    job = plot_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    job.cancel()
+    return plot_response(job.to_dict())
+
+def start_batch(items, deepseek_api_key=None):
+    """Generator sự kiện của một batch (xem batch.run_batch); BatchError nếu danh sách mục không hợp lệ."""
+    entries = plan_batch(items, datasets.names())
+
+    def submit(entry):
+        df = get_dataframe(entry.dataset)
+        if df is None:
+            raise ValueError(f'{entry.dataset.capitalize()} DataFrame not loaded.')
+        return plot_jobs.submit(run_plot, entry.user_input, df, entry.dataset, deepseek_api_key)
+
+    return run_batch(entries, submit, datasets.version, cache=figure_cache, keepalive=SSE_KEEPALIVE)
+
+
+def precompute_dashboard(name):
+    """Vẽ trước mọi biểu đồ của dashboard vào figure_cache (chạy trong thread nền)."""
+    counts = {}
+    try:
+        for event in start_batch(dashboards[name]['items']):
+            if event and event['event'] == 'end':
+                counts = event
+    finally:
+        with _precomputing_lock:
+            _precomputing.discard(name)
+    log.info('dashboard_precomputed %s', kv(dashboard=name, done=counts.get('done'), failed=counts.get('failed'),
+                                            seconds=counts.get('elapsed')))
+
+
+def start_precompute(name):
+    """Chạy precompute_dashboard trong thread nền; False nếu dashboard đó đang được vẽ trước."""
+    with _precomputing_lock:
+        if name in _precomputing:
+            return False
+        _precomputing.add(name)
+    threading.Thread(target=precompute_dashboard, args=(name,), daemon=True).start()
+    return True
+
+
+# Vẽ nhiều biểu đồ trong một request: {"items": [{"user_input", "dataset"}, ...]} hoặc {"dashboard": tên}.
+# Phản hồi NDJSON (mỗi dòng một JSON), mỗi biểu đồ được gửi ngay khi xong; xem batch.run_batch.
+@app.route('/api/plot/batch', methods=['POST'])
+def generate_plot_batch():
+    data = request.get_json() or {}
+    items = data.get('items')
+    if data.get('dashboard') is not None:
+        dashboard = dashboards.get(data['dashboard'])
+        if dashboard is None:
+            return jsonify({'error': f"Dashboard not found: {data['dashboard']}"}), 404
+        items = dashboard['items']
+    try:
+        events = start_batch(items, data.get('DEEPSEEK_API_KEY'))
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+    compressor = StreamCompressor(request.headers.get('Accept-Encoding'))
+
+    def stream():
+        try:
+            for event in events:
+                # None: chưa có biểu đồ nào xong, gửi dòng trống để giữ kết nối
+                line = b'\n' if event is None else encode_response(event) + b'\n'
+                yield compressor.chunk(line)
+            yield compressor.finish()
+        finally:
+            # Client ngắt kết nối giữa chừng: hủy các job chưa xong
+            events.close()
+
+    response = Response(stream(), mimetype='application/x-ndjson',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    if compressor.encoding:
+        response.headers['Content-Encoding'] = compressor.encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+# Danh sách dashboard lưu sẵn (dashboards.json)
+@app.route('/api/dashboards', methods=['GET'])
+def list_dashboards():
+    return jsonify([{'name': name, 'title': dashboard.get('title', name), 'items': dashboard['items']}
+                    for name, dashboard in dashboards.items()])
+
+
+# Vẽ trước các biểu đồ của dashboard vào cache để lần mở sau trả về ngay
+@app.route('/api/dashboards/<name>/precompute', methods=['POST'])
+def precompute_dashboard_endpoint(name):
+    if name not in dashboards:
+        return jsonify({'error': f'Dashboard not found: {name}'}), 404
+    if not start_precompute(name):
+        return jsonify({'dashboard': name, 'status': 'running'}), 409
+    return jsonify({'dashboard': name, 'status': 'started'}), 202
+
+
+# Số đo cho Prometheus (thời gian từng giai đoạn, cache, token, lỗi chạy code, kích thước phản hồi)
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+# DASHBOARD_PRECOMPUTE=1: vẽ sẵn mọi dashboard khi khởi động (cần DEEPSEEK_API_KEY cho các câu không có fast path)
+if os.environ.get('DASHBOARD_PRECOMPUTE') == '1':
+    for _name in dashboards:
+        start_precompute(_name)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""
+Vẽ nhiều biểu đồ trong một lần gọi (POST /api/plot/batch), ví dụ cả một dashboard.
+
+- Các mục giống nhau (cùng dataset, cùng câu hỏi sau khi gộp khoảng trắng) chỉ
+  chạy một lần; kết quả được gửi kèm danh sách vị trí của mọi mục trùng.
+- Các mục chạy song song trong pool job dùng chung (jobs.JobManager, cùng giới
+  hạn số lời gọi DeepSeek); một batch giữ tối đa BATCH_CONCURRENCY job cùng lúc
+  để một dashboard lớn không chiếm hết hàng đợi của người dùng khác.
+- Mỗi biểu đồ được gửi về ngay khi xong (mỗi dòng một JSON), nên dashboard
+  mười biểu đồ hiện đủ sau khoảng thời gian của biểu đồ chậm nhất.
+- Biểu đồ đã vẽ được giữ trong FigureCache theo phiên bản dữ liệu. Dashboard
+  lưu sẵn (dashboards.json) có thể được tính trước: lúc khởi động với
+  DASHBOARD_PRECOMPUTE=1, hoặc qua POST /api/dashboards/<tên>/precompute.
+
+Cấu hình qua biến môi trường:
+    BATCH_MAX_ITEMS       số mục tối đa của một batch (mặc định 20)
+    BATCH_CONCURRENCY     số job tối đa của một batch chạy cùng lúc (mặc định JOB_WORKERS, 8)
+    FIGURE_CACHE_SIZE     số biểu đồ giữ trong cache (mặc định 128, 0 để tắt)
+    DASHBOARDS_PATH       file định nghĩa dashboard (mặc định src/dashboards.json)
+"""
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from jobs import DONE
+from metrics import FIGURE_CACHE_REQUESTS
+
+MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 20))
+CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', os.environ.get('JOB_WORKERS', 8)))
+DASHBOARDS_PATH = os.environ.get('DASHBOARDS_PATH',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboards.json'))
+
+
+class BatchError(ValueError):
+    pass
+
+
+class BatchEntry:
+    """Một mục (đã bỏ trùng) của batch: câu hỏi, dataset và các vị trí của nó trong danh sách gửi lên."""
+    __slots__ = ('user_input', 'dataset', 'indices', 'error')
+
+    def __init__(self, user_input, dataset, error=None):
+        self.user_input = user_input
+        self.dataset = dataset
+        self.indices = []
+        self.error = error
+
+    def event(self, **data):
+        return {'event': 'item', 'index': self.indices, 'user_input': self.user_input, 'dataset': self.dataset,
+                **data}
+
+
+def plan_batch(items, datasets, max_items=MAX_ITEMS):
+    """
+    Danh sách BatchEntry không trùng theo thứ tự xuất hiện đầu tiên. Mục có dataset
+    không hợp lệ vẫn có mặt (với `error`) để báo lỗi đúng vị trí; BatchError nếu cả batch sai.
+    """
+    if not isinstance(items, list) or not items:
+        raise BatchError('items phải là danh sách không rỗng các {"user_input", "dataset"}')
+    if len(items) > max_items:
+        raise BatchError(f'Tối đa {max_items} mục trong một batch, nhận {len(items)}')
+    entries = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('user_input'), str) or not item['user_input'].strip():
+            raise BatchError(f'Mục {index} thiếu user_input')
+        # Cùng cách chuẩn hóa với create_plot: khác khoảng trắng vẫn là cùng một câu hỏi
+        user_input = ' '.join(item['user_input'].split())
+        dataset = str(item.get('dataset', 'champion')).lower()
+        entry = entries.get((dataset, user_input))
+        if entry is None:
+            error = None if dataset in datasets else f'Dataset không hợp lệ: {dataset}'
+            entry = entries[(dataset, user_input)] = BatchEntry(user_input, dataset, error)
+        entry.indices.append(index)
+    return list(entries.values())
+
+
+class FigureCache:
+    """LRU các kết quả vẽ (dict có plot là RawJSON) theo (dataset, phiên bản dữ liệu, câu hỏi)."""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(int(os.environ.get('FIGURE_CACHE_SIZE', 128)))
+
+    def get(self, key):
+        if not self.max_entries:
+            return None
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        FIGURE_CACHE_REQUESTS.inc(result='miss' if result is None else 'hit')
+        return result
+
+    def set(self, key, result):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def run_batch(entries, submit, version, cache=None, concurrency=CONCURRENCY, keepalive=15):
+    """
+    Chạy các mục của batch, sinh ra từng sự kiện (dict) theo thứ tự hoàn thành:
+        {'event': 'start', 'items': số mục gửi lên, 'unique': số mục sau khi bỏ trùng}
+        {'event': 'item', 'index': [vị trí...], 'user_input', 'dataset', 'status': 'done', 'plot', ...,
+         'figure_cache': 'hit' | 'miss', 'elapsed'}   hoặc   {..., 'status': 'failed', 'error'}
+        {'event': 'end', 'done', 'failed', 'elapsed'}
+    và None sau mỗi `keepalive` giây không có gì mới (để giữ kết nối).
+
+    submit(entry) trả về jobs.Job vẽ mục đó; version(dataset) là phiên bản dữ liệu cho khóa cache.
+    Đóng generator giữa chừng (client ngắt kết nối) thì hủy các job chưa xong.
+    """
+    start = time.monotonic()
+    yield {'event': 'start', 'items': sum(len(e.indices) for e in entries), 'unique': len(entries)}
+    counts = {'done': 0, 'failed': 0}
+
+    def finished(entry, **data):
+        counts['done' if data['status'] == DONE else 'failed'] += 1
+        return entry.event(elapsed=round(time.monotonic() - start, 3), **data)
+
+    pending = []
+    for entry in entries:
+        if entry.error:
+            yield finished(entry, status='failed', error=entry.error)
+            continue
+        cached = cache.get((entry.dataset, version(entry.dataset), entry.user_input)) if cache else None
+        if cached is not None:
+            yield finished(entry, status=DONE, figure_cache='hit', **cached)
+        else:
+            pending.append(entry)
+
+    completed = queue.Queue()
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < concurrency:
+                entry = pending.pop(0)
+                try:
+                    job = submit(entry)
+                except Exception as e:
+                    yield finished(entry, status='failed', error=str(e))
+                    continue
+                running[job.id] = (entry, job, version(entry.dataset))
+                job.add_done_callback(completed.put)
+            if not running:
+                continue
+            try:
+                job = completed.get(timeout=keepalive)
+            except queue.Empty:
+                yield None
+                continue
+            entry, job, data_version = running.pop(job.id)
+            if job.status == DONE:
+                if cache:
+                    cache.set((entry.dataset, data_version, entry.user_input), job.result)
+                yield finished(entry, status=DONE, figure_cache='miss', **job.result)
+            else:
+                yield finished(entry, status=job.status, error=job.error)
+    finally:
+        for _, job, _ in running.values():
+            job.cancel()
+    yield {'event': 'end', **counts, 'elapsed': round(time.monotonic() - start, 3)}
+
+
+def load_dashboards(path=DASHBOARDS_PATH):
+    """Dict tên dashboard -> {'title', 'items'}; rỗng nếu chưa có file."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
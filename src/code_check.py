@@ -0,0 +1,249 @@
+"""
+Kiểm tra và biên dịch code Plotly do DeepSeek sinh ra trước khi chạy.
+
+Code được phân tích cú pháp (AST) một lần: từ chối đọc/ghi file, truy cập
+mạng (kể cả qua các hàm I/O của numpy và plotly.offline), import ngoài
+plotly/pandas/numpy, các hàm động (eval, exec, open...) và thuộc tính dunder.
+Chuỗi thuộc tính bắt đầu từ một module (pd, np, px, go...) được tra trên chính
+module đó: chỉ được đi qua các module trong ALLOWED_SUBMODULES, nên
+`pd.io.common.os` hay `np.lib.npyio` bị từ chối. Hàm ghi file (to_csv...) chỉ
+được gọi thẳng không tham số, không được lấy ra làm giá trị. Lệnh `fig.show()`
+đứng riêng bị bỏ đi thay vì từ chối cả đoạn code.
+
+Chạy `python code_check.py` để kiểm lại các đoạn code mẫu phải bị từ chối. Kết quả là code đã chuẩn hóa (ast.unparse) cùng code object đã biên
+dịch, được lưu theo sha256 của nội dung: chạy lại cùng một đoạn code (câu hỏi
+trúng cache, worker của sandbox) không phải parse và compile lại.
+"""
+import ast
+import hashlib
+import importlib
+import types
+import warnings
+
+from llm_cache import MemoryCache
+
+ALLOWED_MODULES = {'plotly', 'pandas', 'numpy', 'math'}
+# Module (tên đầy đủ) được import hoặc đi qua trong chuỗi thuộc tính; tên kết thúc bằng '.' cho phép cả gói con
+ALLOWED_SUBMODULES = {
+    'plotly', 'plotly.express', 'plotly.graph_objects', 'plotly.graph_objs.', 'plotly.subplots',
+    'plotly.colors', 'plotly.express.colors', '_plotly_utils.colors.', 'plotly.figure_factory',
+    'pandas', 'pandas.api', 'pandas.api.types', 'numpy', 'numpy.random', 'numpy.linalg', 'math',
+}
+# Biến có sẵn khi chạy code sinh ra (xem plot_generator.run_plot và sandbox)
+ROOT_MODULES = {'pd': 'pandas', 'px': 'plotly.express'}
+BLOCKED_NAMES = {
+    'open', 'exec', 'eval', 'compile', '__import__', 'globals', 'locals', 'vars',
+    'getattr', 'setattr', 'delattr', 'input', 'breakpoint', 'exit', 'quit', 'help', '__builtins__',
+}
+# Hàm hiển thị, ghi file hoặc đọc dữ liệu từ ngoài (pd.read_csv, pd.read_html...), kể cả qua numpy
+# (np.save, np.loadtxt, np.genfromtxt đọc được cả URL...) và plotly.offline (plot/iplot ghi file HTML, mở trình duyệt)
+BLOCKED_ATTRIBUTES = {
+    'show', 'write_html', 'write_image', 'write_json', 'to_excel', 'to_parquet', 'to_pickle',
+    'to_sql', 'to_hdf', 'to_feather', 'to_stata', 'to_orc', 'to_clipboard', 'HDFStore', 'ExcelWriter',
+    'save', 'savez', 'savez_compressed', 'savetxt', 'load', 'loadtxt', 'genfromtxt', 'fromfile', 'fromregex',
+    'tofile', 'dump', 'memmap', 'open_memmap', 'DataSource', 'npyio', 'offline',
+    # Tên module/hàm I/O nội bộ, chặn cả khi gốc của chuỗi không phải module (df, agg, biến trung gian)
+    'os', 'sys', 'io', 'common', 'subprocess', 'urlopen', 'get_handle', 'builtins', 'importlib', 'shutil',
+    'socket', 'urllib', 'pathlib',
+}
+BLOCKED_ATTRIBUTE_PREFIXES = ('read_', '_')
+# Trả về chuỗi khi gọi không tham số, nhưng ghi ra file nếu có đường dẫn
+WRITER_METHODS = {'to_csv', 'to_json', 'to_html', 'to_string', 'to_markdown', 'to_latex', 'to_xml'}
+
+_compiled = MemoryCache(maxsize=512)
+
+
+class CodeValidationError(ValueError):
+    pass
+
+
+class _DropShow(ast.NodeTransformer):
+    """Bỏ các lệnh `<x>.show(...)` đứng riêng ở mọi cấp (kể cả trong `if __name__ == '__main__':`)."""
+
+    def visit_Expr(self, node):
+        call = node.value
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'show':
+            return None
+        return node
+
+    def generic_visit(self, node):
+        super().generic_visit(node)
+        # Khối lệnh chỉ có show() (ví dụ if/for) không được để trống
+        if not isinstance(node, ast.Module) and getattr(node, 'body', None) == []:
+            node.body = [ast.Pass()]
+        return node
+
+
+def _module_allowed(name):
+    return name in ALLOWED_SUBMODULES or any(
+        prefix.endswith('.') and name.startswith(prefix) for prefix in ALLOWED_SUBMODULES)
+
+
+def _import(module):
+    if module.split('.')[0] not in ALLOWED_MODULES or not _module_allowed(module):
+        raise CodeValidationError(f'Không được import module {module}')
+    try:
+        return importlib.import_module(module)
+    except ImportError:
+        raise CodeValidationError(f'Không import được module {module}')
+
+
+def _bind_imports(node, roots):
+    """Kiểm tra một lệnh import và ghi các tên nó gán vào `roots` (tên -> đối tượng)."""
+    if isinstance(node, ast.Import):
+        for alias in node.names:
+            module = _import(alias.name)
+            if alias.asname:
+                roots[alias.asname] = module
+            else:
+                roots[alias.name.split('.')[0]] = importlib.import_module(alias.name.split('.')[0])
+        return
+    if node.level:
+        raise CodeValidationError('Không được import tương đối')
+    module = _import(node.module or '')
+    for alias in node.names:
+        if alias.name == '*':
+            raise CodeValidationError(f'Không được dùng from {node.module} import *')
+        # from numpy import save, from plotly import offline...
+        if alias.name in BLOCKED_ATTRIBUTES or alias.name.startswith(BLOCKED_ATTRIBUTE_PREFIXES):
+            raise CodeValidationError(f'Không được import {node.module}.{alias.name} (dùng {alias.name})')
+        value = getattr(module, alias.name, None)
+        if value is None:
+            value = _import(f'{node.module}.{alias.name}')
+        elif isinstance(value, types.ModuleType) and not _module_allowed(value.__name__):
+            raise CodeValidationError(f'Không được import module {value.__name__}')
+        roots[alias.asname or alias.name] = value
+
+
+def _chain(node):
+    """(tên gốc, [thuộc tính...]) của `a.b.c`; None nếu gốc không phải một tên."""
+    attrs = []
+    while isinstance(node, ast.Attribute):
+        attrs.append(node.attr)
+        node = node.value
+    return (node.id, attrs[::-1]) if isinstance(node, ast.Name) else None
+
+
+def _check_chain(root, value, attrs):
+    """Tra chuỗi thuộc tính trên đối tượng thật: không được đi qua module ngoài ALLOWED_SUBMODULES."""
+    path = root
+    for attr in attrs:
+        path = f'{path}.{attr}'
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                value = getattr(value, attr)
+        except Exception:
+            # Thuộc tính không có: code sẽ lỗi khi chạy, không có gì để kiểm thêm
+            return
+        if isinstance(value, types.ModuleType) and not _module_allowed(value.__name__):
+            raise CodeValidationError(f'Không được dùng {path} (module {value.__name__})')
+
+
+def _check(tree):
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    roots = {name: importlib.import_module(module) for name, module in ROOT_MODULES.items()}
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            _bind_imports(node, roots)
+
+    assigns_fig = False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            if node.id in BLOCKED_NAMES:
+                raise CodeValidationError(f'Không được dùng {node.id}')
+            if node.id == 'fig' and isinstance(node.ctx, ast.Store):
+                assigns_fig = True
+            if isinstance(roots.get(node.id), types.ModuleType):
+                if not isinstance(node.ctx, ast.Load):
+                    raise CodeValidationError(f'Không được gán lại {node.id}')
+                parent = parents.get(node)
+                # Module chỉ được dùng làm gốc của chuỗi thuộc tính, không được truyền/gán đi nơi khác
+                if not (isinstance(parent, ast.Attribute) and parent.value is node):
+                    raise CodeValidationError(f'Không được dùng module {node.id} như một giá trị')
+        elif isinstance(node, ast.Attribute):
+            if node.attr in BLOCKED_ATTRIBUTES or node.attr.startswith(BLOCKED_ATTRIBUTE_PREFIXES):
+                raise CodeValidationError(f'Không được dùng .{node.attr}')
+            if node.attr in WRITER_METHODS:
+                parent = parents.get(node)
+                # Chỉ `x.to_csv()` (trả về chuỗi); `w = x.to_csv` rồi gọi w(đường dẫn) cũng ghi được file
+                if not (isinstance(parent, ast.Call) and parent.func is node):
+                    raise CodeValidationError(f'Không được dùng .{node.attr} như một giá trị')
+                if parent.args or parent.keywords:
+                    raise CodeValidationError(f'Không được ghi file bằng .{node.attr}(...)')
+            chain = _chain(node)
+            if chain is not None and chain[0] in roots:
+                _check_chain(chain[0], roots[chain[0]], chain[1])
+    if not assigns_fig:
+        raise CodeValidationError("Code không gán biểu đồ vào biến 'fig'")
+
+
+def _prepare(source):
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        raise CodeValidationError(f'Code sinh ra không đúng cú pháp Python: {e.msg} (dòng {e.lineno})')
+    tree = ast.fix_missing_locations(_DropShow().visit(tree))
+    _check(tree)
+    normalized = ast.unparse(tree)
+    return normalized, compile(tree, '<generated>', 'exec')
+
+
+def _lookup(source):
+    key = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    entry = _compiled.get(key)
+    if entry is None:
+        entry = _prepare(source)
+        _compiled.set(key, entry)
+        # Code đã chuẩn hóa (thứ được lưu vào cache câu trả lời) cũng trỏ tới cùng code object
+        _compiled.set(hashlib.sha256(entry[0].encode('utf-8')).hexdigest(), entry)
+    return entry
+
+
+def normalize_code(source):
+    """Code đã kiểm tra và chuẩn hóa; CodeValidationError nếu bị từ chối."""
+    return _lookup(source)[0]
+
+
+def compile_code(source):
+    """Code object sẵn sàng cho exec; CodeValidationError nếu bị từ chối."""
+    return _lookup(source)[1]
+
+
+# Các đoạn code từng lọt qua bước kiểm tra; `python code_check.py` kiểm lại rằng chúng đều bị từ chối
+REJECTED_EXAMPLES = [
+    "fig = pd.io.common.os.listdir('/')",
+    "fig = pd.io.common.os.system('id')",
+    "fig = pd.io.common.urlopen('http://example.com')",
+    "fig = pd.io.common.get_handle('/tmp/x', 'w')",
+    "w = df.to_csv\nw('/tmp/x')\nfig = px.bar(df)",
+    "fig = px.bar(df)\ndf.to_csv('/tmp/x')",
+    "m = pd\nfig = m.io.common.os.listdir('/')",
+    "import numpy as np\nfig = np.lib.npyio.os.listdir('/')",
+    "from pandas import io\nfig = io.common.os.listdir('/')",
+    "from pandas.io.common import urlopen\nfig = urlopen('http://example.com')",
+    "import plotly\nfig = px.bar(df)\nplotly.io.write_html(fig, '/tmp/x.html')",
+    "import numpy as np\nfig = px.bar(df)\nnp.save('/tmp/x', df.values)",
+    "fig = px.bar(df.agg.__globals__)",
+]
+ACCEPTED_EXAMPLES = [
+    "import plotly.graph_objects as go\nimport numpy as np\n"
+    "fig = go.Figure(go.Bar(x=df['Champion'], y=np.round(df['WR'], 1)))\n"
+    "fig.update_traces(marker_color=px.colors.qualitative.Plotly[0])",
+    "from plotly.subplots import make_subplots\nfig = make_subplots(rows=1, cols=2)\n"
+    "fig.add_bar(x=df['Champion'], y=df['G'])\ntext = df.head().to_csv()",
+    "top = df.sort_values('KDA').head(10)\nfig = px.bar(top, x='Player', y='KDA', title=pd.Timestamp('2024').year)",
+]
+
+
+if __name__ == '__main__':
+    for source in REJECTED_EXAMPLES:
+        try:
+            _prepare(source)
+        except CodeValidationError as e:
+            print(f'từ chối  {source!r}: {e}')
+        else:
+            raise SystemExit(f'LỌT QUA: {source!r}')
+    for source in ACCEPTED_EXAMPLES:
+        _prepare(source)
+        print(f'chấp nhận {source!r}')
@@ -0,0 +1,52 @@
+"""
+Bộ dữ liệu `combined`: bảng nối sẵn người chơi - tướng - giải đấu.
+
+Mỗi dòng là một tướng tủ (Champion_1/2/3, Pick_Rank 1..3) của một người chơi
+trong một giải (Year, Tournamment), kèm chỉ số của người chơi (tiền tố
+Player_) và chỉ số của tướng trong cùng giải đó (tiền tố Champion_). Các cột
+khóa là Categorical (mã số nguyên), nên câu hỏi liên quan cả hai bộ dữ liệu
+("tỉ lệ thắng của các tướng mà đường giữa của đội X chơi nhiều nhất") chỉ cần
+lọc trên bảng này thay vì code sinh ra tự merge lại mỗi lần.
+
+Bảng được dựng từ hai dataset champion và player của DatasetLoader (xem
+derived_datasets) và dựng lại khi một trong hai CSV nguồn đổi.
+"""
+NAME = 'combined'
+DEPENDENCIES = ('champion', 'player')
+
+PICK_COLUMNS = ['Champion_1', 'Champion_2', 'Champion_3']
+# Giá trị dùng trong dữ liệu player khi người chơi có ít hơn 3 tướng
+MISSING_PICK = 'IsNone'
+KEY_COLUMNS = ['Year', 'Tournamment', 'Season', 'Event_Type', 'Team', 'Player', 'Role']
+PLAYER_STATS = ['G', 'W', 'L', 'WR', 'K', 'D', 'A', 'KDA', 'CS/M', 'G/M', 'KPAR', 'CP']
+CHAMPION_STATS = ['GP', 'PB', '%B', '%P', 'W', 'L', 'WR', 'KDA', 'CS/M', 'G/M']
+CATEGORICAL_COLUMNS = ['Tournamment', 'Season', 'Event_Type', 'Team', 'Player', 'Role', 'Champion']
+
+
+def build_combined(champion, player):
+    """Bảng nối người chơi - tướng - giải đấu từ hai DataFrame champion và player."""
+    picks = player[KEY_COLUMNS + PLAYER_STATS + PICK_COLUMNS].rename(
+        columns={c: f'Player_{c}' for c in PLAYER_STATS})
+    long = picks.melt(id_vars=[c for c in picks.columns if c not in PICK_COLUMNS], value_vars=PICK_COLUMNS,
+                      var_name='Pick_Rank', value_name='Champion')
+    long = long[long['Champion'].notna() & (long['Champion'] != MISSING_PICK)]
+    long['Pick_Rank'] = long['Pick_Rank'].str[-1].astype('int8')
+    long['Champion'] = long['Champion'].astype(str)
+
+    stats = champion[['Year', 'Tournamment', 'Champion'] + CHAMPION_STATS].rename(
+        columns={c: f'Champion_{c}' for c in CHAMPION_STATS})
+    stats['Champion'] = stats['Champion'].astype(str)
+    combined = long.merge(stats, on=['Year', 'Tournamment', 'Champion'], how='left', validate='many_to_one')
+    for column in CATEGORICAL_COLUMNS:
+        combined[column] = combined[column].astype('category')
+    order = ['Year', 'Tournamment', 'Player', 'Pick_Rank']
+    columns = KEY_COLUMNS + ['Champion', 'Pick_Rank'] + [c for c in combined.columns
+                                                         if c.startswith(('Player_', 'Champion_'))]
+    return combined.sort_values(order, kind='stable')[columns].reset_index(drop=True)
+
+
+def derived_datasets(names):
+    """Định nghĩa dataset dẫn xuất cho DatasetLoader khi có đủ các dataset nguồn trong `names`."""
+    if all(name in names for name in DEPENDENCIES):
+        return {NAME: (DEPENDENCIES, build_combined)}
+    return {}
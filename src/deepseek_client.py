@@ -0,0 +1,336 @@
+"""
+Client HTTP dùng chung cho DeepSeek (API chat completions tương thích OpenAI).
+
+- Một requests.Session với pool kết nối keep-alive: các lời gọi sau dùng lại
+  kết nối TLS đã mở thay vì bắt tay lại từ đầu.
+- Thời hạn kết nối/đọc cấu hình được; với stream, thời hạn đọc áp dụng cho
+  từng chunk.
+- Thử lại khi gặp 429/5xx hoặc lỗi kết nối, chờ theo backoff lũy thừa có
+  jitter (tôn trọng Retry-After của 429).
+- Circuit breaker: sau DEEPSEEK_BREAKER_FAILURES lời gọi thất bại liên tiếp
+  (lỗi kết nối, quá hạn, 5xx), mọi lời gọi báo lỗi ngay trong
+  DEEPSEEK_BREAKER_RESET giây; sau đó cho một lời gọi thử, thành công thì đóng lại.
+- Gộp yêu cầu: các lời gọi giống hệt nhau (cùng payload, cùng key) đang chạy
+  cùng lúc chỉ gửi một yêu cầu lên DeepSeek, các lời gọi sau chờ và dùng chung
+  kết quả.
+
+Cấu hình qua biến môi trường:
+    DEEPSEEK_BASE_URL          địa chỉ gốc của API (mặc định https://api.deepseek.com/v1)
+    DEEPSEEK_MODEL             model mặc định (mặc định deepseek-chat)
+    DEEPSEEK_STREAM            đặt 0 để không stream câu trả lời
+    DEEPSEEK_CONNECT_TIMEOUT   thời hạn kết nối, giây (mặc định 10)
+    DEEPSEEK_READ_TIMEOUT      thời hạn đọc, giây (mặc định 60)
+    DEEPSEEK_RETRIES           số lần thử lại (mặc định 2)
+    DEEPSEEK_BACKOFF           thời gian chờ cơ sở giữa các lần thử, giây (mặc định 0.5)
+    DEEPSEEK_POOL_SIZE         số kết nối giữ trong pool (mặc định 10)
+    DEEPSEEK_BREAKER_FAILURES  số lần thất bại liên tiếp để ngắt (mặc định 5)
+    DEEPSEEK_BREAKER_RESET     thời gian ngắt trước khi thử lại, giây (mặc định 30)
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import LLM_REQUESTS, kv, record_usage
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_BACKOFF = 8.0
+
+log = logging.getLogger(__name__)
+
+
+class DeepSeekError(Exception):
+    """Lỗi từ DeepSeek API (status là mã HTTP, None nếu lỗi kết nối)."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class DeepSeekUnavailable(DeepSeekError):
+    """Circuit breaker đang mở: DeepSeek vừa lỗi liên tục nên không gọi nữa."""
+
+
+class CircuitBreaker:
+    """Ngắt sau `failures` lần thất bại liên tiếp; sau `reset_timeout` giây cho một lời gọi thử."""
+
+    def __init__(self, failures=5, reset_timeout=30.0):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_call(self):
+        """Ném DeepSeekUnavailable nếu đang ngắt; ở trạng thái nửa mở chỉ một lời gọi thử được đi qua."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._trial:
+                raise DeepSeekUnavailable(
+                    f'DeepSeek API tạm thời không khả dụng (thử lại sau {max(remaining, 1):.0f} giây)')
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            self._trial = False
+            if self.opened_at is not None or self.consecutive >= self.failures:
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """Lời gọi thử kết thúc không rõ kết quả (ví dụ bị hủy): cho lời gọi khác thử."""
+        with self._lock:
+            self._trial = False
+
+
+class _InFlight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _sleep(seconds, check=None):
+    """Ngủ `seconds` giây, vẫn gọi check (ví dụ Job.check) để có thể bị hủy giữa chừng."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if check:
+            check()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, 0.1))
+
+
+def _log_usage(usage):
+    # prompt_cache_hit_tokens: số token của tiền tố DeepSeek lấy từ cache ngữ cảnh
+    record_usage(usage)
+    if usage:
+        log.info('deepseek_usage %s', kv(**{k: v for k, v in usage.items() if isinstance(v, (int, float))}))
+
+
+class DeepSeekClient:
+    def __init__(self, base_url='https://api.deepseek.com/v1', model='deepseek-chat', stream=True,
+                 connect_timeout=10.0, read_timeout=60.0, retries=2, backoff=0.5, pool_size=10,
+                 breaker_failures=5, breaker_reset=30.0):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.model = model
+        self.stream = stream
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(
+            base_url=env('DEEPSEEK_BASE_URL', 'https://api.deepseek.com/v1'),
+            model=env('DEEPSEEK_MODEL', 'deepseek-chat'),
+            stream=env('DEEPSEEK_STREAM', '1') != '0',
+            connect_timeout=float(env('DEEPSEEK_CONNECT_TIMEOUT', 10)),
+            read_timeout=float(env('DEEPSEEK_READ_TIMEOUT', 60)),
+            retries=int(env('DEEPSEEK_RETRIES', 2)),
+            backoff=float(env('DEEPSEEK_BACKOFF', 0.5)),
+            pool_size=int(env('DEEPSEEK_POOL_SIZE', 10)),
+            breaker_failures=int(env('DEEPSEEK_BREAKER_FAILURES', 5)),
+            breaker_reset=float(env('DEEPSEEK_BREAKER_RESET', 30)),
+        )
+
+    # ---------------------------------------------------------------- gọi API
+
+    def chat(self, messages, api_key, model=None, temperature=0.1, max_tokens=2000, timeout=None,
+             stream=None, stop=None, on_event=None, check=None):
+        """
+        Nội dung câu trả lời cho `messages`.
+
+        timeout: (kết nối, đọc) thay cho mặc định, ví dụ theo thời hạn còn lại của job;
+        stream: stream câu trả lời (mặc định theo cấu hình);
+        stop: hàm nhận nội dung đã có, trả về True để ngừng đọc sớm (đóng kết nối);
+        on_event: hàm nhận tên sự kiện tiến độ ('prompt_sent', 'first_token');
+        check: hàm gọi định kỳ (ví dụ Job.check), ném exception để hủy giữa chừng.
+        """
+        payload = {'model': model or self.model, 'messages': messages, 'temperature': temperature,
+                   'max_tokens': max_tokens}
+        stream = self.stream if stream is None else stream
+        key = hashlib.sha256(json.dumps([payload, api_key], ensure_ascii=False).encode('utf-8')).hexdigest()
+        while True:
+            with self._lock:
+                entry = self._inflight.get(key)
+                leader = entry is None
+                if leader:
+                    entry = self._inflight[key] = _InFlight()
+            if leader:
+                break
+            # Cùng câu hỏi đang được gọi: chờ và dùng chung kết quả
+            LLM_REQUESTS.inc(outcome='coalesced')
+            if on_event:
+                on_event('prompt_sent')
+            while not entry.done.wait(0.1):
+                if check:
+                    check()
+            if entry.error is None:
+                return entry.result
+            if isinstance(entry.error, Exception):
+                raise entry.error
+            # Lời gọi dẫn đầu bị hủy/quá hạn (không phải lỗi của DeepSeek): tự gọi lại
+        try:
+            entry.result = self._call(payload, api_key, timeout, stream, stop, on_event, check)
+            return entry.result
+        except BaseException as e:
+            entry.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            entry.done.set()
+
+    def _call(self, payload, api_key, timeout, stream, stop, on_event, check):
+        """Một lời gọi (có thử lại và circuit breaker)."""
+        try:
+            self.breaker.before_call()
+        except DeepSeekUnavailable:
+            LLM_REQUESTS.inc(outcome='rejected')
+            raise
+        attempt = 0
+        try:
+            while True:
+                try:
+                    result = self._request(payload, api_key, timeout, stream, stop, on_event, check)
+                except DeepSeekError as e:
+                    retry_after = getattr(e, 'retry_after', None)
+                    if e.status is not None and e.status not in RETRY_STATUSES:
+                        # Lỗi phía yêu cầu (key sai, payload sai): DeepSeek vẫn hoạt động
+                        self.breaker.record_success()
+                        LLM_REQUESTS.inc(outcome='error')
+                        raise
+                    if attempt >= self.retries:
+                        if e.status != 429:
+                            self.breaker.record_failure()
+                        LLM_REQUESTS.inc(outcome='error')
+                        log.warning('deepseek_failed %s', kv(status=e.status, attempts=attempt + 1,
+                                                             breaker=self.breaker.state))
+                        raise
+                    attempt += 1
+                    delay = max(random.uniform(0, min(MAX_BACKOFF, self.backoff * 2 ** attempt)), retry_after or 0)
+                    LLM_REQUESTS.inc(outcome='retry')
+                    log.info('deepseek_retry %s', kv(status=e.status, attempt=attempt, delay=delay))
+                    _sleep(delay, check)
+                    continue
+                self.breaker.record_success()
+                LLM_REQUESTS.inc(outcome='ok')
+                return result
+        except DeepSeekError:
+            raise
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+
+    def _request(self, payload, api_key, timeout, stream, stop, on_event, check):
+        headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+        body = dict(payload)
+        if stream:
+            body.update({'stream': True, 'stream_options': {'include_usage': True}})
+        if on_event:
+            on_event('prompt_sent')
+        try:
+            response = self.session.post(self.url, headers=headers, json=body, timeout=timeout or self.timeout,
+                                         stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise DeepSeekError(f'DeepSeek API error: {type(e).__name__}: {e}') from e
+        with response:
+            if response.status_code != 200:
+                error = DeepSeekError(f'DeepSeek API error: {response.status_code} - {response.text}',
+                                      response.status_code)
+                if response.status_code == 429:
+                    try:
+                        error.retry_after = min(float(response.headers.get('Retry-After', 0)), MAX_BACKOFF)
+                    except ValueError:
+                        pass
+                raise error
+            try:
+                if stream:
+                    return self._read_stream(response, stop, on_event, check)
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                # Kết nối đứt giữa chừng (ChunkedEncodingError...) hoặc JSON hỏng: thử lại và tính vào circuit breaker
+                raise DeepSeekError(f'DeepSeek API error: {type(e).__name__}: {e}') from e
+        _log_usage(result.get('usage'))
+        return result['choices'][0]['message']['content']
+
+    @staticmethod
+    def _read_stream(response, stop=None, on_event=None, check=None):
+        """Ghép nội dung từ các chunk SSE (`data: {...}`); dừng khi stop(nội dung) trả về True."""
+        response.encoding = 'utf-8'
+        # Chuỗi cộng dồn (không join lại cả danh sách sau mỗi chunk) và số chunk nội dung
+        text, chunks = '', 0
+        usage = None
+        for line in response.iter_lines(decode_unicode=True):
+            if check:
+                check()
+            if not line or not line.startswith('data:'):
+                continue
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            if chunk.get('usage'):
+                usage = chunk['usage']
+            choices = chunk.get('choices') or [{}]
+            content = (choices[0].get('delta') or {}).get('content')
+            if not content:
+                continue
+            if not chunks and on_event:
+                on_event('first_token')
+            text += content
+            chunks += 1
+            if stop and stop(text):
+                break
+        # Ngừng đọc sớm thì DeepSeek không kịp gửi usage: mỗi chunk nội dung xấp xỉ một token
+        _log_usage(usage or {'completion_tokens': chunks})
+        return text
+
+    def close(self):
+        self.session.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_client():
+    """Client dùng chung của tiến trình, tạo từ biến môi trường khi dùng lần đầu."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = DeepSeekClient.from_env()
+        return _default
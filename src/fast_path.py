@@ -0,0 +1,265 @@
+"""
+Đường xử lý nhanh: nhận diện các dạng câu hỏi quen thuộc và dựng biểu đồ Plotly
+ngay tại chỗ, không gọi DeepSeek.
+
+Các dạng được hỗ trợ (tiếng Việt hoặc tiếng Anh):
+- top N: "top 10 tướng có tỉ lệ thắng cao nhất", "WR của 10 champion được chơi nhiều nhất",
+  "so sánh tỉ lệ chọn và tỉ lệ cấm của các tướng";
+- xu hướng: "xu hướng KDA theo năm", "WR của Azir theo thời gian";
+- theo nhóm: "tỉ lệ thắng theo vai trò", "KDA theo vị trí tướng".
+
+Câu hỏi chỉ được trả lời ở đây khi mọi từ trong câu đều được nhận diện; còn
+từ lạ nào thì trả về None để create_plot gọi DeepSeek như bình thường. Biểu đồ
+theo cùng quy tắc với prompt: tiêu đề là câu hỏi, màu #C89B3C/#005A82, làm tròn
+2 chữ số, tối đa 20 đối tượng, không hiển thị giá trị thiếu.
+"""
+import re
+import unicodedata
+
+import pandas as pd
+import plotly.express as px
+
+MAX_ITEMS = 20
+PALETTE = ['#C89B3C', '#005A82', '#0AC8B9', '#785A28', '#0397AB']
+ROLES = ['Top Laner', 'Jungler', 'Mid Laner', 'Bot Laner', 'Support']
+# Cột đếm được cộng dồn khi gộp theo đối tượng, các cột còn lại lấy trung bình
+SUM_COLUMNS = {'G', 'GP', 'W', 'L', 'B'}
+# Số trận đã chơi của từng bộ dữ liệu ("được chơi nhiều nhất", "số trận")
+GAMES_COLUMN = {'champion': 'GP', 'player': 'G'}
+GAMES = 'games'
+
+# Cụm từ -> cột; cụm dài được thử trước nên "tỉ lệ chọn/cấm" không bị hiểu thành "tỉ lệ chọn"
+METRIC_PHRASES = {
+    'tỉ lệ chiến thắng': 'WR', 'tỉ lệ thắng': 'WR', 'win rate': 'WR', 'winrate': 'WR',
+    'tỉ lệ chọn/cấm': 'PB', 'tỉ lệ chọn cấm': 'PB', 'pick/ban': 'PB', 'pick ban rate': 'PB',
+    'tỉ lệ cấm': '%B', 'ban rate': '%B', 'tỉ lệ chọn': '%P', 'pick rate': '%P',
+    'tỉ lệ tham gia hạ gục': 'KPAR', 'tham gia hạ gục': 'KPAR', 'kill participation': 'KPAR',
+    'tỉ lệ đóng góp hạ gục': 'KS', 'kill share': 'KS', 'tỉ lệ đóng góp vàng': 'GS', 'gold share': 'GS',
+    'vàng mỗi phút': 'G/M', 'gold per minute': 'G/M', 'lính mỗi phút': 'CS/M', 'cs per minute': 'CS/M',
+    'số mạng hạ gục': 'K', 'số lần bị hạ gục': 'D', 'số lần hỗ trợ': 'A',
+    'kills': 'K', 'deaths': 'D', 'assists': 'A',
+    'số trận thắng': 'W', 'số trận thua': 'L', 'số trận bị cấm': 'B',
+    'số trận': GAMES, 'games played': GAMES,
+}
+# Tên cột được gõ trực tiếp (chỉ các tên không trùng với từ thông thường)
+COLUMN_TOKENS = ['KDA', 'WR', 'GP', 'PB', 'CS/M', 'G/M', 'KPAR', 'KS', 'GS', 'CS', '%B', '%P', 'CP']
+
+RANK_BY_GAMES = ['được chơi nhiều nhất', 'chơi nhiều nhất', 'nhiều trận nhất', 'most played', 'most picked']
+ASCENDING = ['thấp nhất', 'ít nhất', 'tệ nhất', 'kém nhất', 'lowest', 'worst', 'bottom', 'least']
+DESCENDING = ['cao nhất', 'nhiều nhất', 'tốt nhất', 'hàng đầu', 'highest', 'best', 'most']
+TREND = ['xu hướng', 'theo thời gian', 'qua thời gian', 'qua các năm', 'theo năm', 'qua từng năm',
+         'over time', 'over the years', 'by year', 'per year', 'trend']
+GROUPS = {
+    'theo vai trò': 'Role', 'theo vị trí': 'Role', 'by role': 'Role', 'per role': 'Role',
+    'theo đội': 'Team', 'by team': 'Team', 'per team': 'Team',
+    'theo mùa giải': 'Season', 'theo mùa': 'Season', 'by season': 'Season',
+    'theo giai đoạn': 'Event_Type', 'theo loại sự kiện': 'Event_Type', 'by stage': 'Event_Type',
+}
+FILTERS = {
+    'mùa xuân': ('Season', 'Spring'), 'spring': ('Season', 'Spring'),
+    'mùa hè': ('Season', 'Summer'), 'summer': ('Season', 'Summer'),
+    'mùa đông': ('Season', 'Winter'), 'winter': ('Season', 'Winter'),
+    'playoffs': ('Event_Type', 'Playoffs'), 'vòng loại trực tiếp': ('Event_Type', 'Playoffs'),
+    'thăng hạng': ('Event_Type', 'Promotion'), 'promotion': ('Event_Type', 'Promotion'),
+    'vòng bảng': ('Event_Type', 'Season'), 'regular season': ('Event_Type', 'Season'),
+}
+ENTITIES = {
+    'người chơi': 'Player', 'tuyển thủ': 'Player', 'players': 'Player', 'player': 'Player',
+    'đội': 'Team', 'teams': 'Team', 'team': 'Team',
+    'tướng': 'Champion', 'champions': 'Champion', 'champion': 'Champion',
+}
+# Từ không mang nghĩa riêng cho biểu đồ, được phép còn sót lại sau khi nhận diện
+FILLER_WORDS = set("""
+    hiển thị hiện vẽ biểu đồ so sánh phân tích thống kê xem cho tôi của các những có với và
+    trong giữa là về ở tại nhất top trung bình bảng xếp hạng giải đấu vcs năm mùa mỗi từng theo
+    show plot chart graph display compare analyze analysis list rank ranking me the of by for with and in
+    a an top average mean per each season year vcs lol
+""".split())
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFC', text).casefold().replace('tỷ', 'tỉ')
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _pattern(phrase):
+    return re.compile(r'(?<![\w/%])' + re.escape(phrase) + r'(?![\w/%])')
+
+
+class _Query:
+    """Câu hỏi đã chuẩn hóa; `take` tìm và xóa một cụm từ để biết phần nào chưa được hiểu."""
+
+    def __init__(self, text):
+        self.text = ' ' + _normalize(text) + ' '
+
+    def take(self, phrases):
+        """[(vị trí, cụm từ)] của các cụm tìm thấy, thử cụm dài trước."""
+        found = []
+        for phrase in sorted(phrases, key=len, reverse=True):
+            pattern = _pattern(phrase.casefold())
+            for match in pattern.finditer(self.text):
+                found.append((match.start(), phrase))
+            self.text = pattern.sub(lambda m: ' ' * len(m.group()), self.text)
+        return sorted(found)
+
+    def leftover(self):
+        words = re.findall(r'[^\W_]+', self.text)
+        return [w for w in words if w not in FILLER_WORDS]
+
+
+def parse_intent(user_input, df, dataset_type, column_descriptions):
+    """
+    Phân tích câu hỏi thành intent (dict), hoặc None nếu có phần không hiểu.
+
+    intent: {'kind': 'top' | 'trend' | 'group', 'metrics': [...], 'entity': cột đối tượng,
+             'n', 'rank_by', 'ascending', 'group', 'filters': {cột: giá trị}, 'names': [...]}
+    """
+    query = _Query(user_input)
+    games_column = GAMES_COLUMN[dataset_type]
+    known = [c for c in column_descriptions if c in df.columns]
+
+    def metric(column):
+        column = games_column if column == GAMES else column
+        return column if column in known and pd.api.types.is_numeric_dtype(df[column]) else None
+
+    rank_by_games = bool(query.take(RANK_BY_GAMES))
+    group = [GROUPS[p] for _, p in query.take(GROUPS)]
+    trend = bool(query.take(TREND))
+    filters = {}
+    for _, phrase in query.take(FILTERS):
+        column, value = FILTERS[phrase]
+        if column in df.columns:
+            filters[column] = value
+    years = [int(y) for _, y in query.take([str(y) for y in sorted(df['Year'].unique())])] if 'Year' in df else []
+
+    metrics = []
+    for _, phrase in sorted(query.take(METRIC_PHRASES) + query.take(COLUMN_TOKENS)):
+        column = metric(METRIC_PHRASES.get(phrase, phrase))
+        if column is None:
+            return None
+        if column not in metrics:
+            metrics.append(column)
+
+    entities = [ENTITIES[p] for _, p in query.take(ENTITIES)]
+    entity = entities[0] if entities else ('Champion' if dataset_type == 'champion' else 'Player')
+    if entity not in df.columns:
+        return None
+
+    # Tên cụ thể (tướng/người chơi/đội) được nhắc tới -> lọc theo tên đó
+    candidates = [str(v) for v in df[entity].dropna().unique() if len(str(v)) >= 3]
+    names = sorted({p for _, p in query.take([c for c in candidates if c.casefold() in query.text])})
+
+    ascending = bool(query.take(ASCENDING))
+    descending = bool(query.take(DESCENDING))
+    numbers = [int(n) for _, n in query.take([str(i) for i in range(1, 100)])]
+
+    if rank_by_games and not metrics and metric(GAMES):
+        metrics = [metric(GAMES)]
+    if query.leftover() or not metrics or len(numbers) > 1 or (ascending and descending):
+        return None
+    intent = {'metrics': metrics[:3], 'entity': entity, 'filters': filters, 'names': names, 'years': years,
+              'n': min(numbers[0] if numbers else MAX_ITEMS, MAX_ITEMS), 'ascending': ascending}
+
+    if trend:
+        if group or numbers or rank_by_games or (len(metrics) > 1 and names):
+            return None
+        return {**intent, 'kind': 'trend'}
+    if group:
+        if len(group) > 1 or numbers or rank_by_games or group[0] == entity:
+            return None
+        if group[0] not in df.columns and not (group[0] == 'Role' and all(r in df.columns for r in ROLES)):
+            return None
+        return {**intent, 'kind': 'group', 'group': group[0]}
+    if names:
+        return None
+    rank_by = games_column if rank_by_games else metrics[0]
+    if rank_by_games and metric(GAMES) is None:
+        return None
+    return {**intent, 'kind': 'top', 'rank_by': rank_by}
+
+
+def _label(column, column_descriptions):
+    description = column_descriptions.get(column, '')
+    name = description.split(' (')[0].split(' =')[0].strip()
+    return f'{name} ({column})' if name else column
+
+
+def _aggregate(df, by, columns):
+    agg = {c: ('sum' if c in SUM_COLUMNS else 'mean') for c in columns}
+    return df.groupby(by, observed=True).agg(agg).reset_index()
+
+
+def _long(data, id_column, metrics, labels):
+    """Dạng dài (id, metric, value) để vẽ một hoặc nhiều chỉ số trên cùng biểu đồ."""
+    long = data.melt(id_vars=id_column, value_vars=metrics, var_name='metric').round({'value': 2})
+    long['metric'] = long['metric'].map(labels)
+    return long
+
+
+def _style(fig, user_input, legend):
+    fig.update_layout(title=user_input, legend_title_text='', showlegend=legend)
+    fig.update_traces(selector=dict(type='bar'), texttemplate='%{y:.2f}', textposition='outside')
+    return fig
+
+
+def build_figure(intent, user_input, df, column_descriptions):
+    """Dựng Plotly Figure cho intent đã phân tích."""
+    for column, value in intent['filters'].items():
+        df = df[df[column] == value]
+    if intent['years']:
+        df = df[df['Year'].isin(intent['years'])]
+    entity, metrics = intent['entity'], intent['metrics']
+    if intent['names']:
+        df = df[df[entity].astype(str).isin(intent['names'])]
+    labels = {c: _label(c, column_descriptions) for c in metrics + [entity, intent.get('group')] if c}
+    labels['value'] = labels[metrics[0]] if len(metrics) == 1 else 'Giá trị'
+
+    if intent['kind'] == 'top':
+        columns = list(dict.fromkeys([intent['rank_by']] + metrics))
+        data = _aggregate(df, entity, columns).dropna(subset=columns)
+        data = data.sort_values(intent['rank_by'], ascending=intent['ascending']).head(intent['n'])
+        data = data.assign(**{entity: data[entity].astype(str)})
+        long = _long(data, entity, metrics, labels)
+        fig = px.bar(long, x=entity, y='value', color='metric', barmode='group', labels=labels,
+                     color_discrete_sequence=PALETTE, category_orders={entity: data[entity].tolist()})
+    elif intent['kind'] == 'trend':
+        time_column = 'Date' if 'Date' in df.columns and intent['entity'] == 'Champion' else 'Year'
+        by = [time_column] + ([entity] if intent['names'] else [])
+        data = _aggregate(df, by, metrics).dropna(subset=metrics)
+        if time_column == 'Date':
+            data['Date'] = pd.to_datetime(data['Date'])
+        data = data.sort_values(by)
+        if intent['names']:
+            data = data.assign(**{entity: data[entity].astype(str)})
+            fig = px.line(data.round({metrics[0]: 2}), x=time_column, y=metrics[0], color=entity, markers=True,
+                          labels=labels, color_discrete_sequence=PALETTE)
+        else:
+            long = _long(data, time_column, metrics, labels)
+            fig = px.line(long, x=time_column, y='value', color='metric', markers=True, labels=labels,
+                          color_discrete_sequence=PALETTE)
+        if time_column == 'Year':
+            fig.update_xaxes(dtick=1)
+    else:
+        group = intent['group']
+        if group == 'Role' and group not in df.columns:
+            # Bộ champion lưu vai trò dưới dạng các cột cờ 0/1
+            df = df.melt(id_vars=metrics, value_vars=ROLES, var_name='Role', value_name='flag')
+            df = df[df['flag'] == 1]
+        data = _aggregate(df, group, metrics).dropna(subset=metrics)
+        data = data.sort_values(metrics[0], ascending=intent['ascending']).head(MAX_ITEMS)
+        data = data.assign(**{group: data[group].astype(str)})
+        long = _long(data, group, metrics, labels)
+        fig = px.bar(long, x=group, y='value', color='metric', barmode='group', labels=labels,
+                     color_discrete_sequence=PALETTE, category_orders={group: data[group].tolist()})
+    legend = len(metrics) > 1 or (intent['kind'] == 'trend' and bool(intent['names']))
+    return _style(fig, user_input, legend)
+
+
+def build_fast_plot(user_input, df, dataset_type, column_descriptions):
+    """(fig, intent) nếu câu hỏi thuộc một dạng quen thuộc, ngược lại None."""
+    if dataset_type not in GAMES_COLUMN:
+        return None
+    intent = parse_intent(user_input, df, dataset_type, column_descriptions)
+    if intent is None:
+        return None
+    return build_figure(intent, user_input, df, column_descriptions), intent
@@ -0,0 +1,257 @@
+"""
+Giảm số điểm của biểu đồ lớn trước khi gửi cho trình duyệt.
+
+Khi tổng số điểm của các trace scatter/line/histogram vượt ngân sách
+(PLOT_POINT_BUDGET, mặc định 2000; 0 để tắt), mỗi trace được chia phần ngân
+sách theo tỉ lệ số điểm của nó rồi:
+  - scatter dạng điểm: lấy mẫu theo lưới, mỗi ô giữ số điểm tỉ lệ với mật độ
+    của ô (ít nhất một điểm, nên điểm ngoại lai không bị mất);
+  - scatter dạng đường: Largest-Triangle-Three-Buckets, giữ hình dạng đường;
+  - histogram: chia bin ngay trên server, gửi các cột đã đếm (trace bar) thay
+    cho toàn bộ giá trị thô.
+Mọi mảng theo từng điểm của trace (customdata, text, marker.size/color...)
+được cắt theo cùng các chỉ số. Biểu đồ gốc không bị sửa.
+"""
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from serialization import EncodedFigure, encode_figure, figure_dict, is_typed_array, typed_array_values
+
+POINT_BUDGET = int(os.environ.get('PLOT_POINT_BUDGET', 2000))
+# Trace nhỏ hơn mức này không bị giảm dù phần ngân sách của nó nhỏ hơn
+MIN_TRACE_POINTS = 50
+# Khóa không phải mảng theo từng điểm dù có thể trùng độ dài
+NON_POINT_KEYS = {'colorscale', 'range', 'tickvals', 'ticktext', 'selectedpoints', 'categoryarray'}
+MAX_BINS = 100
+
+SCATTER_TYPES = {'scatter', 'scattergl'}
+HISTOGRAM_COPY_KEYS = (
+    'name', 'marker', 'opacity', 'legendgroup', 'legendgrouptitle', 'showlegend', 'xaxis', 'yaxis',
+    'hovertemplate', 'alignmentgroup', 'offsetgroup', 'textposition', 'visible', 'uid',
+)
+
+
+def _is_array(value):
+    return isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index))
+
+
+def _decoded(value):
+    """Bản sao của trace với typed array (dạng của to_plotly_json) đổi lại thành mảng numpy."""
+    if is_typed_array(value):
+        return typed_array_values(value)
+    if isinstance(value, dict):
+        return {k: _decoded(v) for k, v in value.items()}
+    return value
+
+
+def _length(trace):
+    for key in ('x', 'y'):
+        if _is_array(trace.get(key)):
+            return len(trace[key])
+    return 0
+
+
+def _numeric(values):
+    """Giá trị dạng số để tính khoảng cách: số giữ nguyên, ngày -> timestamp, chuỗi -> mã thứ tự."""
+    try:
+        return np.asarray(values, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return pd.to_datetime(pd.Series(values)).astype('int64').to_numpy(dtype=float)
+    except (TypeError, ValueError, OverflowError):
+        return pd.factorize(pd.Series(values), use_na_sentinel=True)[0].astype(float)
+
+
+def _take(value, idx, n):
+    """Cắt mọi mảng có độ dài n (kể cả trong dict con như marker) theo idx."""
+    if isinstance(value, dict):
+        return {k: (v if k in NON_POINT_KEYS else _take(v, idx, n)) for k, v in value.items()}
+    if _is_array(value) and len(value) == n:
+        if isinstance(value, (list, tuple)):
+            return [value[i] for i in idx]
+        return np.asarray(value)[idx]
+    return value
+
+
+def _density_sample(x, y, k):
+    """
+    Chọn k chỉ số giữ phân bố mật độ: chia mặt phẳng thành lưới, ô nào cũng giữ ít
+    nhất một điểm, phần còn lại chia theo số điểm của ô; trong ô chọn cách đều.
+    """
+    n = len(x)
+    grid = max(1, int(math.sqrt(k / 4)))
+    cells = np.zeros(n, dtype=np.int64)
+    for axis in (x, y):
+        valid = np.isfinite(axis)
+        lo, hi = (axis[valid].min(), axis[valid].max()) if valid.any() else (0.0, 0.0)
+        span = hi - lo or 1.0
+        # Giá trị thiếu/vô hạn dồn vào ô riêng (chỉ số grid)
+        scaled = np.nan_to_num((axis - lo) / span * grid, nan=grid, posinf=grid, neginf=grid)
+        bins = np.where(valid, np.minimum(scaled.astype(np.int64), grid - 1), grid)
+        cells = cells * (grid + 1) + bins
+    order = np.argsort(cells, kind='stable')
+    _, starts, counts = np.unique(cells[order], return_index=True, return_counts=True)
+    occupied = len(counts)
+    if occupied >= k:
+        # Quá nhiều ô: mỗi ô một điểm, giữ k ô đông nhất
+        starts, counts = starts[np.argsort(-counts, kind='stable')[:k]], np.ones(k, dtype=np.int64)
+        occupied = k
+    extra = (counts - 1) * (k - occupied) // max(1, n - occupied)
+    keep = 1 + extra
+    picks = [order[start + (np.arange(m) * count) // m] for start, count, m in zip(starts, counts, keep)]
+    return np.sort(np.concatenate(picks))
+
+
+def _lttb(x, y, k):
+    """Largest-Triangle-Three-Buckets trên các điểm hợp lệ; trả về chỉ số được giữ."""
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    n = len(valid)
+    if n <= k or k < 3:
+        return valid
+    xv, yv = x[valid], y[valid]
+    # k - 2 bucket giữa các điểm 1..n-2; trung bình của bucket sau (bucket cuối là điểm cuối) tính trước một lần
+    edges = np.linspace(1, n - 1, k - 1).astype(np.int64)
+    sizes = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(xv, edges) / sizes
+    avg_y = np.add.reduceat(yv, edges) / sizes
+    chosen = np.empty(k, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    previous = 0
+    for i in range(k - 2):
+        start, end = edges[i], edges[i + 1]
+        prev_x, prev_y = xv[previous], yv[previous]
+        area = np.abs((prev_x - avg_x[i + 1]) * (yv[start:end] - prev_y)
+                      - (prev_x - xv[start:end]) * (avg_y[i + 1] - prev_y))
+        previous = start + area.argmax()
+        chosen[i + 1] = previous
+    return valid[chosen]
+
+
+def _reduce_scatter(trace, k):
+    n = _length(trace)
+    x = _numeric(trace['x']) if _is_array(trace.get('x')) else np.arange(n, dtype=float)
+    y = _numeric(trace['y']) if _is_array(trace.get('y')) else np.arange(n, dtype=float)
+    mode = trace.get('mode') or ('lines' if n > 20 else 'lines+markers')
+    if 'lines' in mode:
+        idx, method = _lttb(x, y, k), 'lttb'
+    else:
+        idx, method = _density_sample(x, y, k), 'density'
+    return _take(trace, idx, n), method, len(idx)
+
+
+def _histogram_values(trace):
+    """(trục, giá trị) của một histogram đếm đơn giản, None nếu không xử lý được (histfunc khác, có cả x và y)."""
+    if trace.get('histfunc', 'count') != 'count' or trace.get('cumulative', {}).get('enabled'):
+        return None
+    has_x, has_y = _is_array(trace.get('x')), _is_array(trace.get('y'))
+    if has_x == has_y:
+        return None
+    axis = 'x' if has_x else 'y'
+    try:
+        values = np.asarray(trace[axis], dtype=float)
+    except (TypeError, ValueError):
+        return None
+    return axis, values[np.isfinite(values)]
+
+
+def _bin_edges(values, trace, axis):
+    bins = trace.get(f'{axis}bins') or {}
+    nbins = trace.get(f'nbins{axis}')
+    lo, hi = bins.get('start', values.min()), bins.get('end', values.max())
+    if bins.get('size'):
+        edges = np.arange(lo, hi + bins['size'], bins['size'])
+    elif nbins:
+        edges = np.linspace(lo, hi, int(nbins) + 1)
+    else:
+        edges = np.histogram_bin_edges(values, bins='auto', range=(lo, hi))
+    if len(edges) > MAX_BINS + 1:
+        edges = np.linspace(edges[0], edges[-1], MAX_BINS + 1)
+    return edges if len(edges) > 1 else np.array([lo - 0.5, hi + 0.5])
+
+
+def _bin_histograms(traces, indices):
+    """Đổi các trace histogram thành trace bar đã đếm; các trace cùng trục dùng chung bin để cột chồng khớp nhau."""
+    parsed = {i: _histogram_values(traces[i]) for i in indices}
+    groups = {}
+    for i, item in parsed.items():
+        if item is not None and len(item[1]):
+            axis, values = item
+            groups.setdefault((axis, traces[i].get('xaxis'), traces[i].get('yaxis')), []).append(i)
+    result = {}
+    for (axis, _, _), members in groups.items():
+        values = np.concatenate([parsed[i][1] for i in members])
+        edges = _bin_edges(values, traces[members[0]], axis)
+        centers, widths = (edges[:-1] + edges[1:]) / 2, np.diff(edges)
+        for i in members:
+            trace = traces[i]
+            counts = np.histogram(parsed[i][1], bins=edges)[0].astype(float)
+            norm = trace.get('histnorm') or ''
+            total = counts.sum() or 1.0
+            if norm == 'percent':
+                counts = counts / total * 100
+            elif norm == 'probability':
+                counts = counts / total
+            elif norm == 'density':
+                counts = counts / widths
+            elif norm == 'probability density':
+                counts = counts / total / widths
+            bar = {key: trace[key] for key in HISTOGRAM_COPY_KEYS if key in trace}
+            bar.update({'type': 'bar', axis: centers, 'y' if axis == 'x' else 'x': counts, 'width': widths})
+            if axis == 'y':
+                bar['orientation'] = 'h'
+            result[i] = (bar, len(parsed[i][1]), len(centers))
+    return result
+
+
+def reduce_figure(fig, budget=None):
+    """
+    Bản sao (dạng dict của plotly) của biểu đồ với số điểm trong ngân sách.
+
+    Trả về (dict, thông tin) với thông tin None nếu không phải giảm, hoặc
+    {'points': số điểm gốc, 'shown': số điểm còn lại, 'budget': ngân sách,
+     'traces': [{'index', 'type', 'method', 'points', 'shown'}, ...]}.
+    """
+    budget = POINT_BUDGET if budget is None else budget
+    data = figure_dict(fig)
+    traces = [_decoded(trace) for trace in data.get('data') or []]
+    reducible = {}
+    for i, trace in enumerate(traces):
+        kind = trace.get('type', 'scatter')
+        if kind in SCATTER_TYPES or kind == 'histogram':
+            reducible[i] = _length(trace)
+    total = sum(reducible.values())
+    if budget <= 0 or total <= budget:
+        return data, None
+
+    details = []
+    histograms = [i for i in reducible if traces[i].get('type') == 'histogram']
+    for i, (bar, points, shown) in _bin_histograms(traces, histograms).items():
+        traces[i] = bar
+        details.append({'index': i, 'type': 'histogram', 'method': 'binned', 'points': points, 'shown': shown})
+    for i, n in reducible.items():
+        if i in histograms:
+            continue
+        share = max(MIN_TRACE_POINTS, budget * n // total)
+        if n <= share:
+            continue
+        traces[i], method, shown = _reduce_scatter(traces[i], share)
+        details.append({'index': i, 'type': traces[i].get('type', 'scatter'), 'method': method,
+                        'points': n, 'shown': shown})
+    if not details:
+        return data, None
+    details.sort(key=lambda item: item['index'])
+    reduced = {i['index'] for i in details}
+    shown = sum(item['shown'] for item in details) + sum(n for i, n in reducible.items() if i not in reduced)
+    return {**data, 'data': traces}, {'points': total, 'shown': shown, 'budget': budget, 'traces': details}
+
+
+def prepare_figure(fig, budget=None):
+    """Giảm điểm rồi mã hóa JSON; EncodedFigure (đã làm ở worker của sandbox) được giữ nguyên."""
+    if isinstance(fig, EncodedFigure):
+        return fig
+    data, reduction = reduce_figure(fig, budget)
+    return EncodedFigure(encode_figure(data), reduction)
@@ -0,0 +1,272 @@
+"""
+Hàng đợi job cho việc tạo biểu đồ, chạy ngoài luồng xử lý request của Flask.
+
+Mỗi yêu cầu vẽ là một Job chạy trong pool thread có giới hạn; số lời gọi
+DeepSeek đồng thời bị chặn bởi một semaphore riêng. Mỗi giai đoạn (chờ lượt gọi
+LLM, gọi LLM, thực thi code, chuyển sang JSON) có thời hạn riêng, và job có thể
+bị hủy bất cứ lúc nào. Code sinh ra đang chạy quá hạn hoặc bị hủy thì được ngắt
+bằng một exception bất đồng bộ ném vào thread của nó.
+
+Mỗi job ghi lại các sự kiện (chuyển giai đoạn, đã gửi prompt, token đầu tiên,
+code sẵn sàng, kết thúc) kèm thời điểm; app.py đẩy chúng cho trình duyệt qua
+server-sent events.
+
+Cấu hình qua biến môi trường:
+    JOB_WORKERS         số thread xử lý job (mặc định 8)
+    JOB_QUEUE_SIZE      số job tối đa đang chờ/chạy, vượt thì từ chối (mặc định 64)
+    LLM_CONCURRENCY     số lời gọi DeepSeek đồng thời tối đa (mặc định 4)
+    LLM_QUEUE_TIMEOUT   thời gian chờ tối đa để tới lượt gọi DeepSeek, giây (mặc định 30)
+    LLM_TIMEOUT         thời hạn một lời gọi DeepSeek, giây (mặc định 60)
+    EXEC_TIMEOUT        thời hạn thực thi code sinh ra, giây (mặc định 20)
+    JOB_TIMEOUT         thời hạn của cả job, giây (mặc định 120)
+    JOB_RESULT_TTL      thời gian giữ kết quả sau khi xong, giây (mặc định 600)
+"""
+import ctypes
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import JOBS_FINISHED, STAGE_SECONDS, span
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+STAGE_TIMEOUTS = {
+    'llm_queue': float(os.environ.get('LLM_QUEUE_TIMEOUT', 30)),
+    'llm': float(os.environ.get('LLM_TIMEOUT', 60)),
+    'exec': float(os.environ.get('EXEC_TIMEOUT', 20)),
+}
+
+
+# Kế thừa BaseException để code sinh ra có `except Exception` cũng không nuốt mất khi bị ngắt
+class JobCancelled(BaseException):
+    pass
+
+
+class JobTimeout(BaseException):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """Một yêu cầu vẽ biểu đồ; hàm xử lý gọi `stage`/`check` để job có thể bị hủy hoặc hết hạn."""
+
+    def __init__(self, manager, fn, args, timeout):
+        self.id = uuid.uuid4().hex
+        self.manager = manager
+        self.fn = fn
+        self.args = args
+        self.status = QUEUED
+        self.stage_name = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = self.finished = None
+        self.deadline = self.created + timeout
+        self.stage_deadline = None
+        self.thread_id = None
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._callbacks = []
+        self.events = [self._event_record(0, QUEUED, {})]
+
+    # ---------------------------------------------------------------- dùng bởi hàm xử lý
+
+    def timeout(self, stage):
+        """Thời gian còn lại cho giai đoạn `stage`, không vượt quá hạn của cả job."""
+        return max(0.0, min(STAGE_TIMEOUTS.get(stage, float('inf')), self.deadline - time.time()))
+
+    def stage(self, name):
+        """Chuyển sang giai đoạn mới, sau khi kiểm tra job chưa bị hủy hay hết hạn."""
+        self.check()
+        self.stage_name = name
+        self.stage_deadline = time.time() + self.timeout(name)
+        self.event(name)
+
+    def event(self, name, **data):
+        """Ghi một sự kiện tiến độ (ví dụ 'first_token', 'code_ready') cho những ai đang theo dõi job."""
+        with self._lock:
+            # Job đã kết thúc (bị hủy, quá hạn) mà thread xử lý vẫn chạy nốt: sự kiện kết thúc là sự kiện cuối
+            if self._done.is_set():
+                return
+            self.events.append(self._event_record(len(self.events), name, data))
+            self._changed.notify_all()
+
+    def check(self):
+        if self._cancelled.is_set():
+            raise JobCancelled('Job đã bị hủy')
+        now = time.time()
+        if now > self.deadline or (self.stage_deadline is not None and now > self.stage_deadline):
+            raise JobTimeout(f'Quá thời hạn ở giai đoạn {self.stage_name}')
+
+    @contextmanager
+    def llm_slot(self):
+        """Chờ tới lượt gọi DeepSeek (semaphore dùng chung), vẫn phản hồi việc hủy trong lúc chờ."""
+        self.stage('llm_queue')
+        with span('llm_queue'):
+            while not self.manager.llm_semaphore.acquire(timeout=0.1):
+                self.check()
+        try:
+            yield
+        finally:
+            self.manager.llm_semaphore.release()
+
+    @contextmanager
+    def interruptible(self):
+        """Vùng chạy code sinh ra: hết hạn hoặc bị hủy thì watchdog ném exception vào thread này."""
+        self.thread_id = threading.get_ident()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.thread_id = None
+
+    # ---------------------------------------------------------------- dùng bởi manager/app
+
+    def cancel(self):
+        """Hủy job; kết quả về sau của thread xử lý (nếu còn chạy) bị bỏ qua."""
+        self._cancelled.set()
+        self.manager.interrupt(self)
+        self._finish(CANCELLED, error='Job đã bị hủy')
+        return self.status
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, fn):
+        """Gọi fn(job) khi job kết thúc (gọi ngay nếu job đã kết thúc), từ thread kết thúc job."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def events_after(self, index, timeout=None):
+        """
+        (các sự kiện từ vị trí `index`, job đã kết thúc chưa); chờ tối đa `timeout`
+        giây nếu chưa có sự kiện mới và job chưa kết thúc.
+        """
+        with self._lock:
+            if len(self.events) <= index and not self._done.is_set():
+                self._changed.wait(timeout)
+            return self.events[index:], self._done.is_set()
+
+    def _event_record(self, index, name, data):
+        return {'id': index, 'event': name, 'elapsed': round(time.time() - self.created, 3), **data}
+
+    def _run(self):
+        if self._done.is_set():
+            return
+        self.status, self.started = RUNNING, time.time()
+        STAGE_SECONDS.observe(self.started - self.created, stage='job_queue', outcome='ok')
+        try:
+            self.check()
+            result = self.fn(*self.args, job=self)
+            self.check()
+            self._finish(DONE, result=result)
+        except JobCancelled as e:
+            self._finish(CANCELLED, error=str(e))
+        except JobTimeout as e:
+            self._finish(FAILED, error=str(e))
+        except Exception as e:
+            self._finish(FAILED, error=str(e))
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.thread_id = None
+            self.status, self.result, self.error = status, result, error
+            self.finished = time.time()
+            self.events.append(self._event_record(len(self.events), status, {'error': error} if error else {}))
+            self._done.set()
+            self._changed.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        JOBS_FINISHED.inc(status=status)
+        STAGE_SECONDS.observe(self.finished - self.created, stage='total', outcome='ok' if status == DONE else status)
+        for fn in callbacks:
+            fn(self)
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': self.status, 'stage': self.stage_name,
+                'elapsed': round((self.finished or time.time()) - self.created, 3)}
+        if self.status == DONE:
+            data.update(self.result)
+        elif self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    def __init__(self, max_workers=None, queue_size=None, llm_concurrency=None, job_timeout=None, result_ttl=None):
+        env = os.environ.get
+        self.max_workers = max_workers or int(env('JOB_WORKERS', 8))
+        self.queue_size = queue_size or int(env('JOB_QUEUE_SIZE', 64))
+        self.job_timeout = job_timeout or float(env('JOB_TIMEOUT', 120))
+        self.result_ttl = result_ttl or float(env('JOB_RESULT_TTL', 600))
+        self.llm_semaphore = threading.BoundedSemaphore(llm_concurrency or int(env('LLM_CONCURRENCY', 4)))
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='plot-job')
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._watchdog = threading.Thread(target=self._watch, name='plot-job-watchdog', daemon=True)
+        self._watchdog.start()
+
+    def submit(self, fn, *args):
+        """Đưa fn(*args, job=job) vào hàng đợi; QueueFull nếu đã quá nhiều job chưa xong."""
+        with self._lock:
+            self._expire()
+            pending = sum(1 for job in self.jobs.values() if job.status not in FINISHED)
+            if pending >= self.queue_size:
+                raise QueueFull(f'Đang có {pending} yêu cầu chờ xử lý, vui lòng thử lại sau')
+            job = Job(self, fn, args, self.job_timeout)
+            self.jobs[job.id] = job
+        self.executor.submit(job._run)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def interrupt(self, job):
+        """Ném JobCancelled/JobTimeout vào thread đang chạy code sinh ra của job."""
+        with job._lock:
+            if job.thread_id is None:
+                return
+            exc = JobCancelled if job._cancelled.is_set() else JobTimeout
+            ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(job.thread_id), ctypes.py_object(exc))
+
+    def _watch(self):
+        """Job quá hạn được báo lỗi ngay cho client, code sinh ra đang chạy thì bị ngắt."""
+        while True:
+            time.sleep(0.2)
+            now = time.time()
+            with self._lock:
+                running = [job for job in self.jobs.values() if job.status == RUNNING]
+            for job in running:
+                if now > job.deadline or (job.stage_deadline is not None and now > job.stage_deadline):
+                    self.interrupt(job)
+                    job._finish(FAILED, error=f'Quá thời hạn ở giai đoạn {job.stage_name}')
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [i for i, job in self.jobs.items() if job.finished and now - job.finished > self.result_ttl]:
+            del self.jobs[job_id]
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
@@ -0,0 +1,190 @@
+"""
+Cache hai tầng cho code Plotly do DeepSeek sinh ra.
+
+Khóa gồm prompt đã chuẩn hóa, loại dữ liệu, dấu vân tay lược đồ cột của
+DataFrame, model và temperature. Tầng 1 là LRU trong tiến trình; tầng 2 là
+SQLite trên đĩa (dùng chung giữa các worker và giữa các lần khởi động), có TTL
+và giới hạn dung lượng: vượt giới hạn thì xóa các mục lâu không dùng nhất.
+
+Cấu hình qua biến môi trường:
+    LLM_CACHE_PATH        file SQLite (mặc định cache/llm_cache.sqlite3)
+    LLM_CACHE_TTL         thời gian sống của một mục, giây (mặc định 7 ngày)
+    LLM_CACHE_MAX_BYTES   dung lượng tối đa của code lưu trên đĩa (mặc định 50 MB)
+    LLM_CACHE_MEMORY_SIZE số mục tối đa trong LRU (mặc định 256)
+    LLM_CACHE_DISABLED    đặt 1 để tắt cache
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(ROOT, 'cache', 'llm_cache.sqlite3')
+
+HIT = 'hit'
+MISS = 'miss'
+TIER_MEMORY = 'memory'
+TIER_DISK = 'disk'
+
+
+def normalize_prompt(prompt):
+    """
+    Chuẩn hóa Unicode và bỏ khác biệt về khoảng trắng. Giữ nguyên chữ hoa/thường:
+    tiêu đề biểu đồ lấy đúng câu người dùng gõ.
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', prompt)).strip()
+
+
+def schema_fingerprint(df):
+    """Dấu vân tay của tên và kiểu các cột: dữ liệu đổi lược đồ thì code cũ không còn dùng được."""
+    schema = [(str(column), str(dtype)) for column, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(prompt, dataset_type, df, model, temperature):
+    parts = [normalize_prompt(prompt), dataset_type, schema_fingerprint(df), model, float(temperature)]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class MemoryCache:
+    """LRU có TTL, an toàn giữa các thread."""
+
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires=None):
+        with self._lock:
+            self._items[key] = (value, expires)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class DiskCache:
+    """Bảng SQLite (key, value, hạn dùng, lần dùng cuối, kích thước), mỗi thao tác mở một kết nối."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                ' key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL,'
+                ' accessed REAL NOT NULL, size INTEGER NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute('SELECT value, expires FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            value, expires = row
+            if expires is not None and expires < now:
+                conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+                return None
+            conn.execute('UPDATE entries SET accessed = ? WHERE key = ?', (now, key))
+            return value, expires
+
+    def set(self, key, value, expires=None):
+        size = len(value.encode('utf-8'))
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                         (key, value, expires, time.time(), size))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?', (time.time(),))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Xóa các mục lâu không dùng nhất cho đến khi về dưới giới hạn
+        for key, size in conn.execute('SELECT key, size FROM entries ORDER BY accessed').fetchall():
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM entries')
+
+
+class ResponseCache:
+    """LRU trong tiến trình phía trước kho SQLite; get trả về (value, tier) hoặc None."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=7 * 24 * 3600, max_bytes=50 * 1024 * 1024, memory_size=256):
+        self.ttl = ttl
+        self.memory = MemoryCache(memory_size)
+        self.disk = DiskCache(path, max_bytes)
+
+    @classmethod
+    def from_env(cls):
+        if os.environ.get('LLM_CACHE_DISABLED') == '1':
+            return None
+        return cls(path=os.environ.get('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+                   ttl=float(os.environ.get('LLM_CACHE_TTL', 7 * 24 * 3600)),
+                   max_bytes=int(os.environ.get('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024)),
+                   memory_size=int(os.environ.get('LLM_CACHE_MEMORY_SIZE', 256)))
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            return value, TIER_MEMORY
+        found = self.disk.get(key)
+        if found is None:
+            return None
+        value, expires = found
+        self.memory.set(key, value, expires)
+        return value, TIER_DISK
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        self.memory.set(key, value, expires)
+        self.disk.set(key, value, expires)
+
+    def clear(self):
+        self.memory.clear()
+        self.disk.clear()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Cache dùng chung của tiến trình, tạo khi dùng lần đầu theo biến môi trường."""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache.from_env() or False
+    return _default_cache or None
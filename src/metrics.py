@@ -0,0 +1,250 @@
+"""
+Số đo hiệu năng của đường vẽ biểu đồ, xuất ở /metrics theo định dạng văn bản
+của Prometheus (text exposition 0.0.4, không cần thư viện prometheus_client).
+
+- span(stage): đo thời gian một giai đoạn (fast_path, prompt, cache, llm_queue,
+  llm, exec, serialize, encode, total) vào histogram lol_plot_stage_seconds và
+  ghi một dòng log DEBUG dạng key=value.
+- Các counter/histogram khác: cache LLM trúng/trượt, token DeepSeek, lời gọi
+  DeepSeek theo kết quả, code sinh ra chạy lỗi, kích thước phản hồi, job theo
+  trạng thái kết thúc.
+
+Số đo nằm trong bộ nhớ của từng tiến trình: chạy nhiều worker (gunicorn -w N)
+thì Prometheus cần scrape từng worker.
+
+Log dùng module logging; mức log đặt bằng LOG_LEVEL (mặc định INFO). Prompt
+đầy đủ và code sinh ra chỉ được ghi ở mức DEBUG.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Giây: từ vài mili giây (fast path, encode) tới cả phút (lời gọi DeepSeek)
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+BYTES_BUCKETS = (1e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+log = logging.getLogger(__name__)
+
+
+def configure_logging(level=None):
+    """Log một dòng cho mỗi bản ghi: thời điểm, mức, module và thông điệp key=value."""
+    logging.basicConfig(level=(level or os.environ.get('LOG_LEVEL', 'INFO')).upper(),
+                        format='%(asctime)s %(levelname)s %(name)s %(message)s')
+
+
+def kv(**fields):
+    """Các trường dạng `key=value` cho thông điệp log (giá trị có khoảng trắng được đặt trong ngoặc kép)."""
+    parts = []
+    for key, value in fields.items():
+        if isinstance(value, float):
+            value = f'{value:.4g}'
+        value = str(value)
+        parts.append(f'{key}="{value}"' if not value or ' ' in value or '"' in value else f'{key}={value}')
+    return ' '.join(parts)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} cần các nhãn {self.labelnames}, nhận {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self, items):
+        return [f'{self.name}{_labels(self.labelnames, key)} {_number(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self, items):
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _labels(self.labelnames, key, [('le', _number(bound))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Giá trị đọc lúc scrape: fn() trả về số, hoặc dict {tuple giá trị nhãn: số}."""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def render(self):
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+                     for key, value in sorted(values.items()))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self.metrics:
+                raise ValueError(f'Số đo {metric.name} đã được đăng ký')
+            self.metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name):
+        with self._lock:
+            self.metrics.pop(name, None)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                log.exception('metric_render_failed %s', kv(metric=metric.name))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name, documentation, labelnames=()):
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name, documentation, fn, labelnames=()):
+    """Đăng ký (hoặc thay) một gauge tính lúc scrape."""
+    REGISTRY.unregister(name)
+    return REGISTRY.register(Gauge(name, documentation, fn, labelnames))
+
+
+def render():
+    return REGISTRY.render()
+
+
+STAGE_SECONDS = histogram('lol_plot_stage_seconds', 'Thời gian từng giai đoạn tạo biểu đồ',
+                          ['stage', 'outcome'])
+CACHE_REQUESTS = counter('lol_llm_cache_requests_total', 'Tra cứu cache code LLM theo kết quả (hit/miss)',
+                         ['result'])
+LLM_REQUESTS = counter('lol_llm_requests_total',
+                       'Lời gọi DeepSeek theo kết quả (ok, error, retry, rejected, coalesced)', ['outcome'])
+LLM_TOKENS = counter('lol_llm_tokens_total',
+                     'Token DeepSeek báo về (prompt, completion, prompt_cache_hit)', ['kind'])
+EXEC_FAILURES = counter('lol_exec_failures_total', 'Code sinh ra chạy lỗi, theo loại lỗi', ['reason'])
+PLOTS = counter('lol_plots_total', 'Biểu đồ tạo thành công theo nguồn (fast_path, llm)', ['source'])
+FIGURE_BYTES = histogram('lol_figure_json_bytes', 'Kích thước JSON của biểu đồ (chưa nén)', buckets=BYTES_BUCKETS)
+RESPONSE_BYTES = histogram('lol_response_bytes', 'Kích thước body phản hồi chứa biểu đồ, sau khi nén',
+                           ['encoding'], buckets=BYTES_BUCKETS)
+JOBS_FINISHED = counter('lol_plot_jobs_total', 'Job vẽ biểu đồ đã kết thúc theo trạng thái', ['status'])
+FIGURE_CACHE_REQUESTS = counter('lol_figure_cache_requests_total',
+                                'Tra cứu cache biểu đồ của batch/dashboard theo kết quả (hit/miss)', ['result'])
+
+
+@contextmanager
+def span(stage, **fields):
+    """Đo thời gian khối lệnh vào lol_plot_stage_seconds{stage, outcome} và ghi log DEBUG."""
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except BaseException:
+        outcome = 'error'
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=stage, outcome=outcome)
+        log.debug('span %s', kv(stage=stage, seconds=seconds, outcome=outcome, **fields))
+
+
+def record_usage(usage):
+    """Cộng token từ trường `usage` của DeepSeek vào lol_llm_tokens_total."""
+    if not usage:
+        return
+    for kind, field in (('prompt', 'prompt_tokens'), ('completion', 'completion_tokens'),
+                        ('prompt_cache_hit', 'prompt_cache_hit_tokens')):
+        if usage.get(field):
+            LLM_TOKENS.inc(usage[field], kind=kind)
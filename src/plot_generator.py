@@ -1,236 +1,276 @@
+import logging
 import os
-import requests
-from utils import clean_the_response
+from contextlib import nullcontext
+from utils import clean_the_response, code_block_watcher
+from code_check import compile_code, normalize_code
+from llm_cache import HIT, MISS, cache_key, default_cache
+from fast_path import build_fast_plot
+from aggregates import build_aggregates
+from prompt_compiler import SYSTEM_ROLE, compile_prompt
+from jobs import STAGE_TIMEOUTS, JobTimeout
+from metrics import CACHE_REQUESTS, EXEC_FAILURES, PLOTS, kv, span
+from deepseek_client import default_client
 from dotenv import load_dotenv
 import pandas as pd
 import plotly.express as px
 
+# Model và địa chỉ API lấy từ biến môi trường (DEEPSEEK_MODEL, DEEPSEEK_BASE_URL), xem deepseek_client.py
+DEFAULT_TEMPERATURE = 0.1
 
-def call_deepseek_api(prompt, api_key, model="deepseek-chat", temperature=0.1):
-    """Gọi DeepSeek API với xử lý lỗi phù hợp và trả về nội dung kết quả."""
-    url = "https://api.deepseek.com/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": "You are an expert data visualization assistant that generates precise Visualization Query Language (VQL) and Plotly code."},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": temperature,
-        "max_tokens": 2000
-    }
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code != 200:
-        raise Exception(f"DeepSeek API error: {response.status_code} - {response.text}")
-    result = response.json()
-    return result["choices"][0]["message"]["content"]
+log = logging.getLogger(__name__)
 
-def create_plot(user_input, df, dataset_type, deepseek_api_key=None):
+# Định nghĩa mô tả các cột cho dataset champion
+CHAMPION_COLUMN_DESCRIPTIONS = {
+    'Champion': 'Tên tướng (VARCHAR, ví dụ: Ryze, Camille)',
+    'Date': 'Ngày xảy ra giải đấu (DATETIME, ví dụ: 2018-03-19)',
+    'Season': 'Mùa giải (VARCHAR, ví dụ: Spring, Summer)',
+    'Event_Type': 'Loại sự kiện (VARCHAR, có thể là Promotion, Season, Playoffs)',
+    'G': 'Số trận mà tướng xuất hiện (bao gồm cả khi được chọn hoặc bị cấm) (INT)',
+    'PB': 'Tỷ lệ chọn/cấm (%) = (Số trận tướng xuất hiện / Tổng số trận trong mùa) * 100 (FLOAT)',
+    'B': 'Số trận tướng bị cấm (Ban) (INT)',
+    'GP': 'Số trận tướng được chơi (Games Played) (INT)',
+    'By': 'Số người chơi đã sử dụng tướng này (INT)',
+    'W': 'Số trận thắng của tướng (INT)',
+    'L': 'Số trận thua của tướng (INT)',
+    'WR': 'Tỷ lệ thắng (%) = (W / GP) * 100 (FLOAT)',
+    'K': 'Số mạng hạ gục trung bình (Kills) (FLOAT)',
+    'D': 'Số lần bị hạ gục trung bình (Deaths) (FLOAT)',
+    'A': 'Số lần hỗ trợ trung bình (Assists) (FLOAT)',
+    'KDA': 'Tỷ lệ KDA = (K + A) / D (FLOAT)',
+    'CS': 'Số lính tiêu diệt trung bình (Creep Score) (FLOAT)',
+    'CS/M': 'Số lính tiêu diệt mỗi phút (Creep Score per Minute) (FLOAT)',
+    'G.1': 'Số vàng kiếm được trung bình (Gold) (FLOAT)',
+    'G/M': 'Số vàng kiếm được mỗi phút (Gold per Minute) (FLOAT)',
+    'KPAR': 'Tỷ lệ tham gia hạ gục (%) = [(K + A) / Tổng số hạ gục của đội] * 100 (FLOAT)',
+    'KS': 'Tỷ lệ đóng góp hạ gục (%) = (K / Tổng số hạ gục của đội) * 100 (FLOAT)',
+    'GS': 'Tỷ lệ đóng góp vàng (%) = (G / Tổng số vàng của đội) * 100 (FLOAT)',
+    'Mid Laner': 'Tướng được chơi ở vị trí đường giữa (BOOLEAN, 1 = Có, 0 = Không)',
+    'Top Laner': 'Tướng được chơi ở vị trí đường trên (BOOLEAN, 1 = Có, 0 = Không)',
+    'Bot Laner': 'Tướng được chơi ở vị trí xạ thủ (BOOLEAN, 1 = Có, 0 = Không)',
+    'Jungler': 'Tướng được chơi ở vị trí đi rừng (BOOLEAN, 1 = Có, 0 = Không)',
+    'Support': 'Tướng được chơi ở vị trí hỗ trợ (BOOLEAN, 1 = Có, 0 = Không)',
+    'total_games': 'Tổng số trận trong mùa giải (INT)',
+    '%B': 'Tỷ lệ cấm của tướng (%) = (B / total_games) * 100 (FLOAT)',
+    '%P': 'Tỷ lệ chọn của tướng (%) = (GP / total_games) * 100 (FLOAT)'
+}
+
+# Định nghĩa mô tả các cột cho dataset player
+PLAYER_COLUMN_DESCRIPTIONS = {
+    'Year': 'Năm diễn ra giải đấu (INT, ví dụ: 2018)',
+    'Season': 'Tên mùa giải (VARCHAR, ví dụ: Spring, Season)',
+    'Event_Type': 'Tên giai đoạn mùa giải (VARCHAR, ví dụ: Playoffs, Season, Promotion)',
+    'Team': 'Tên đội của người chơi (VARCHAR, ví dụ: Cherry Esports)',
+    'Player': 'Tên người chơi (VARCHAR)',
+    'G': 'Số trận đã chơi (Games) (INT)',
+    'W': 'Số trận thắng (Wins) (INT)',
+    'L': 'Số trận thua (Losses) (INT)',
+    'WR': 'Tỷ lệ thắng (%) = (W / G) * 100 (FLOAT)',
+    'K': 'Số mạng hạ gục trung bình mỗi trận (Kills) (FLOAT)',
+    'D': 'Số lần bị hạ gục trung bình mỗi trận (Deaths) (FLOAT)',
+    'A': 'Số lần hỗ trợ trung bình mỗi trận (Assists) (FLOAT)',
+    'KDA': 'Tỷ lệ KDA = (K + A) / D (FLOAT)',
+    'CS': 'Số lính tiêu diệt trung bình mỗi trận (Creep Score) (FLOAT)',
+    'CS/M': 'Số lính tiêu diệt mỗi phút (Creep Score per Minute) (FLOAT)',
+    'G.1': 'Số vàng kiếm được trung bình mỗi trận (Gold) (FLOAT)',
+    'G/M': 'Số vàng kiếm được mỗi phút (Gold per Minute) (FLOAT)',
+    'KPAR': 'Tỷ lệ tham gia hạ gục (%) = [(K + A) / Tổng số hạ gục của đội] * 100 (FLOAT)',
+    'KS': 'Tỷ lệ đóng góp hạ gục (%) = (K / Tổng số hạ gục của đội) * 100 (FLOAT)',
+    'GS': 'Tỷ lệ đóng góp vàng (%) = (G.1 / Tổng số vàng của đội) * 100 (FLOAT)',
+    'CP': 'Số tướng khác nhau đã chơi (Champions Played) (INT)',
+    'Champion_1': 'Tướng được chơi thường xuyên nhiều nhất (VARCHAR)',
+    'Champion_2': 'Tướng được chơi thường xuyên nhiều thứ hai (VARCHAR)',
+    'Champion_3': 'Tướng được chơi thường xuyên nhiều thứ ba (VARCHAR)',
+    'Role': 'Vai trò của người chơi (VARCHAR, ví dụ: Mid Laner, Bot Laner, Support, Jungler)',
+    'total_games': 'Tổng số trận trong mùa giải (INT)',
+    'max_G/M': 'Số vàng mỗi phút tối đa trong mùa giải (FLOAT)',
+    'max_CS/M': 'Số lính tiêu diệt mỗi phút tối đa trong mùa giải (FLOAT)',
+    'max_KDA': 'Tỷ lệ KDA tối đa trong mùa giải (FLOAT)',
+    'max_KPAR': 'Tỷ lệ tham gia hạ gục tối đa trong mùa giải (FLOAT)'
+}
+
+# Định nghĩa mô tả các cột cho dataset combined (bảng nối người chơi - tướng, xem combined.py)
+COMBINED_COLUMN_DESCRIPTIONS = {
+    'Year': 'Năm diễn ra giải đấu (INT, ví dụ: 2018)',
+    'Tournamment': 'Giải đấu trong năm (VARCHAR, ví dụ: Spring_Season, Summer_Playoffs)',
+    'Season': 'Mùa giải (VARCHAR, ví dụ: Spring, Summer)',
+    'Event_Type': 'Loại sự kiện (VARCHAR, có thể là Promotion, Season, Playoffs)',
+    'Team': 'Tên đội của người chơi (VARCHAR, ví dụ: Cherry Esports)',
+    'Player': 'Tên người chơi (VARCHAR)',
+    'Role': 'Vai trò của người chơi (VARCHAR, ví dụ: Mid Laner, Bot Laner, Support, Jungler)',
+    'Champion': 'Tướng mà người chơi chơi nhiều trong giải này (VARCHAR)',
+    'Pick_Rank': 'Thứ hạng của tướng trong các tướng người chơi chơi nhiều nhất giải (INT, 1 = nhiều nhất, tối đa 3)',
+    'Player_G': 'Số trận người chơi đã chơi trong giải (INT)',
+    'Player_W': 'Số trận thắng của người chơi (INT)',
+    'Player_L': 'Số trận thua của người chơi (INT)',
+    'Player_WR': 'Tỷ lệ thắng của người chơi (%) (FLOAT)',
+    'Player_K': 'Số mạng hạ gục trung bình mỗi trận của người chơi (FLOAT)',
+    'Player_D': 'Số lần bị hạ gục trung bình mỗi trận của người chơi (FLOAT)',
+    'Player_A': 'Số lần hỗ trợ trung bình mỗi trận của người chơi (FLOAT)',
+    'Player_KDA': 'Tỷ lệ KDA của người chơi (FLOAT)',
+    'Player_CS/M': 'Số lính tiêu diệt mỗi phút của người chơi (FLOAT)',
+    'Player_G/M': 'Số vàng kiếm được mỗi phút của người chơi (FLOAT)',
+    'Player_KPAR': 'Tỷ lệ tham gia hạ gục của người chơi (%) (FLOAT)',
+    'Player_CP': 'Số tướng khác nhau người chơi đã chơi trong giải (INT)',
+    'Champion_GP': 'Số trận tướng được chơi trong giải (mọi người chơi) (INT)',
+    'Champion_PB': 'Tỷ lệ chọn/cấm của tướng trong giải (%) (FLOAT)',
+    'Champion_%B': 'Tỷ lệ cấm của tướng trong giải (%) (FLOAT)',
+    'Champion_%P': 'Tỷ lệ chọn của tướng trong giải (%) (FLOAT)',
+    'Champion_W': 'Số trận thắng của tướng trong giải (mọi người chơi) (INT)',
+    'Champion_L': 'Số trận thua của tướng trong giải (mọi người chơi) (INT)',
+    'Champion_WR': 'Tỷ lệ thắng của tướng trong giải (mọi người chơi) (%) (FLOAT)',
+    'Champion_KDA': 'Tỷ lệ KDA của tướng trong giải (FLOAT)',
+    'Champion_CS/M': 'Số lính tiêu diệt mỗi phút của tướng trong giải (FLOAT)',
+    'Champion_G/M': 'Số vàng kiếm được mỗi phút của tướng trong giải (FLOAT)',
+}
+
+COLUMN_DESCRIPTIONS = {
+    'champion': CHAMPION_COLUMN_DESCRIPTIONS,
+    'player': PLAYER_COLUMN_DESCRIPTIONS,
+    'combined': COMBINED_COLUMN_DESCRIPTIONS,
+}
+
+
+def call_deepseek_api(prompt, api_key, model=None, temperature=DEFAULT_TEMPERATURE, timeout=None,
+                      system=SYSTEM_ROLE, stream=None, on_event=None, check=None):
+    """
+    Gọi DeepSeek API qua client dùng chung (pool kết nối, thử lại, circuit breaker, xem deepseek_client.py)
+    và trả về nội dung kết quả.
+    `system` là system message (tiền tố cố định của prompt_compiler), `prompt` là tin nhắn của người dùng.
+
+    model: mặc định theo DEEPSEEK_MODEL;
+    timeout: (kết nối, đọc) tính bằng giây, mặc định theo DEEPSEEK_CONNECT_TIMEOUT/DEEPSEEK_READ_TIMEOUT;
+    stream: stream câu trả lời (mặc định theo DEEPSEEK_STREAM) và trả về ngay khi khối code đóng;
+    on_event: hàm nhận tên sự kiện tiến độ ('prompt_sent', 'first_token');
+    check: hàm gọi sau mỗi chunk (ví dụ Job.check), ném exception để hủy giữa chừng.
+    """
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": prompt}
+    ]
+    return default_client().chat(messages, api_key, model=model, temperature=temperature, timeout=timeout,
+                                 stream=stream, stop=code_block_watcher(), on_event=on_event, check=check)
+
+def create_plot(user_input, df, dataset_type, deepseek_api_key=None, job=None, sandbox=None, aggregates=None):
     """
     Tạo biểu đồ dựa trên yêu cầu của người dùng với DataFrame đã được load.
     Hàm này sẽ gọi DeepSeek API để nhận về mã code Plotly,
     mã code trả về phải tạo đối tượng Plotly Figure được gán vào biến 'fig' mà không thực hiện lệnh hiển thị.
+    Code đã chạy thành công được lưu vào cache (llm_cache.py), câu hỏi lặp lại không gọi API nữa.
+    Các câu hỏi dạng quen thuộc (top N, xu hướng, theo nhóm) được dựng trực tiếp bởi fast_path.py.
     
     Parameters:
       - user_input: Yêu cầu trực quan hóa của người dùng (string)
       - df: DataFrame chứa dữ liệu (pandas.DataFrame)
-      - dataset_type: Loại dữ liệu ("champion" hoặc "player")
+      - dataset_type: Loại dữ liệu ("champion", "player" hoặc "combined": bảng nối người chơi - tướng)
       - deepseek_api_key: (tuỳ chọn) API key của DeepSeek, nếu không, sẽ lấy từ biến môi trường DEEPSEEK_API_KEY.
+      - job: (tuỳ chọn) jobs.Job đang chạy hàm này: giới hạn số lời gọi API đồng thời,
+        thời hạn từng giai đoạn và cho phép hủy giữa chừng.
+      - sandbox: (tuỳ chọn) sandbox.Sandbox để chạy code sinh ra trong tiến trình worker
+        (giới hạn CPU/bộ nhớ, bị kill khi quá hạn); không có thì chạy ngay trong tiến trình này.
+      - aggregates: (tuỳ chọn) dict bảng tổng hợp của df (aggregates.AggregateStore.get), đưa vào code
+        dưới tên `agg`; không có thì tính từ df khi cần chạy code.
     Returns:
       - fig: Đối tượng Plotly Figure được tạo ra từ mã code trả về.
+      - info: dict {'source': 'fast_path' | 'llm', 'intent': intent của fast path hoặc None,
+                    'cache': 'hit' | 'miss' | None, 'cache_tier': 'memory' | 'disk' | None,
+                    'prompt_tokens': số token ước lượng của prompt (prompt_compiler.CompiledPrompt.report) hoặc None}
     """
-    # Định nghĩa mô tả các cột cho dataset champion
-    champion_column_descriptions = {
-        'Champion': 'Tên tướng (VARCHAR, ví dụ: Ryze, Camille)',
-        'Date': 'Ngày xảy ra giải đấu (DATETIME, ví dụ: 2018-03-19)',
-        'Season': 'Mùa giải (VARCHAR, ví dụ: Spring, Summer)',
-        'Event_Type': 'Loại sự kiện (VARCHAR, có thể là Promotion, Season, Playoffs)',
-        'G': 'Số trận mà tướng xuất hiện (bao gồm cả khi được chọn hoặc bị cấm) (INT)',
-        'PB': 'Tỷ lệ chọn/cấm (%) = (Số trận tướng xuất hiện / Tổng số trận trong mùa) * 100 (FLOAT)',
-        'B': 'Số trận tướng bị cấm (Ban) (INT)',
-        'GP': 'Số trận tướng được chơi (Games Played) (INT)',
-        'By': 'Số người chơi đã sử dụng tướng này (INT)',
-        'W': 'Số trận thắng của tướng (INT)',
-        'L': 'Số trận thua của tướng (INT)',
-        'WR': 'Tỷ lệ thắng (%) = (W / GP) * 100 (FLOAT)',
-        'K': 'Số mạng hạ gục trung bình (Kills) (FLOAT)',
-        'D': 'Số lần bị hạ gục trung bình (Deaths) (FLOAT)',
-        'A': 'Số lần hỗ trợ trung bình (Assists) (FLOAT)',
-        'KDA': 'Tỷ lệ KDA = (K + A) / D (FLOAT)',
-        'CS': 'Số lính tiêu diệt trung bình (Creep Score) (FLOAT)',
-        'CS/M': 'Số lính tiêu diệt mỗi phút (Creep Score per Minute) (FLOAT)',
-        'G.1': 'Số vàng kiếm được trung bình (Gold) (FLOAT)',
-        'G/M': 'Số vàng kiếm được mỗi phút (Gold per Minute) (FLOAT)',
-        'KPAR': 'Tỷ lệ tham gia hạ gục (%) = [(K + A) / Tổng số hạ gục của đội] * 100 (FLOAT)',
-        'KS': 'Tỷ lệ đóng góp hạ gục (%) = (K / Tổng số hạ gục của đội) * 100 (FLOAT)',
-        'GS': 'Tỷ lệ đóng góp vàng (%) = (G / Tổng số vàng của đội) * 100 (FLOAT)',
-        'Mid Laner': 'Tướng được chơi ở vị trí đường giữa (BOOLEAN, 1 = Có, 0 = Không)',
-        'Top Laner': 'Tướng được chơi ở vị trí đường trên (BOOLEAN, 1 = Có, 0 = Không)',
-        'Bot Laner': 'Tướng được chơi ở vị trí xạ thủ (BOOLEAN, 1 = Có, 0 = Không)',
-        'Jungler': 'Tướng được chơi ở vị trí đi rừng (BOOLEAN, 1 = Có, 0 = Không)',
-        'Support': 'Tướng được chơi ở vị trí hỗ trợ (BOOLEAN, 1 = Có, 0 = Không)',
-        'total_games': 'Tổng số trận trong mùa giải (INT)',
-        '%B': 'Tỷ lệ cấm của tướng (%) = (B / total_games) * 100 (FLOAT)',
-        '%P': 'Tỷ lệ chọn của tướng (%) = (GP / total_games) * 100 (FLOAT)'
-    }
-    
-    # Định nghĩa mô tả các cột cho dataset player
-    player_column_descriptions = {
-        'Year': 'Năm diễn ra giải đấu (INT, ví dụ: 2018)',
-        'Season': 'Tên mùa giải (VARCHAR, ví dụ: Spring, Season)',
-        'Event_Type': 'Tên giai đoạn mùa giải (VARCHAR, ví dụ: Playoffs, Season, Promotion)',
-        'Team': 'Tên đội của người chơi (VARCHAR, ví dụ: Cherry Esports)',
-        'Player': 'Tên người chơi (VARCHAR)',
-        'G': 'Số trận đã chơi (Games) (INT)',
-        'W': 'Số trận thắng (Wins) (INT)',
-        'L': 'Số trận thua (Losses) (INT)',
-        'WR': 'Tỷ lệ thắng (%) = (W / G) * 100 (FLOAT)',
-        'K': 'Số mạng hạ gục trung bình mỗi trận (Kills) (FLOAT)',
-        'D': 'Số lần bị hạ gục trung bình mỗi trận (Deaths) (FLOAT)',
-        'A': 'Số lần hỗ trợ trung bình mỗi trận (Assists) (FLOAT)',
-        'KDA': 'Tỷ lệ KDA = (K + A) / D (FLOAT)',
-        'CS': 'Số lính tiêu diệt trung bình mỗi trận (Creep Score) (FLOAT)',
-        'CS/M': 'Số lính tiêu diệt mỗi phút (Creep Score per Minute) (FLOAT)',
-        'G.1': 'Số vàng kiếm được trung bình mỗi trận (Gold) (FLOAT)',
-        'G/M': 'Số vàng kiếm được mỗi phút (Gold per Minute) (FLOAT)',
-        'KPAR': 'Tỷ lệ tham gia hạ gục (%) = [(K + A) / Tổng số hạ gục của đội] * 100 (FLOAT)',
-        'KS': 'Tỷ lệ đóng góp hạ gục (%) = (K / Tổng số hạ gục của đội) * 100 (FLOAT)',
-        'GS': 'Tỷ lệ đóng góp vàng (%) = (G.1 / Tổng số vàng của đội) * 100 (FLOAT)',
-        'CP': 'Số tướng khác nhau đã chơi (Champions Played) (INT)',
-        'Champion_1': 'Tướng được chơi thường xuyên nhiều nhất (VARCHAR)',
-        'Champion_2': 'Tướng được chơi thường xuyên nhiều thứ hai (VARCHAR)',
-        'Champion_3': 'Tướng được chơi thường xuyên nhiều thứ ba (VARCHAR)',
-        'Role': 'Vai trò của người chơi (VARCHAR, ví dụ: Mid Laner, Bot Laner, Support, Jungler)',
-        'total_games': 'Tổng số trận trong mùa giải (INT)',
-        'max_G/M': 'Số vàng mỗi phút tối đa trong mùa giải (FLOAT)',
-        'max_CS/M': 'Số lính tiêu diệt mỗi phút tối đa trong mùa giải (FLOAT)',
-        'max_KDA': 'Tỷ lệ KDA tối đa trong mùa giải (FLOAT)',
-        'max_KPAR': 'Tỷ lệ tham gia hạ gục tối đa trong mùa giải (FLOAT)'
-    }
-    
     # Chọn mô tả cột phù hợp dựa trên tham số dataset_type
     dataset_type = dataset_type.lower()
-    if dataset_type == "champion":
-        column_descriptions = champion_column_descriptions
-    elif dataset_type == "player":
-        column_descriptions = player_column_descriptions
-    else:
-        raise ValueError("Loại dữ liệu không hợp lệ. Sử dụng 'champion' hoặc 'player'.")
+    if dataset_type not in COLUMN_DESCRIPTIONS:
+        raise ValueError("Loại dữ liệu không hợp lệ. Sử dụng 'champion', 'player' hoặc 'combined'.")
+    column_descriptions = COLUMN_DESCRIPTIONS[dataset_type]
     
     # Kiểm tra các cột cần có trong DataFrame
-    available_cols = [col for col in column_descriptions.keys() if col in df.columns]
+    available_cols = {col: desc for col, desc in column_descriptions.items() if col in df.columns}
     if not available_cols:
-        raise ValueError(f"DataFrame không chứa bất kỳ cột nào được mô tả trong {dataset_type}_column_descriptions.")
+        raise ValueError(f"DataFrame không chứa bất kỳ cột nào được mô tả trong {dataset_type.upper()}_COLUMN_DESCRIPTIONS.")
     
-    # Tạo chuỗi mô tả các cột
-    col_desc_str = "\n".join([f"{col}: {desc}" for col, desc in column_descriptions.items() if col in df.columns])
-    
-    # Tạo prompt dựa trên loại dữ liệu
-    if dataset_type == "champion":
-        prompt = create_champion_prompt(user_input, col_desc_str)
-    elif dataset_type == "player":
-        prompt = create_player_prompt(user_input, col_desc_str)
-    
-    print(f"Prompt for API ({dataset_type} data):\n", prompt)
-    
-    # Gọi DeepSeek API
-    if not deepseek_api_key:
-        deepseek_api_key = os.environ.get("DEEPSEEK_API_KEY")
-    if not deepseek_api_key:
-        raise ValueError("Biến môi trường DEEPSEEK_API_KEY chưa được thiết lập")
+    # Gộp khoảng trắng thừa để cùng một câu hỏi luôn cho cùng một prompt (và cùng khóa cache)
+    user_input = " ".join(user_input.split())
+
+    # Câu hỏi quen thuộc: dựng biểu đồ tại chỗ, không cần gọi API
+    if os.environ.get("FAST_PATH_DISABLED") != "1":
+        if job:
+            job.stage('fast_path')
+        with span('fast_path'):
+            fast = build_fast_plot(user_input, df, dataset_type, column_descriptions)
+        if fast is not None:
+            fig, intent = fast
+            log.info('fast_path %s', kv(dataset=dataset_type, kind=intent['kind']))
+            log.debug('fast_path_intent %s', intent)
+            PLOTS.inc(source='fast_path')
+            return fig, {'source': 'fast_path', 'intent': intent, 'cache': None, 'cache_tier': None,
+                         'prompt_tokens': None}
+
+    # Tạo prompt: tiền tố cố định theo loại dữ liệu + câu hỏi và các cột liên quan (xem prompt_compiler.py)
+    with span('prompt'):
+        prompt = compile_prompt(user_input, dataset_type, available_cols)
+    log.info('prompt %s', kv(dataset=dataset_type, **prompt.report()))
+    log.debug('prompt_text dataset=%s\n%s', dataset_type, prompt.user)
     
-    generated_response = call_deepseek_api(prompt, deepseek_api_key)
-    extracted_code = clean_the_response(generated_response)
-    print("Generated Code:\n", extracted_code)
+    # Tìm trong cache trước, chỉ gọi DeepSeek API khi chưa có
+    cache = default_cache()
+    with span('cache'):
+        key = cache_key(prompt.text, dataset_type, df, default_client().model, DEFAULT_TEMPERATURE)
+        cached = cache.get(key) if cache else None
+    if cache:
+        CACHE_REQUESTS.inc(result=MISS if cached is None else HIT)
+    if cached is not None:
+        extracted_code, tier = cached
+        info = {'source': 'llm', 'intent': None, 'cache': HIT, 'cache_tier': tier, 'prompt_tokens': prompt.report()}
+        log.info('llm_cache_hit %s', kv(dataset=dataset_type, tier=tier))
+        log.debug('cached_code\n%s', extracted_code)
+    else:
+        if not deepseek_api_key:
+            deepseek_api_key = os.environ.get("DEEPSEEK_API_KEY")
+        if not deepseek_api_key:
+            raise ValueError("Biến môi trường DEEPSEEK_API_KEY chưa được thiết lập")
+
+        with job.llm_slot() if job else nullcontext():
+            if job:
+                job.stage('llm')
+            with span('llm'):
+                if job:
+                    timeout = (default_client().timeout[0], job.timeout('llm'))
+                    generated_response = call_deepseek_api(prompt.user, deepseek_api_key, timeout=timeout,
+                                                           system=prompt.system, on_event=job.event, check=job.check)
+                else:
+                    generated_response = call_deepseek_api(prompt.user, deepseek_api_key, system=prompt.system)
+        # Kiểm tra (không đọc/ghi file, không import lạ...) và chuẩn hóa trước khi chạy
+        extracted_code = normalize_code(clean_the_response(generated_response))
+        if job:
+            job.event('code_ready')
+        info = {'source': 'llm', 'intent': None, 'cache': MISS, 'cache_tier': None, 'prompt_tokens': prompt.report()}
+        log.debug('generated_code\n%s', extracted_code)
     
     # Thực thi mã code được tạo ra, truyền DataFrame vào context của exec
-    local_vars = {}
-    exec(extracted_code, {'px': px, 'pd': pd, 'df': df}, local_vars)
-    fig = local_vars.get("fig")
+    if job:
+        job.stage('exec')
+    try:
+        with span('exec', sandbox=sandbox is not None):
+            if sandbox is not None:
+                timeout = job.timeout('exec') if job else STAGE_TIMEOUTS['exec']
+                fig = sandbox.run(extracted_code, dataset_type, timeout, check=job.check if job else None)
+            else:
+                if aggregates is None:
+                    aggregates = build_aggregates(df, dataset_type)
+                local_vars = {}
+                with job.interruptible() if job else nullcontext():
+                    exec(compile_code(extracted_code), {'px': px, 'pd': pd, 'df': df, 'agg': aggregates}, local_vars)
+                fig = local_vars.get("fig")
+    except JobTimeout:
+        EXEC_FAILURES.inc(reason='timeout')
+        raise
+    except Exception as e:
+        EXEC_FAILURES.inc(reason=type(e).__name__)
+        log.warning('exec_failed %s', kv(dataset=dataset_type, cache=info['cache'], error=type(e).__name__))
+        raise
     if fig is None:
+        EXEC_FAILURES.inc(reason='no_fig')
         raise Exception("Không tìm thấy biến 'fig' sau khi thực thi code.")
-    return fig
-
-def create_champion_prompt(user_input, col_desc_str):
-    """Tạo prompt cho dữ liệu champion"""
-    prompt = (
-        "Viết mã Python sử dụng Plotly để tạo trực quan hóa dựa trên yêu cầu của người dùng: \"{}\"\n"
-        "Sử dụng DataFrame có tên `df` với các cột và mô tả sau:\n"
-        "{}\n"
-        "Đảm bảo trực quan hóa tuân theo các yêu cầu sau:\n"
-        "- Tiêu đề của biểu đồ ngắn gọn: \"{}\"\n"
-        "- Bao gồm nhãn trục x và trục y rõ ràng, phù hợp với dữ liệu được vẽ\n"
-        "- Ưu tiên sử dụng theo giá trị trung bình của các biến được chọn"
-        "- Nếu biểu đồ cần sử dụng yếu tố liên quan đến thời gian, chỉ sử dụng cột Date và sắp xếp theo thứ tự thời gian\n"
-        "- Làm tròn tất cả các giá trị số (ví dụ: nhãn, thông tin khi rê chuột) đến 2 chữ số thập phân\n"
-        "- Sử dụng tông màu chính là #C89B3C (gold) hoặc các gradient màu sáng như #005A82\n"
-        "- Không sử dụng đối số `animation_group` trong các hàm của Plotly\n\n"
-        "Dưới đây là ví dụ ngắn sử dụng Few-shot prompting và Chain-of-Thought:\n\n"
-        "Ví dụ:\n"
-        "Problem: 'Phân tích tỉ lệ chiến thắng (WR) của 10 champion được chơi nhiều nhất.'\n"
-        "Chain-of-Thought:\n"
-        "- Xác định rằng cần xem xét cột 'Champion', 'GP' (số trận đấu) và 'WR' (tỉ lệ thắng).\n"
-        "- Cần sắp xếp theo số trận đấu (GP) để tìm 10 champion được chơi nhiều nhất.\n"
-        "- Biểu đồ cột (bar chart) là lựa chọn phù hợp để thể hiện tỉ lệ thắng của các champion.\n"
-        "Kết luận: Sử dụng **bar chart** có sắp xếp theo GP.\n\n"
-        "Bây giờ, dựa trên yêu cầu và mô tả dữ liệu dưới đây, hãy xác định loại biểu đồ phù hợp.\n\n"
-        "Yêu cầu của người dùng: \"{}\"\n\n"
-        "Mô tả các cột của DataFrame (Champion dataset):\n"
-        "{}\n\n"
-        "Yêu cầu thêm:\n"
-        "- Tiêu đề của biểu đồ phải khớp chính xác với yêu cầu của người dùng\n"
-        "- Bao gồm nhãn trục rõ ràng\n"
-        "- Làm tròn các giá trị số đến 2 chữ số thập phân\n"
-        "- Sử dụng màu chủ đạo #C89B3C (gold) hoặc các gradient màu sáng như #005A82\n"
-        "- Tránh hiển thị các giá trị Null trên biểu đồ\n"
-        "QUAN TRỌNG NHẤT: Nếu số lượng đối tượng vượt quá 20, chỉ chọn ra top 20 đối tượng có giá trị cao nhất hoặc thấp nhất "
-        "dựa trên tiêu chí liên quan đến câu hỏi của người dùng (không được chọn ngẫu nhiên)\n\n"
-        "Giả sử dữ liệu đã được tải vào biến `df`. "
-        "Trả về chỉ mã Plotly cần thiết để tạo trực quan hóa, phải gán vào biến 'fig', không kèm theo lời giải thích, "
-        "Phải có các dòng import thư viện và KHÔNG ĐƯỢC gọi hàm fig.show() hoặc bất kỳ hàm hiển thị nào khác."
-    ).format(user_input, col_desc_str, user_input, user_input, col_desc_str)
-    
-    return prompt
-
-def create_player_prompt(user_input, col_desc_str):
-    """Tạo prompt cho dữ liệu player"""
-    prompt = (
-        "Viết mã Python sử dụng Plotly để tạo trực quan hóa dựa trên yêu cầu của người dùng: \"{}\"\n"
-        "Sử dụng DataFrame có tên `df` với các cột và mô tả sau:\n"
-        "{}\n"
-        "Đảm bảo trực quan hóa tuân theo các yêu cầu sau:\n"
-        "- Tiêu đề của biểu đồ ngắn gọn: \"{}\"\n"
-        "- Bao gồm nhãn trục x và trục y rõ ràng, phù hợp với dữ liệu được vẽ\n"
-        "- Nếu cần phân tích theo thời gian, sử dụng cột Year và sắp xếp theo thứ tự tăng dần\n"
-        "- Làm tròn tất cả các giá trị số (ví dụ: nhãn, thông tin khi rê chuột) đến 2 chữ số thập phân\n"
-        "- Sử dụng tông màu chính là #C89B3C (gold) hoặc các gradient màu sáng như #005A82\n"
-        "- Không sử dụng đối số `animation_group` trong các hàm của Plotly\n\n"
-        "Dưới đây là ví dụ ngắn sử dụng Few-shot prompting và Chain-of-Thought:\n\n"
-        "Ví dụ:\n"
-        "Problem: 'So sánh KDA của top 10 người chơi có KDA cao nhất.'\n"
-        "Chain-of-Thought:\n"
-        "- Xác định rằng cần xem xét cột 'Player' và 'KDA'.\n"
-        "- Cần sắp xếp theo KDA giảm dần để tìm 10 người chơi có KDA cao nhất.\n"
-        "- Biểu đồ cột (bar chart) là lựa chọn phù hợp để so sánh KDA giữa các người chơi.\n"
-        "Kết luận: Sử dụng **bar chart** có sắp xếp theo KDA.\n\n"
-        "Bây giờ, dựa trên yêu cầu và mô tả dữ liệu dưới đây, hãy xác định loại biểu đồ phù hợp.\n\n"
-        "Yêu cầu của người dùng: \"{}\"\n\n"
-        "Mô tả các cột của DataFrame (Player dataset):\n"
-        "{}\n\n"
-        "Yêu cầu thêm:\n"
-        "- Tiêu đề của biểu đồ phải khớp chính xác với yêu cầu của người dùng\n"
-        "- Bao gồm nhãn trục rõ ràng\n"
-        "- Làm tròn các giá trị số đến 2 chữ số thập phân\n"
-        "- Sử dụng màu chủ đạo #C89B3C (gold) hoặc các gradient màu sáng như #005A82\n"
-        "- Tránh hiển thị các giá trị Null trên biểu đồ\n"
-        "QUAN TRỌNG NHẤT: Nếu số lượng đối tượng vượt quá 20, chỉ chọn ra top 20 đối tượng có giá trị cao nhất hoặc thấp nhất "
-        "dựa trên tiêu chí liên quan đến câu hỏi của người dùng (không được chọn ngẫu nhiên)\n\n"
-        "Giả sử dữ liệu đã được tải vào biến `df`. "
-        "Trả về chỉ mã Plotly cần thiết để tạo trực quan hóa, phải gán vào biến 'fig', không kèm theo lời giải thích, "
-        "Phải có các dòng import thư viện và KHÔNG ĐƯỢC gọi hàm fig.show() hoặc bất kỳ hàm hiển thị nào khác."
-    ).format(user_input, col_desc_str, user_input, user_input, col_desc_str)
-    
-    return prompt
\ No newline at end of file
+    PLOTS.inc(source='llm')
+    # Chỉ lưu code đã tạo được biểu đồ
+    if cache and cached is None:
+        cache.set(key, extracted_code)
+    return fig, info
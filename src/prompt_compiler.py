@@ -0,0 +1,250 @@
+"""
+Dựng prompt cho DeepSeek thành hai phần: tiền tố cố định và phần thay đổi theo câu hỏi.
+
+- Tiền tố (system message) chỉ phụ thuộc bộ dữ liệu: vai trò, quy tắc trình
+  bày, ví dụ few-shot, mô tả bảng `agg`. Mọi câu hỏi trên cùng bộ dữ liệu gửi
+  cùng một tiền tố từng byte, nên cache ngữ cảnh của DeepSeek (tính theo tiền
+  tố giống nhau) dùng lại được: phần đó rẻ hơn và được xử lý nhanh hơn.
+- Phần thay đổi (user message): câu hỏi (một lần duy nhất) và mô tả của các
+  cột liên quan. Cột được chọn theo cụm từ trong câu hỏi (cùng bảng cụm từ với
+  fast_path.py, tên cột, tên tiếng Anh trong mô tả); các cột khóa (tên tướng,
+  người chơi, năm...) luôn có. Không nhận ra chỉ số nào, hoặc câu hỏi xếp hạng /
+  sắp xếp theo một tiêu chí không khớp với cột nào ("được ... nhiều nhất"), thì
+  gửi mọi cột để mô hình không thiếu cột cần sắp xếp.
+
+Số token được ước lượng (không có tokenizer của DeepSeek): khoảng 4 byte UTF-8
+mỗi token, đủ để so sánh giữa các prompt.
+"""
+import math
+import re
+import unicodedata
+
+from aggregates import describe_aggregates
+from fast_path import (ASCENDING, COLUMN_TOKENS, DESCENDING, ENTITIES, FILTERS, GAMES, GAMES_COLUMN, GROUPS,
+                       METRIC_PHRASES, RANK_BY_GAMES, ROLES, TREND)
+
+SYSTEM_ROLE = ("You are an expert data visualization assistant that generates precise "
+               "Visualization Query Language (VQL) and Plotly code.")
+BYTES_PER_TOKEN = 4
+
+# Cột luôn gửi kèm: khóa để lọc/gộp và trục thời gian
+KEY_COLUMNS = {
+    'champion': ['Champion', 'Year', 'Date'],
+    'player': ['Player', 'Team', 'Role', 'Year'],
+    'combined': ['Year', 'Tournamment', 'Team', 'Player', 'Role', 'Champion', 'Pick_Rank'],
+}
+# Cột thời gian được nhắc tới trong quy tắc của từng bộ dữ liệu
+TIME_COLUMN = {'champion': 'Date', 'player': 'Year', 'combined': 'Year'}
+ROLE_PHRASES = ['vai trò', 'vị trí', 'đường giữa', 'đường trên', 'đi rừng', 'xạ thủ', 'hỗ trợ', 'role', 'lane',
+                *(role.casefold() for role in ROLES)]
+# Xếp theo số lần được chọn: số trận và tỉ lệ chọn (%P)
+RANK_BY_PICKS = ['được chọn nhiều nhất', 'chọn nhiều nhất', 'được pick nhiều nhất', 'pick nhiều nhất',
+                 'được chọn ít nhất', 'ít được chọn nhất', 'phổ biến nhất', 'most picked', 'most popular',
+                 'least picked']
+# Cụm từ xếp hạng/sắp xếp: tiêu chí đứng ngay trước ("tỉ lệ thắng cao nhất") hoặc ngay sau ("sắp xếp theo KDA")
+RANKING = [*ASCENDING, *DESCENDING, 'sắp xếp theo', 'xếp hạng theo', 'sort by', 'sorted by', 'ranked by']
+# Từ được phép đứng giữa cụm từ xếp hạng và tiêu chí của nó
+RANKING_FILLER = {'có', 'là', 'với', 'theo', 'trung', 'bình', 'tổng', 'the', 'with', 'by', 'average', 'total'}
+# Tên tiếng Anh trong ngoặc của mô tả cột, ví dụ "(Creep Score per Minute)"
+ENGLISH_NAME = re.compile(r'\(([A-Z][A-Za-z ]{2,})\)')
+
+EXAMPLES = {
+    'champion': (
+        "Problem: 'Phân tích tỉ lệ chiến thắng (WR) của 10 champion được chơi nhiều nhất.'\n"
+        "Chain-of-Thought:\n"
+        "- Xác định rằng cần xem xét cột 'Champion', 'GP' (số trận đấu) và 'WR' (tỉ lệ thắng).\n"
+        "- Cần sắp xếp theo số trận đấu (GP) để tìm 10 champion được chơi nhiều nhất.\n"
+        "- Biểu đồ cột (bar chart) là lựa chọn phù hợp để thể hiện tỉ lệ thắng của các champion.\n"
+        "Kết luận: Sử dụng **bar chart** có sắp xếp theo GP."
+    ),
+    'player': (
+        "Problem: 'So sánh KDA của top 10 người chơi có KDA cao nhất.'\n"
+        "Chain-of-Thought:\n"
+        "- Xác định rằng cần xem xét cột 'Player' và 'KDA'.\n"
+        "- Cần sắp xếp theo KDA giảm dần để tìm 10 người chơi có KDA cao nhất.\n"
+        "- Biểu đồ cột (bar chart) là lựa chọn phù hợp để so sánh KDA giữa các người chơi.\n"
+        "Kết luận: Sử dụng **bar chart** có sắp xếp theo KDA."
+    ),
+    'combined': (
+        "Problem: 'Tỉ lệ thắng của các tướng mà đường giữa của Team Flash chơi nhiều nhất.'\n"
+        "Chain-of-Thought:\n"
+        "- Lọc các dòng có Team == 'Team Flash' và Role == 'Mid Laner'.\n"
+        "- Gộp theo 'Champion', lấy trung bình 'Champion_WR' và đếm số dòng để biết tướng được chơi nhiều nhất.\n"
+        "- Biểu đồ cột (bar chart) là lựa chọn phù hợp để so sánh tỉ lệ thắng của các tướng.\n"
+        "Kết luận: Sử dụng **bar chart** có sắp xếp theo số lần xuất hiện."
+    ),
+}
+DATASET_NOTES = {
+    'champion': "- Ưu tiên sử dụng giá trị trung bình của các biến được chọn\n",
+    'player': "",
+    'combined': (
+        "- Mỗi dòng của `df` là một tướng mà một người chơi chơi nhiều trong một giải (Year, Tournamment), "
+        "kèm chỉ số của người chơi (tiền tố Player_) và của tướng trong cùng giải (tiền tố Champion_). "
+        "Dữ liệu đã được nối sẵn: KHÔNG merge/join lại. Chỉ số của người chơi lặp lại trên các dòng tướng "
+        "của họ, nên khi tính theo người chơi hãy lọc Pick_Rank == 1 trước\n"
+    ),
+}
+
+
+def estimate_tokens(text):
+    """Số token ước lượng của một đoạn văn bản."""
+    return math.ceil(len(text.encode('utf-8')) / BYTES_PER_TOKEN)
+
+
+def _normalize(text):
+    text = unicodedata.normalize('NFC', text).casefold().replace('tỷ', 'tỉ')
+    return ' ' + re.sub(r'\s+', ' ', text).strip() + ' '
+
+
+def _contains(text, phrase):
+    return re.search(r'(?<![\w/%])' + re.escape(phrase.casefold()) + r'(?![\w/%])', text) is not None
+
+
+def _aliases(dataset_type, column_descriptions):
+    """
+    Hai dict cụm từ -> các cột mà cụm từ đó chỉ tới: chỉ số (WR, KDA, số trận...)
+    và chiều (nhóm, bộ lọc, thời gian, vai trò).
+    """
+    metrics, dimensions = {}, {}
+
+    def add(aliases, phrase, column):
+        for name in (column, f'Player_{column}', f'Champion_{column}'):
+            if name in column_descriptions:
+                aliases.setdefault(phrase, set()).add(name)
+
+    for phrase, column in METRIC_PHRASES.items():
+        if column != GAMES:
+            add(metrics, phrase, column)
+    games = [GAMES_COLUMN[dataset_type]] if dataset_type in GAMES_COLUMN else ['G', 'GP']
+    for phrase in [p for p, c in METRIC_PHRASES.items() if c == GAMES] + RANK_BY_GAMES:
+        for column in games:
+            add(metrics, phrase, column)
+    for phrase in RANK_BY_PICKS:
+        for column in [*games, '%P']:
+            add(metrics, phrase, column)
+    for column, description in column_descriptions.items():
+        base = column.split('_', 1)[1] if column.startswith(('Player_', 'Champion_')) else column
+        # Tên cột ngắn như "By", "G" trùng với từ thông thường
+        if base in COLUMN_TOKENS or len(base) >= 4:
+            add(metrics, base, base)
+        for english in ENGLISH_NAME.findall(description):
+            add(metrics, english, base)
+    for phrases in (GROUPS, ENTITIES):
+        for phrase, column in phrases.items():
+            add(dimensions, phrase, column)
+    for phrase, (column, _) in FILTERS.items():
+        add(dimensions, phrase, column)
+    for phrase in TREND:
+        add(dimensions, phrase, TIME_COLUMN.get(dataset_type, 'Year'))
+    role_columns = ['Role'] if 'Role' in column_descriptions else ROLES
+    for phrase in ROLE_PHRASES:
+        for column in role_columns:
+            add(dimensions, phrase, column)
+    return metrics, dimensions
+
+
+def _spans(text, phrases):
+    pattern = r'(?<![\w/%])(?:' + '|'.join(re.escape(p.casefold()) for p in sorted(phrases, key=len, reverse=True)) \
+        + r')(?![\w/%])'
+    return [m.span() for m in re.finditer(pattern, text)] if phrases else []
+
+
+def _only_filler(text):
+    return all(word in RANKING_FILLER for word in text.split())
+
+
+def _unmapped_ranking(text, metric_phrases):
+    """True nếu câu hỏi có cụm từ xếp hạng mà không có chỉ số nào liền trước hoặc liền sau nó."""
+    metrics = _spans(text, metric_phrases)
+    for start, end in _spans(text, RANKING):
+        mapped = any(
+            # Nằm trong một cụm chỉ số ("được chơi nhiều nhất"), hoặc chỉ cách nó bởi các từ nối
+            (m_start < end and start < m_end)
+            or (m_end <= start and _only_filler(text[m_end:start]))
+            or (m_start >= end and _only_filler(text[end:m_start]))
+            for m_start, m_end in metrics
+        )
+        if not mapped:
+            return True
+    return False
+
+
+def select_columns(user_input, dataset_type, column_descriptions):
+    """
+    (các cột gửi kèm, có bị cắt bớt không): cột khóa và các cột được câu hỏi nhắc tới,
+    theo thứ tự của mô tả; mọi cột nếu câu hỏi không nhắc tới chỉ số nào hoặc xếp
+    hạng theo một tiêu chí không nhận ra.
+    """
+    text = _normalize(user_input)
+    metrics, dimensions = _aliases(dataset_type, column_descriptions)
+    found = [{c for phrase, columns in aliases.items() if _contains(text, phrase) for c in columns}
+             for aliases in (metrics, dimensions)]
+    keys = set(KEY_COLUMNS.get(dataset_type, []))
+    if not found[0] - keys or _unmapped_ranking(text, list(metrics)):
+        return list(column_descriptions), False
+    selected = keys | found[0] | found[1]
+    return [c for c in column_descriptions if c in selected], True
+
+
+def _prefix(dataset_type):
+    """Phần cố định của prompt cho một bộ dữ liệu (không chứa gì của câu hỏi)."""
+    aggregates = describe_aggregates(dataset_type)
+    return (
+        f"{SYSTEM_ROLE}\n\n"
+        "Viết mã Python sử dụng Plotly để tạo trực quan hóa theo yêu cầu của người dùng, dùng DataFrame "
+        f"có tên `df` ({dataset_type.capitalize()} dataset). Tin nhắn của người dùng gồm yêu cầu và mô tả các cột "
+        "liên quan của `df`; chỉ dùng các cột được mô tả.\n"
+        + (f"{aggregates}\n" if aggregates else "")
+        + "Đảm bảo trực quan hóa tuân theo các yêu cầu sau:\n"
+        "- Tiêu đề của biểu đồ phải khớp chính xác với yêu cầu của người dùng\n"
+        "- Bao gồm nhãn trục x và trục y rõ ràng, phù hợp với dữ liệu được vẽ\n"
+        + DATASET_NOTES.get(dataset_type, "")
+        + f"- Nếu cần phân tích theo thời gian, chỉ sử dụng cột {TIME_COLUMN.get(dataset_type, 'Year')} "
+        "và sắp xếp theo thứ tự thời gian tăng dần\n"
+        "- Làm tròn tất cả các giá trị số (ví dụ: nhãn, thông tin khi rê chuột) đến 2 chữ số thập phân\n"
+        "- Sử dụng tông màu chính là #C89B3C (gold) hoặc các gradient màu sáng như #005A82\n"
+        "- Không sử dụng đối số `animation_group` trong các hàm của Plotly\n"
+        "- Tránh hiển thị các giá trị Null trên biểu đồ\n"
+        "QUAN TRỌNG NHẤT: Nếu số lượng đối tượng vượt quá 20, chỉ chọn ra top 20 đối tượng có giá trị cao nhất "
+        "hoặc thấp nhất dựa trên tiêu chí liên quan đến câu hỏi của người dùng (không được chọn ngẫu nhiên)\n\n"
+        "Ví dụ sử dụng Few-shot prompting và Chain-of-Thought:\n"
+        f"{EXAMPLES.get(dataset_type, EXAMPLES['champion'])}\n\n"
+        "Trả về chỉ mã Plotly cần thiết để tạo trực quan hóa, phải gán vào biến 'fig', không kèm theo lời giải "
+        "thích. Phải có các dòng import thư viện và KHÔNG ĐƯỢC gọi hàm fig.show() hoặc bất kỳ hàm hiển thị nào khác."
+    )
+
+
+class CompiledPrompt:
+    """
+    Prompt đã dựng: `system` là tiền tố cố định, `user` là phần theo câu hỏi.
+
+    tokens: {'prefix', 'suffix', 'total'} ước lượng; columns: số cột đã gửi / tổng số cột.
+    """
+
+    __slots__ = ('system', 'user', 'columns', 'tokens')
+
+    def __init__(self, system, user, columns, total_columns):
+        self.system = system
+        self.user = user
+        self.columns = {'sent': len(columns), 'total': total_columns}
+        prefix, suffix = estimate_tokens(system), estimate_tokens(user)
+        self.tokens = {'prefix': prefix, 'suffix': suffix, 'total': prefix + suffix}
+
+    @property
+    def text(self):
+        """Toàn bộ prompt (dùng làm khóa cache)."""
+        return f'{self.system}\n\n{self.user}'
+
+    def report(self):
+        return {**self.tokens, 'columns': self.columns['sent'], 'total_columns': self.columns['total']}
+
+
+def compile_prompt(user_input, dataset_type, column_descriptions):
+    """Dựng prompt cho câu hỏi; column_descriptions chỉ gồm các cột có trong DataFrame."""
+    columns, _ = select_columns(user_input, dataset_type, column_descriptions)
+    user = (
+        f"Yêu cầu của người dùng: \"{user_input}\"\n\n"
+        "Các cột liên quan của `df`:\n"
+        + "\n".join(f"{column}: {column_descriptions[column]}" for column in columns)
+    )
+    return CompiledPrompt(_prefix(dataset_type), user, columns, len(column_descriptions))
@@ -0,0 +1,303 @@
+"""
+Pool tiến trình chạy code Plotly do DeepSeek sinh ra, tách khỏi tiến trình web.
+
+Mỗi worker là một tiến trình Python riêng đã import sẵn pandas/plotly và ánh xạ
+các snapshot dữ liệu (snapshot.py) ở chế độ chỉ đọc, nên các worker dùng chung
+trang bộ nhớ của dữ liệu. Mỗi job nhận một bản sao nông của DataFrame: pandas
+dùng Copy-on-Write (luôn bật từ pandas 3; với pandas 1.5/2.x do snapshot.enable_copy_on_write
+bật khi import, ở cả tiến trình web và worker), code sinh ra có sửa tại chỗ
+(inplace) thì chỉ các cột bị sửa được sao chép, dữ liệu gốc và các job sau
+không bị ảnh hưởng.
+
+Mỗi job bị giới hạn thời gian CPU (RLIMIT_CPU) và bộ nhớ (RLIMIT_AS) trong
+worker. Ngoài ra tiến trình web chờ kết quả có thời hạn: quá hạn hoặc job bị
+hủy thì worker bị kill và một worker mới được khởi động thay thế.
+
+Cấu hình qua biến môi trường:
+    SANDBOX_WORKERS        số tiến trình worker (mặc định min(4, số CPU))
+    SANDBOX_CPU_SECONDS    thời gian CPU tối đa của một job, giây (mặc định 10)
+    SANDBOX_MEMORY_MB      bộ nhớ tối đa một job được cấp thêm, MB (mặc định 1024)
+    SANDBOX_MAX_JOBS       số job một worker chạy trước khi được thay mới (mặc định 200)
+    SANDBOX_START_TIMEOUT  thời gian chờ một worker khởi động xong, giây (mặc định 60)
+    SANDBOX_DISABLED       đặt 1 để chạy code ngay trong tiến trình web như trước
+
+Chỉ dùng được trên POSIX (truyền pipe cho tiến trình con, giới hạn bằng resource).
+"""
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+from combined import derived_datasets
+from figure_reduce import prepare_figure
+from serialization import EncodedFigure
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SandboxError(Exception):
+    pass
+
+
+def sandbox_supported():
+    return os.name == 'posix'
+
+
+# ---------------------------------------------------------------------------- phía tiến trình web
+
+class _Worker:
+    """Một tiến trình worker và hai đầu pipe để gửi job/nhận kết quả."""
+
+    def __init__(self, sources, cpu_seconds, memory_mb):
+        job_read, job_write = os.pipe()
+        result_read, result_write = os.pipe()
+        config = json.dumps({'sources': sources, 'cpu_seconds': cpu_seconds, 'memory_mb': memory_mb})
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(job_read), str(result_write), config],
+            pass_fds=(job_read, result_write), cwd=SRC_DIR)
+        os.close(job_read)
+        os.close(result_write)
+        self.jobs = Connection(job_write, readable=False)
+        self.results = Connection(result_read, writable=False)
+        self.ready = False
+        # Không còn biết worker đang ở trạng thái nào (quá hạn, bị hủy, tự thoát): phải thay mới
+        self.broken = False
+        self.completed = 0
+
+    def _receive(self, deadline, check):
+        """Chờ một thông điệp từ worker, gọi check() định kỳ; None nếu quá hạn."""
+        try:
+            while not self.results.poll(0.05):
+                if check:
+                    check()
+                if self.process.poll() is not None:
+                    raise SandboxError(f'Tiến trình chạy code đã dừng đột ngột (mã {self.process.returncode})')
+                if time.monotonic() > deadline:
+                    self.broken = True
+                    return None
+            return self.results.recv()
+        except EOFError:
+            self.broken = True
+            raise SandboxError('Tiến trình chạy code đã dừng đột ngột')
+        except BaseException:
+            self.broken = True
+            raise
+
+    def wait_ready(self, timeout, check=None):
+        if self.ready:
+            return
+        if self._receive(time.monotonic() + timeout, check) is None:
+            raise SandboxError('Tiến trình chạy code khởi động quá lâu')
+        self.ready = True
+
+    def run(self, code, dataset, timeout, check=None):
+        self.jobs.send((code, dataset))
+        message = self._receive(time.monotonic() + timeout, check)
+        if message is None:
+            raise SandboxError(f'Code chạy quá {timeout:.0f} giây')
+        self.completed += 1
+        status, payload, recycle = message
+        self.broken = self.broken or recycle
+        if status != 'ok':
+            raise SandboxError(payload)
+        return payload
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        self.jobs.close()
+        self.results.close()
+
+
+class Sandbox:
+    """
+    Pool các worker đã khởi động sẵn; `run` chạy code trên dataset theo tên và trả về Figure.
+
+    `sources` giống DatasetLoader: {tên dataset: đường dẫn CSV}.
+    """
+
+    def __init__(self, sources, workers=None, cpu_seconds=None, memory_mb=None, max_jobs=None, start_timeout=None):
+        env = os.environ.get
+        self.sources = {name: os.path.abspath(path) for name, path in sources.items()}
+        # Dataset dẫn xuất (combined.py) được worker tự dựng từ các dataset nguồn
+        self.datasets = [*self.sources, *derived_datasets(self.sources)]
+        self.workers = workers or int(env('SANDBOX_WORKERS', min(4, os.cpu_count() or 1)))
+        self.cpu_seconds = cpu_seconds or float(env('SANDBOX_CPU_SECONDS', 10))
+        self.memory_mb = memory_mb or int(env('SANDBOX_MEMORY_MB', 1024))
+        self.max_jobs = max_jobs or int(env('SANDBOX_MAX_JOBS', 200))
+        self.start_timeout = start_timeout or float(env('SANDBOX_START_TIMEOUT', 60))
+        self._idle = queue.Queue()
+        self._all = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.workers):
+            self._spawn()
+
+    @classmethod
+    def from_env(cls, sources):
+        if os.environ.get('SANDBOX_DISABLED') == '1' or not sandbox_supported():
+            return None
+        return cls(sources)
+
+    def _spawn(self):
+        worker = _Worker(self.sources, self.cpu_seconds, self.memory_mb)
+        with self._lock:
+            self._all.add(worker)
+        self._idle.put(worker)
+
+    def _retire(self, worker):
+        worker.kill()
+        with self._lock:
+            self._all.discard(worker)
+            closed = self._closed
+        if not closed:
+            self._spawn()
+
+    def run(self, code, dataset, timeout, check=None):
+        """
+        Chạy `code` với biến `df` (dataset), `agg` (bảng tổng hợp, xem aggregates.py), `px`, `pd`
+        trong một worker và trả về biến `fig`
+        (dạng EncodedFigure: worker đã giảm điểm và mã hóa JSON, tiến trình web không phải dựng lại Figure).
+
+        check: hàm gọi định kỳ trong lúc chờ (ví dụ Job.check), ném exception để hủy;
+        khi đó worker đang chạy job bị kill.
+        """
+        if dataset not in self.datasets:
+            raise SandboxError(f'Dataset không hợp lệ: {dataset}')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                worker = self._idle.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if check:
+                    check()
+                if time.monotonic() > deadline:
+                    raise SandboxError('Không còn tiến trình rảnh để chạy code')
+        try:
+            # Thời gian chờ worker mới khởi động không tính vào thời hạn của code
+            worker.wait_ready(self.start_timeout, check)
+            fig_json, reduction = worker.run(code, dataset, timeout, check)
+        finally:
+            # Lỗi do chính code sinh ra (exception thường) thì worker vẫn dùng tiếp được
+            if worker.broken or not worker.alive() or worker.completed >= self.max_jobs:
+                self._retire(worker)
+            else:
+                self._idle.put(worker)
+        return EncodedFigure(fig_json, reduction)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._all)
+        for worker in workers:
+            worker.kill()
+
+
+# ---------------------------------------------------------------------------- phía worker
+
+class CpuLimitExceeded(BaseException):
+    """Ném khi job dùng hết thời gian CPU; kế thừa BaseException để `except Exception` không nuốt mất."""
+
+
+def _on_sigxcpu(signum, frame):
+    raise CpuLimitExceeded()
+
+
+def _address_space():
+    """Kích thước vùng nhớ ảo hiện tại của tiến trình, byte (Linux); None nếu không đọc được."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _cpu_time(resource):
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _run_job(code, df, agg, px, pd, resource, config):
+    """Chạy một job với giới hạn CPU/bộ nhớ; trả về (trạng thái, JSON của fig hoặc thông báo lỗi, có cần thay worker)."""
+    cpu_limit = resource.getrlimit(resource.RLIMIT_CPU)
+    as_limit = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_CPU, (int(_cpu_time(resource) + config['cpu_seconds']) + 1, cpu_limit[1]))
+    current = _address_space()
+    if current is not None:
+        soft = current + config['memory_mb'] * 1024 * 1024
+        if as_limit[1] != resource.RLIM_INFINITY:
+            soft = min(soft, as_limit[1])
+        resource.setrlimit(resource.RLIMIT_AS, (soft, as_limit[1]))
+    try:
+        local_vars = {}
+        exec(code, {'px': px, 'pd': pd, 'df': df, 'agg': agg}, local_vars)
+        fig = local_vars.get('fig')
+        if fig is None:
+            return 'error', "Không tìm thấy biến 'fig' sau khi thực thi code.", False
+        # Giảm điểm và mã hóa ngay trong worker, chỉ JSON gọn đi qua pipe
+        encoded = prepare_figure(fig)
+        return 'ok', (encoded.json, encoded.reduction), False
+    except CpuLimitExceeded:
+        return 'error', f"Code dùng quá {config['cpu_seconds']:.0f} giây CPU", True
+    except MemoryError:
+        return 'error', f"Code dùng quá {config['memory_mb']} MB bộ nhớ", True
+    except Exception as e:
+        return 'error', f'{type(e).__name__}: {e}', False
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, as_limit)
+        resource.setrlimit(resource.RLIMIT_CPU, cpu_limit)
+
+
+def _worker_main(job_fd, result_fd, config):
+    import resource
+
+    import pandas as pd
+    import plotly.express as px
+
+    from aggregates import AggregateStore
+    from code_check import compile_code
+    from snapshot import DatasetLoader
+
+    jobs = Connection(job_fd, writable=False)
+    results = Connection(result_fd, readable=False)
+    signal.signal(signal.SIGXCPU, _on_sigxcpu)
+
+    # Khởi động sẵn: ánh xạ dữ liệu và dựng thử một biểu đồ để plotly nạp hết module/template
+    datasets = DatasetLoader(config['sources'], derived=derived_datasets(config['sources']))
+    aggregates = AggregateStore(datasets)
+    for name in datasets.names():
+        aggregates.get(name)
+    prepare_figure(px.bar(x=[0], y=[0]))
+    results.send(('ready', os.getpid()))
+
+    while True:
+        try:
+            code, dataset = jobs.recv()
+        except EOFError:
+            # Tiến trình web đã đóng pipe (dừng hoặc thay worker)
+            return
+        try:
+            code = compile_code(code)
+        except Exception as e:
+            results.send(('error', str(e), False))
+            continue
+        status, payload, recycle = _run_job(code, datasets.get(dataset), aggregates.get(dataset),
+                                            px, pd, resource, config)
+        results.send((status, payload, recycle))
+        if recycle:
+            return
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, SRC_DIR)
+    _worker_main(int(sys.argv[1]), int(sys.argv[2]), json.loads(sys.argv[3]))
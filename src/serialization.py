@@ -0,0 +1,195 @@
+"""
+Chuyển biểu đồ sang JSON đúng một lần cho phản hồi của /api/plot.
+
+Mảng số trong các trace được gửi dưới dạng typed array nhị phân của Plotly
+({"dtype": "f8", "bdata": "<base64>"}), kể cả khi code sinh ra truyền list
+Python thay vì cột pandas; plotly.js (>= 2.28) tự giải mã. Chỉ dùng API công
+khai của plotly (Figure.to_plotly_json, plotly.io.to_json với orjson). JSON của biểu đồ được ghép thẳng vào body phản hồi thay vì
+parse lại rồi mã hóa lần nữa; body lớn được nén gzip/br theo Accept-Encoding,
+và ETag (băm nội dung biểu đồ) cho phép trả 304 khi client đã có đúng biểu đồ đó.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import numbers
+import zlib
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Mảng ngắn hơn thì để dạng list: base64 không nhỏ hơn mà khó đọc hơn khi debug
+MIN_TYPED_ARRAY = 8
+# Body nhỏ hơn thì không nén
+MIN_COMPRESS_BYTES = 1024
+# Thuộc tính plotly.js không nhận typed array (giống danh sách của plotly.py)
+SKIPPED_KEYS = {'geojson', 'layer', 'layers', 'range'}
+# Kiểu số plotly.js giải mã được (không có int64), theo thứ tự thử
+TYPED_ARRAY_INTS = {'i': (np.int8, np.int16, np.int32), 'u': (np.uint8, np.uint16, np.uint32)}
+TYPED_ARRAY_FLOATS = {'f4': np.float32, 'f8': np.float64}
+
+
+class EncodedFigure:
+    """
+    Biểu đồ đã ở dạng JSON (ví dụ do worker của sandbox mã hóa sẵn), không cần mã hóa lại.
+
+    reduction: thông tin giảm điểm của figure_reduce.reduce_figure, None nếu biểu đồ giữ nguyên.
+    """
+
+    __slots__ = ('json', 'reduction')
+
+    def __init__(self, json_text, reduction=None):
+        self.json = json_text
+        self.reduction = reduction
+
+
+class RawJSON:
+    """Giá trị đã là JSON, được ghép nguyên văn vào body bởi encode_response."""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _is_number_list(value):
+    return (len(value) >= MIN_TYPED_ARRAY
+            and all(isinstance(v, numbers.Real) and not isinstance(v, bool) for v in value))
+
+
+def _typed_array(array):
+    """Typed array của plotly.js cho mảng số; mảng không mã hóa được (rỗng, int quá lớn, object) giữ nguyên."""
+    if array.size == 0:
+        return array
+    if array.dtype.kind in TYPED_ARRAY_INTS:
+        low, high = array.min(), array.max()
+        kind = next((k for k in TYPED_ARRAY_INTS[array.dtype.kind]
+                     if np.iinfo(k).min <= low and high <= np.iinfo(k).max), None)
+        if kind is None:
+            return array
+        array = array.astype(kind, copy=False)
+    elif array.dtype.kind == 'f':
+        array = array.astype(np.float32 if array.dtype == np.float32 else np.float64, copy=False)
+    else:
+        return array
+    spec = {'dtype': array.dtype.str[1:], 'bdata': base64.b64encode(np.ascontiguousarray(array)).decode('ascii')}
+    if array.ndim > 1:
+        spec['shape'] = ', '.join(str(n) for n in array.shape)
+    return spec
+
+
+def is_typed_array(value):
+    return isinstance(value, dict) and 'bdata' in value and 'dtype' in value
+
+
+def typed_array_values(value):
+    """Mảng numpy (chỉ đọc) của một typed array {'dtype', 'bdata'[, 'shape']} của plotly.js."""
+    array = np.frombuffer(base64.b64decode(value['bdata']), dtype=np.dtype(value['dtype']).newbyteorder('<'))
+    shape = value.get('shape')
+    if shape:
+        array = array.reshape([int(n) for n in (shape.split(',') if isinstance(shape, str) else shape)])
+    return array
+
+
+def _compact(value, key=None):
+    """
+    Bản sao gọn để mã hóa: mảng/list số -> typed array, mảng object -> list (để orjson
+    mã hóa được ngay, không phải qua bước làm sạch chậm của plotly). Không sửa `value`.
+    """
+    if isinstance(value, dict):
+        return {k: _compact(v, k) for k, v in value.items()}
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind == 'O' or key in SKIPPED_KEYS:
+            return value.tolist()
+        return _typed_array(value)
+    if isinstance(value, (list, tuple)):
+        if key not in SKIPPED_KEYS and _is_number_list(value):
+            spec = _typed_array(np.asarray(value))
+            if isinstance(spec, dict):
+                return spec
+        return [_compact(v) for v in value]
+    return value
+
+
+def figure_dict(fig):
+    """
+    Dạng dict {'data', 'layout'[, 'frames']} của Figure (qua to_plotly_json, mảng số đã là
+    typed array); dict giữ nguyên.
+    """
+    return fig.to_plotly_json() if hasattr(fig, 'to_plotly_json') else fig
+
+
+def encode_figure(fig):
+    """JSON gọn của biểu đồ (Figure, dict hoặc EncodedFigure)."""
+    if isinstance(fig, EncodedFigure):
+        return fig.json
+    return pio.to_json(_compact(figure_dict(fig)), validate=False, engine='orjson')
+
+
+def figure_etag(fig_json):
+    """Giá trị ETag (dùng như ETag yếu: các trường khác của phản hồi như job_id, elapsed có thể khác)."""
+    return hashlib.blake2b(fig_json.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def encode_response(data):
+    """Body JSON (bytes) của một dict; giá trị RawJSON được ghép nguyên văn, không mã hóa lại."""
+    parts = []
+    for key, value in data.items():
+        text = value.text if isinstance(value, RawJSON) else json.dumps(value, ensure_ascii=False)
+        parts.append(f'{json.dumps(key)}:{text}')
+    return ('{' + ','.join(parts) + '}').encode('utf-8')
+
+
+def _accepted(accept_encoding):
+    return {part.split(';')[0].strip().lower() for part in (accept_encoding or '').split(',')}
+
+
+class StreamCompressor:
+    """
+    Nén một phản hồi gửi dần từng phần (ví dụ từng dòng NDJSON): mỗi phần được
+    flush ngay để trình duyệt giải nén và dùng được mà không phải chờ hết luồng.
+    """
+
+    def __init__(self, accept_encoding):
+        accepted = _accepted(accept_encoding)
+        self.encoding = None
+        if brotli is not None and 'br' in accepted:
+            self.encoding = 'br'
+            self._brotli = brotli.Compressor(quality=4)
+        elif 'gzip' in accepted:
+            self.encoding = 'gzip'
+            self._gzip = zlib.compressobj(5, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.flush()
+        if self.encoding == 'gzip':
+            return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        return data
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        if self.encoding == 'gzip':
+            return self._gzip.flush()
+        return b''
+
+
+def compress(body, accept_encoding):
+    """Nén body theo header Accept-Encoding; trả về (body, Content-Encoding hoặc None)."""
+    if len(body) < MIN_COMPRESS_BYTES or not accept_encoding:
+        return body, None
+    accepted = _accepted(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return brotli.compress(body, quality=4), 'br'
+    if 'gzip' in accepted:
+        return gzip.compress(body, compresslevel=5), 'gzip'
+    return body, None
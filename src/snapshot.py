@@ -0,0 +1,180 @@
+"""
+Snapshot nhị phân (Arrow IPC/Feather v2, không nén) của các file CSV đã tiền xử lý.
+
+Lần đầu dùng, CSV được đọc một lần và ghi thành snapshot kèm file .meta.json
+(mtime, kích thước, sha256 của CSV nguồn). Các lần sau snapshot được ánh xạ bộ
+nhớ (mmap) thay vì phân tích lại văn bản: các worker gunicorn cùng đọc một file
+nên dùng chung các trang trong page cache của hệ điều hành. CSV đổi mtime/kích
+thước thì tính lại sha256, nội dung khác thì snapshot được dựng lại.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, 'data', 'preprocessed_data')
+SNAPSHOT_DIR = os.environ.get('LOL_SNAPSHOT_DIR', os.path.join(ROOT, 'cache', 'snapshots'))
+
+# Tăng khi cách dựng snapshot thay đổi để buộc dựng lại
+SNAPSHOT_VERSION = 1
+# Cột chuỗi lặp lại nhiều, lưu dạng dictionary -> pandas Categorical
+CATEGORICAL_COLUMNS = ['Champion', 'Team', 'Player', 'Role']
+
+
+def enable_copy_on_write():
+    """
+    Bật Copy-on-Write của pandas (luôn bật từ pandas 3, bản 1.5/2.x phải bật bằng tùy chọn).
+    DatasetLoader.get và AggregateStore.get đưa bản sao nông cho code sinh ra, nên cần nó.
+    """
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.options.mode.copy_on_write = True
+
+
+# Tiến trình web và worker của sandbox đều import module này trước khi chạy code sinh ra
+enable_copy_on_write()
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class Snapshot:
+    """Snapshot của một file CSV, tự dựng lại khi CSV nguồn thay đổi."""
+
+    def __init__(self, csv_path, snapshot_dir=SNAPSHOT_DIR):
+        self.csv_path = os.path.abspath(csv_path)
+        name = os.path.splitext(os.path.basename(self.csv_path))[0]
+        self.path = os.path.join(snapshot_dir, f'{name}.arrow')
+        self.meta_path = os.path.join(snapshot_dir, f'{name}.meta.json')
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, meta):
+        def write(tmp):
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=1)
+
+        _write_atomic(self.meta_path, write)
+
+    def is_fresh(self, stat=None):
+        """Snapshot còn khớp với CSV nguồn không (chỉ tính sha256 khi mtime/kích thước đổi)."""
+        stat = stat or os.stat(self.csv_path)
+        meta = self._read_meta()
+        if meta is None or meta.get('version') != SNAPSHOT_VERSION or not os.path.exists(self.path):
+            return False
+        if meta['mtime_ns'] == stat.st_mtime_ns and meta['size'] == stat.st_size:
+            return True
+        if meta['size'] != stat.st_size or meta['sha256'] != _file_sha256(self.csv_path):
+            return False
+        # Chỉ bị touch, nội dung không đổi: cập nhật mtime để lần sau khỏi băm lại
+        self._write_meta({**meta, 'mtime_ns': stat.st_mtime_ns})
+        return True
+
+    def build(self):
+        """Đọc CSV một lần bằng pandas (cùng cách suy kiểu như trước) và ghi snapshot."""
+        stat = os.stat(self.csv_path)
+        df = pd.read_csv(self.csv_path)
+        for column in CATEGORICAL_COLUMNS:
+            if column in df.columns:
+                df[column] = df[column].astype('category')
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_atomic(self.path, lambda tmp: feather.write_feather(table, tmp, compression='uncompressed'))
+        self._write_meta({
+            'version': SNAPSHOT_VERSION,
+            'source': self.csv_path,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': _file_sha256(self.csv_path),
+            'rows': len(df),
+            'columns': list(df.columns),
+        })
+
+    def load(self):
+        """DataFrame đọc từ snapshot qua mmap, dựng lại snapshot trước nếu cần."""
+        if not self.is_fresh():
+            self.build()
+        table = feather.read_table(self.path, memory_map=True)
+        meta = self._read_meta()
+        if table.num_rows != meta['rows'] or table.column_names != meta['columns']:
+            # Snapshot hỏng hoặc bị ghi dở: dựng lại từ CSV
+            self.build()
+            table = feather.read_table(self.path, memory_map=True)
+        # split_blocks: cột số không có giá trị thiếu trỏ thẳng vào vùng nhớ đã map thay vì sao chép
+        return table.to_pandas(split_blocks=True)
+
+
+class DatasetLoader:
+    """
+    Nạp DataFrame theo tên khi được dùng lần đầu, nạp lại khi CSV nguồn thay đổi.
+
+    Mỗi lần `get` chỉ tốn một lệnh stat; DataFrame trả về là bản sao nông nên
+    code sinh ra có thêm/sửa cột cũng không ảnh hưởng dữ liệu dùng chung.
+
+    derived: dataset dẫn xuất {tên: (các dataset nguồn, hàm dựng nhận các DataFrame nguồn)},
+    ví dụ bảng nối của combined.py; được dựng lại khi một dataset nguồn đổi phiên bản.
+    """
+
+    def __init__(self, sources, snapshot_dir=SNAPSHOT_DIR, derived=None):
+        self.snapshots = {name: Snapshot(path, snapshot_dir) for name, path in sources.items()}
+        self.derived = dict(derived or {})
+        self._frames = {}
+        # RLock: dựng dataset dẫn xuất gọi lại get() cho các dataset nguồn
+        self._lock = threading.RLock()
+
+    def names(self):
+        """Tên mọi dataset nạp được (gồm cả dataset dẫn xuất)."""
+        return [*self.snapshots, *self.derived]
+
+    def version(self, name):
+        """Phiên bản hiện tại của dataset (mtime, kích thước của CSV nguồn), đổi khi dữ liệu đổi."""
+        if name in self.derived:
+            return tuple(self.version(source) for source in self.derived[name][0])
+        stat = os.stat(self.snapshots[name].csv_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, name):
+        if name in self.derived:
+            sources, build = self.derived[name]
+            return build(*(self.get(source) for source in sources))
+        return self.snapshots[name].load()
+
+    def get(self, name):
+        version = self.version(name)
+        cached = self._frames.get(name)
+        if cached is None or cached[0] != version:
+            with self._lock:
+                cached = self._frames.get(name)
+                if cached is None or cached[0] != version:
+                    cached = (version, self._load(name))
+                    self._frames[name] = cached
+        # Bản sao nông chỉ an toàn khi Copy-on-Write bật (enable_copy_on_write): code sinh ra sửa
+        # tại chỗ (df['Role'] = ..., fillna(inplace=True)) thì không đổi DataFrame dùng chung trong cache
+        return cached[1].copy(deep=False)
@@ -17,12 +17,22 @@ const datasetInfo = {
             "Phân tích tỉ lệ thắng theo vai trò",
             "Hiển thị mối quan hệ giữa CS/M và G/M của các người chơi"
         ]
+    },
+    combined: {
+        name: "Player × Champion Data",
+        description: "Các tướng mà từng người chơi chơi nhiều nhất trong mỗi giải, kèm thống kê của người chơi và của tướng trong giải đó",
+        examples: [
+            "Tỉ lệ thắng của các tướng mà đường giữa của Team Flash chơi nhiều nhất",
+            "Những tướng được nhiều người chơi đi rừng chọn nhất năm 2022",
+            "So sánh KDA của người chơi với KDA trung bình của tướng họ chơi"
+        ]
     }
 };
 
 // Hàm khởi tạo khi trang được load
 document.addEventListener('DOMContentLoaded', function() {
     updateDatasetInfo();
+    loadDashboards();
 });
 
 // Hàm cập nhật thông tin dataset khi người dùng chọn
@@ -47,6 +57,117 @@ function updateDatasetInfo() {
     }
 }
 
+// Job đang chạy của trang; bị hủy khi người dùng gửi câu hỏi mới trước khi có kết quả
+let currentJobId = null;
+
+const STAGE_LABELS = {
+    queued: 'Đang chờ trong hàng đợi...',
+    fast_path: 'Đang dựng biểu đồ...',
+    llm_queue: 'Đang chờ lượt gọi AI...',
+    llm: 'Đang gửi yêu cầu cho AI...',
+    prompt_sent: 'Đang chờ AI trả lời...',
+    first_token: 'AI đang viết code biểu đồ...',
+    code_ready: 'Đã có code, đang chạy...',
+    exec: 'Đang chạy code biểu đồ...',
+    serialize: 'Đang chuẩn bị biểu đồ...'
+};
+
+function cancelCurrentJob() {
+    if (currentJobId) {
+        fetch(`/api/plot/jobs/${currentJobId}`, { method: 'DELETE' }).catch(() => {});
+        currentJobId = null;
+    }
+}
+
+// Biểu đồ đang hiển thị và ETag của nó: server trả 304 nếu kết quả mới giống hệt, khỏi tải và parse lại
+let lastPlot = null;
+
+// plotly.js >= 2.28 tự đọc typed array {dtype, bdata}; bản cũ hơn thì giải mã tại đây
+const TYPED_ARRAYS = {
+    f8: Float64Array, f4: Float32Array, i4: Int32Array, u4: Uint32Array,
+    i2: Int16Array, u2: Uint16Array, i1: Int8Array, u1: Uint8Array, u1c: Uint8ClampedArray
+};
+
+function plotlySupportsTypedArrays() {
+    const [major, minor] = (Plotly.version || '0.0').split('.').map(Number);
+    return major > 2 || (major === 2 && minor >= 28);
+}
+
+function decodeTypedArrays(value) {
+    if (Array.isArray(value)) {
+        return value.map(decodeTypedArrays);
+    }
+    if (value && typeof value === 'object') {
+        if (typeof value.bdata === 'string' && TYPED_ARRAYS[value.dtype] && !value.shape) {
+            const bytes = Uint8Array.from(atob(value.bdata), c => c.charCodeAt(0));
+            return Array.from(new TYPED_ARRAYS[value.dtype](bytes.buffer));
+        }
+        for (const key of Object.keys(value)) {
+            value[key] = decodeTypedArrays(value[key]);
+        }
+    }
+    return value;
+}
+
+// Hỏi trạng thái job (server giữ request tối đa 1 giây nếu job chưa xong) cho tới khi kết thúc
+async function waitForJob(jobId, onStage) {
+    while (true) {
+        const headers = lastPlot ? { 'If-None-Match': lastPlot.etag } : {};
+        const response = await fetch(`/api/plot/jobs/${jobId}?wait=1`, { headers });
+        if (response.status === 304) {
+            return { status: 'done', plot: lastPlot.plot, etag: lastPlot.etag, reduced: lastPlot.reduced, notModified: true };
+        }
+        const job = await response.json();
+        if (job.status === 'done') {
+            job.etag = response.headers.get('ETag');
+        }
+        if (!response.ok) {
+            throw new Error(job.error || `HTTP ${response.status}`);
+        }
+        if (['done', 'failed', 'cancelled'].includes(job.status)) {
+            return job;
+        }
+        onStage(job.stage || job.status);
+    }
+}
+
+// Theo dõi tiến độ job qua server-sent events; resolve với trạng thái cuối (done/failed/cancelled).
+// Reject nếu trình duyệt không hỗ trợ hoặc mất kết nối, khi đó gọi waitForJob để hỏi trạng thái như cũ.
+function followJobEvents(jobId, onStage) {
+    return new Promise((resolve, reject) => {
+        if (!window.EventSource) {
+            reject(new Error('EventSource not supported'));
+            return;
+        }
+        const source = new EventSource(`/api/plot/jobs/${jobId}/events`);
+        source.onmessage = message => {
+            const event = JSON.parse(message.data);
+            console.log(`Job event ${event.event} at ${event.elapsed}s`);
+            if (['done', 'failed', 'cancelled'].includes(event.event)) {
+                source.close();
+                resolve(event.event);
+            } else {
+                onStage(event.event);
+            }
+        };
+        source.onerror = () => {
+            source.close();
+            reject(new Error('Event stream closed'));
+        };
+    });
+}
+
+// Server đã giảm số điểm của biểu đồ lớn (lấy mẫu theo mật độ, LTTB hoặc chia bin sẵn)
+function showReducedNote(reduced) {
+    const note = document.getElementById('plotNote');
+    if (!note) {
+        return;
+    }
+    note.textContent = reduced
+        ? `Biểu đồ hiển thị ${reduced.shown.toLocaleString()} / ${reduced.points.toLocaleString()} điểm dữ liệu (đã rút gọn để hiển thị nhanh hơn)`
+        : '';
+}
+
 async function generatePlot() {
     const userInput = document.getElementById('userInput').value;
     const dataset = document.getElementById('dataset').value;
@@ -60,8 +181,10 @@ async function generatePlot() {
         // Hiển thị thông báo đang xử lý
         const plotDiv = document.getElementById('plot');
         plotDiv.innerHTML = '<div style="text-align: center; padding: 20px;"><h3>Đang xử lý yêu cầu...</h3></div>';
+        showReducedNote(null);
         
-        const response = await fetch('/api/plot', {
+        cancelCurrentJob();
+        const response = await fetch('/api/plot/jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -71,8 +194,32 @@ async function generatePlot() {
                 dataset: dataset
             })
         });
-        
-        const data = await response.json();
+
+        const submitted = await response.json();
+        if (submitted.error) {
+            plotDiv.innerHTML = `<div style="color: red; padding: 20px;"><h3>Lỗi:</h3><p>${submitted.error}</p></div>`;
+            return;
+        }
+        const jobId = submitted.job_id;
+        currentJobId = jobId;
+        const submittedAt = performance.now();
+        const showStage = stage => {
+            if (currentJobId === jobId) {
+                plotDiv.innerHTML = `<div style="text-align: center; padding: 20px;"><h3>${STAGE_LABELS[stage] || 'Đang xử lý yêu cầu...'}</h3></div>`;
+            }
+        };
+        try {
+            await followJobEvents(jobId, showStage);
+        } catch (streamError) {
+            console.log('Falling back to polling:', streamError.message);
+        }
+        // Job đã xong (hoặc mất luồng sự kiện): lấy kết quả, hỏi lại tới khi xong nếu cần
+        const data = await waitForJob(jobId, showStage);
+        // Đã có câu hỏi mới thay thế job này
+        if (currentJobId !== jobId || data.status === 'cancelled') {
+            return;
+        }
+        currentJobId = null;
         if (data.error) {
             plotDiv.innerHTML = `<div style="color: red; padding: 20px;"><h3>Lỗi:</h3><p>${data.error}</p></div>`;
             return;
@@ -80,18 +227,32 @@ async function generatePlot() {
 
         // Debug để kiểm tra dữ liệu JSON
         console.log("Received plot data:", data.plot);
+        if (data.notModified) {
+            console.log('Plot unchanged (304), reusing the previous figure');
+        } else {
+            console.log(`Plot code cache: ${data.cache}${data.cache_tier ? ` (${data.cache_tier})` : ''}`);
+            if (data.prompt_tokens) {
+                console.log('Prompt tokens (estimated):', data.prompt_tokens);
+            }
+        }
         
         try {
             // Parse JSON nếu server trả về string
-            const plotData = typeof data.plot === 'string' ? JSON.parse(data.plot) : data.plot;
+            let plotData = typeof data.plot === 'string' ? JSON.parse(data.plot) : data.plot;
             
             // Kiểm tra dữ liệu plotly
             if (!plotData || !plotData.data || !Array.isArray(plotData.data)) {
                 throw new Error('Dữ liệu biểu đồ không hợp lệ');
             }
+            if (!data.notModified && !plotlySupportsTypedArrays()) {
+                plotData = decodeTypedArrays(plotData);
+            }
+            lastPlot = data.etag ? { etag: data.etag, plot: plotData, reduced: data.reduced } : null;
             
             // Render biểu đồ
             Plotly.newPlot(plotDiv, plotData.data, plotData.layout);
+            showReducedNote(data.reduced);
+            console.log(`Job event rendered at ${((performance.now() - submittedAt) / 1000).toFixed(3)}s`);
         } catch (parseError) {
             console.error('Error parsing plot data:', parseError);
             plotDiv.innerHTML = `
@@ -110,4 +271,116 @@ async function generatePlot() {
             </div>
         `;
     }
-}
\ No newline at end of file
+}
+
+// ---------------------------------------------------------------- dashboard (nhiều biểu đồ một lần)
+
+// Luồng dashboard đang tải; bị hủy khi người dùng tải dashboard khác
+let dashboardRequest = null;
+
+// Điền danh sách dashboard lưu sẵn của server vào ô chọn
+async function loadDashboards() {
+    const select = document.getElementById('dashboardSelect');
+    if (!select) {
+        return;
+    }
+    try {
+        const response = await fetch('/api/dashboards');
+        const dashboards = await response.json();
+        if (!response.ok || !dashboards.length) {
+            return;
+        }
+        select.innerHTML = dashboards.map(d => `<option value="${d.name}">${d.title}</option>`).join('');
+        document.getElementById('dashboardSelector').style.display = 'block';
+    } catch (error) {
+        console.log('Dashboards unavailable:', error.message);
+    }
+}
+
+// Đọc phản hồi NDJSON, gọi onEvent với từng dòng ngay khi nhận đủ dòng đó (dòng trống là keepalive)
+async function readNdjson(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        for (const line of lines) {
+            if (line.trim()) {
+                onEvent(JSON.parse(line));
+            }
+        }
+        if (done) {
+            return;
+        }
+    }
+}
+
+function renderDashboardCell(cell, event) {
+    if (event.status !== 'done') {
+        cell.innerHTML = `<div style="color: red; padding: 20px;"><h3>${event.user_input}</h3><p>${event.error || 'Không thể tạo biểu đồ'}</p></div>`;
+        return;
+    }
+    let plotData = typeof event.plot === 'string' ? JSON.parse(event.plot) : event.plot;
+    if (!plotlySupportsTypedArrays()) {
+        plotData = decodeTypedArrays(plotData);
+    }
+    cell.innerHTML = '';
+    Plotly.newPlot(cell, plotData.data, plotData.layout, { responsive: true });
+}
+
+// Vẽ cả dashboard trong một request: mỗi biểu đồ hiện ngay khi server vẽ xong (POST /api/plot/batch)
+async function generateDashboard() {
+    const name = document.getElementById('dashboardSelect').value;
+    const container = document.getElementById('dashboard');
+    if (dashboardRequest) {
+        dashboardRequest.abort();
+    }
+    const controller = new AbortController();
+    dashboardRequest = controller;
+    container.innerHTML = '';
+    const cells = [];
+    const startedAt = performance.now();
+
+    try {
+        const response = await fetch('/api/plot/batch', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ dashboard: name }),
+            signal: controller.signal
+        });
+        if (!response.ok) {
+            const error = await response.json();
+            throw new Error(error.error || `HTTP ${response.status}`);
+        }
+        await readNdjson(response, event => {
+            if (event.event === 'start') {
+                for (let i = 0; i < event.items; i++) {
+                    const cell = document.createElement('div');
+                    cell.className = 'dashboard-cell';
+                    cell.innerHTML = `<div style="text-align: center; padding: 20px;"><h3>${STAGE_LABELS.queued}</h3></div>`;
+                    container.appendChild(cell);
+                    cells.push(cell);
+                }
+            } else if (event.event === 'item') {
+                // Câu hỏi trùng trong dashboard chỉ được vẽ một lần, kết quả dùng cho mọi ô của nó
+                event.index.forEach(i => renderDashboardCell(cells[i], event));
+                console.log(`Dashboard item ${event.index} ${event.status} at ${event.elapsed}s (figure cache: ${event.figure_cache || '-'})`);
+            } else if (event.event === 'end') {
+                console.log(`Dashboard rendered at ${((performance.now() - startedAt) / 1000).toFixed(3)}s: ${event.done} done, ${event.failed} failed`);
+            }
+        });
+    } catch (error) {
+        if (error.name === 'AbortError') {
+            return;
+        }
+        console.error('Error:', error);
+        container.innerHTML = `<div style="color: red; padding: 20px;"><h3>Đã xảy ra lỗi:</h3><p>${error.message || 'Không thể kết nối với máy chủ'}</p></div>`;
+    } finally {
+        if (dashboardRequest === controller) {
+            dashboardRequest = null;
+        }
+    }
+}
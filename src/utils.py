@@ -1,12 +1,99 @@
+import ast
 import re
 
+# Khối code markdown: ```python, ```py, ``` không ghi ngôn ngữ...; thiếu dấu đóng (câu trả lời bị cắt) vẫn nhận
+CODE_FENCE = re.compile(r'```[ \t]*([\w+-]*)[^\n]*\n(.*?)(?:\n[ \t]*```|\Z)', re.DOTALL)
+PYTHON_TAGS = ('', 'python', 'python3', 'py')
+# Khối code đã có dấu đóng (và xuống dòng sau dấu đóng, để chắc đó không phải dấu mở của khối sau)
+CLOSED_CODE_FENCE = re.compile(r'```[ \t]*([\w+-]*)[^\n]*\n(.*?)\n[ \t]*```[ \t]*\n', re.DOTALL)
+FIG_ASSIGNMENT = re.compile(r'^\s*fig\s*=', re.MULTILINE)
+# Số lần thử ast.parse tối đa khi bỏ văn bản quanh đoạn code không có khối ```
+MAX_PROSE_ATTEMPTS = 40
+
+
+def _parses(code):
+    try:
+        ast.parse(code)
+    except SyntaxError:
+        return False
+    return True
+
+
+def code_block_watcher():
+    """
+    Hàm stop cho stream, cho cùng kết quả với code_block_closed(text) nhưng chỉ quét
+    lại cả câu trả lời khi một dòng chứa ``` vừa kết thúc, nên cả stream chỉ tốn O(n).
+    """
+    seen = 0
+    waiting = None  # vị trí dấu ``` mà dòng của nó chưa xuống dòng
+
+    def stop(text):
+        nonlocal seen, waiting
+        if waiting is None:
+            # Lùi 2 ký tự: dấu ``` có thể bị cắt giữa hai chunk
+            found = text.find('```', max(0, seen - 2))
+            waiting = found if found >= 0 else None
+        seen = len(text)
+        while waiting is not None:
+            newline = text.find('\n', waiting + 3)
+            if newline < 0:
+                return False
+            if code_block_closed(text):
+                return True
+            found = text.find('```', newline)
+            waiting = found if found >= 0 else None
+        return False
+
+    return stop
+
+
+def _strip_prose(text):
+    """
+    Bỏ các dòng văn bản trước/sau đoạn code (câu dẫn, giải thích) cho tới khi phần còn lại là Python hợp lệ.
+
+    Dựa vào dòng báo lỗi cú pháp: lỗi ở dòng đầu thì bỏ dòng đầu, lỗi ở dòng sau thì cắt từ
+    dòng đó trở đi. Mỗi lần thử bớt ít nhất một dòng và số lần thử có giới hạn, nên câu trả lời
+    dài nhiều chữ không làm treo worker.
+    """
+    lines = text.strip().splitlines()
+    start, end = 0, len(lines)
+    for _ in range(MAX_PROSE_ATTEMPTS):
+        while start < end and not lines[start].strip():
+            start += 1
+        while end > start and not lines[end - 1].strip():
+            end -= 1
+        if start >= end:
+            break
+        code = '\n'.join(lines[start:end])
+        try:
+            ast.parse(code)
+            return code.strip()
+        except SyntaxError as e:
+            error_line = start + max(1, min(e.lineno or 1, end - start)) - 1
+        if error_line == start:
+            start += 1
+        else:
+            end = error_line
+    return text.strip()
+
+
 def clean_the_response(generated_code):
     """
     Loại bỏ các ký hiệu markdown dùng để định dạng code (```python và ```).
     Trả về mã code thuần đã được làm sạch.
+
+    Có nhiều khối code thì lấy khối gán biến `fig` (hoặc khối dài nhất); không có
+    khối nào thì bỏ các dòng văn bản bao quanh đoạn code.
     """
-    if generated_code.startswith('```python'):
-        generated_code = generated_code[len('```python'):].strip()
-    if generated_code.endswith('```'):
-        generated_code = generated_code[:-len('```')].strip()
-    return generated_code
\ No newline at end of file
+    blocks = [code.strip() for tag, code in CODE_FENCE.findall(generated_code) if tag.lower() in PYTHON_TAGS]
+    blocks = [code for code in blocks if code]
+    if not blocks:
+        return _strip_prose(generated_code)
+    with_fig = [code for code in blocks if FIG_ASSIGNMENT.search(code)]
+    return max(with_fig or blocks, key=len)
+
+
+def code_block_closed(text):
+    """Câu trả lời (đang được stream) đã có trọn một khối code Python gán `fig` chưa."""
+    return any(tag.lower() in PYTHON_TAGS and FIG_ASSIGNMENT.search(code) and _parses(code)
+               for tag, code in CLOSED_CODE_FENCE.findall(text))